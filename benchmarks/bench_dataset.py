@@ -0,0 +1,77 @@
+import os
+import time
+import shutil
+import logging
+from typing import Dict
+
+from common import CLASS_NAMES, create_synthetic_dataset, metric, best_of
+
+logger = logging.getLogger(__name__)
+
+SPLIT_STRATEGIES = ['copy', 'hardlink', 'symlink', 'manifest']
+
+
+def fresh_dir(path: str) -> str:
+    """Empty a directory so incremental manifests never skip work between repeats"""
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    return path
+
+
+def run(work_dir: str, quick: bool = False) -> Dict[str, Dict]:
+    """clean_dataset, generate_augmented_images and split_dataset throughput on a synthetic dataset"""
+    from data_preprocessing import DatasetPreprocessor
+
+    images_per_class = 10 if quick else 50
+    augmented_per_class = 20 if quick else 100
+    repeats = 1 if quick else 3
+
+    raw_dir = os.path.join(work_dir, 'raw')
+    clean_dir = os.path.join(work_dir, 'clean')
+    num_images = create_synthetic_dataset(raw_dir, images_per_class)
+
+    # Keep the config file next to the data rather than in the working directory
+    preprocessor = DatasetPreprocessor(os.path.join(work_dir, 'preprocessing_config.json'))
+    results = {}
+
+    def clean():
+        fresh_dir(clean_dir)
+        start = time.perf_counter()
+        preprocessor.clean_dataset(raw_dir, clean_dir)
+        return time.perf_counter() - start
+
+    elapsed = best_of(clean, repeats)
+    results["dataset.clean_dataset.images_per_sec"] = metric(num_images / elapsed, 'images/s', better='higher')
+
+    class_name = CLASS_NAMES[0]
+    augmented_dir = os.path.join(work_dir, 'augmented')
+
+    def augment():
+        fresh_dir(augmented_dir)
+        start = time.perf_counter()
+        preprocessor.generate_augmented_images(os.path.join(clean_dir, class_name), augmented_dir,
+                                               class_name, augmented_per_class)
+        return time.perf_counter() - start
+
+    elapsed = best_of(augment, repeats)
+    results["dataset.generate_augmented_images.images_per_sec"] = metric(
+        augmented_per_class / elapsed, 'images/s', better='higher'
+    )
+
+    cleaned = sum(len(os.listdir(os.path.join(clean_dir, name))) for name in CLASS_NAMES)
+    for strategy in SPLIT_STRATEGIES:
+        preprocessor.config['split_strategy'] = strategy
+        split_dir = os.path.join(work_dir, f'split_{strategy}')
+
+        def split():
+            fresh_dir(split_dir)
+            start = time.perf_counter()
+            preprocessor.split_dataset(clean_dir, split_dir)
+            return time.perf_counter() - start
+
+        elapsed = best_of(split, repeats)
+        results[f"dataset.split_dataset.{strategy}.images_per_sec"] = metric(
+            cleaned / elapsed, 'images/s', better='higher'
+        )
+
+    return results
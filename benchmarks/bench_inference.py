@@ -0,0 +1,43 @@
+import time
+import logging
+from typing import Dict
+
+import cv2
+import numpy as np
+
+from common import create_synthetic_model, metric, synthetic_uploads
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZES = [1, 4, 8, 16, 32, 64]
+
+
+def run(work_dir: str, quick: bool = False) -> Dict[str, Dict]:
+    """predict_batch throughput of CropDiseasePredictor across batch sizes"""
+    from model_inference import CropDiseasePredictor
+
+    model_path, metadata_path = create_synthetic_model(work_dir)
+    predictor = CropDiseasePredictor(model_path, metadata_path, backend='keras')
+
+    num_images = 64 if quick else 256
+    images = [
+        cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+        for image_bytes in synthetic_uploads(16)
+    ]
+    images = [images[i % len(images)] for i in range(num_images)]
+
+    results = {}
+    for batch_size in BATCH_SIZES:
+        # Warm up so graph tracing for this batch shape is not timed
+        predictor.predict_batch(images[:batch_size], batch_size=batch_size)
+
+        start = time.perf_counter()
+        predictor.predict_batch(images, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+
+        results[f"inference.predict_batch.b{batch_size}.images_per_sec"] = metric(
+            num_images / elapsed, 'images/s', better='higher'
+        )
+
+    predictor.backend.close()
+    return results
@@ -0,0 +1,40 @@
+import logging
+from typing import Dict
+
+import cv2
+import numpy as np
+
+from common import create_synthetic_model, metric, synthetic_uploads, time_calls
+
+logger = logging.getLogger(__name__)
+
+
+def run(work_dir: str, quick: bool = False) -> Dict[str, Dict]:
+    """Per-image latency of the serving and offline preprocessing paths"""
+    from model_deployment import ModelServer
+    from model_inference import CropDiseasePredictor
+
+    model_path, metadata_path = create_synthetic_model(work_dir)
+    iterations = 20 if quick else 200
+    image_bytes = synthetic_uploads(1)[0]
+
+    results = {}
+
+    # The server takes uploaded bytes, with and without reduced-resolution JPEG decode
+    server = ModelServer(model_path, metadata_path, backend='keras', cache=None)
+    for name, reduced in [('reduced_decode', True), ('full_decode', False)]:
+        server.reduced_decode = reduced
+        timing = time_calls(lambda: server.preprocess_image(image_bytes), iterations)
+        results[f"preprocessing.server.{name}.mean_ms"] = metric(timing['mean'], 'ms')
+        results[f"preprocessing.server.{name}.p95_ms"] = metric(timing['p95'], 'ms')
+    server.backend.close()
+
+    # The offline predictor gets already decoded BGR arrays, as from cv2.imread
+    predictor = CropDiseasePredictor(model_path, metadata_path, backend='keras')
+    image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+    timing = time_calls(lambda: predictor.preprocess_image(image), iterations)
+    results["preprocessing.predictor.mean_ms"] = metric(timing['mean'], 'ms')
+    results["preprocessing.predictor.p95_ms"] = metric(timing['p95'], 'ms')
+    predictor.backend.close()
+
+    return results
@@ -0,0 +1,97 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, List
+
+import numpy as np
+
+from common import create_synthetic_model, metric, synthetic_uploads
+
+logger = logging.getLogger(__name__)
+
+CONCURRENCY_LEVELS = [1, 4, 16, 64]
+IMAGES_PER_BATCH_REQUEST = 8
+
+
+async def drive(client, concurrency: int, num_requests: int, make_request) -> Dict[str, float]:
+    """Issue num_requests with at most concurrency in flight; returns throughput and latency"""
+    in_flight = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def one(index: int):
+        async with in_flight:
+            start = time.perf_counter()
+            response = await make_request(client, index)
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(num_requests)])
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'requests_per_sec': num_requests / elapsed,
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p95_ms': float(np.percentile(latencies_ms, 95))
+    }
+
+
+async def run_async(model_path: str, metadata_path: str, quick: bool) -> Dict[str, Dict]:
+    import httpx
+    import model_deployment
+
+    # Every upload is distinct, but keep the cache out of the measurement entirely;
+    # metrics stay on, as in production
+    server = model_deployment.ModelServer(model_path, metadata_path, backend='keras', cache=None,
+                                          metrics=model_deployment.metrics)
+    model_deployment.model_server = server
+
+    requests_per_level = 16 if quick else 64
+    uploads = synthetic_uploads(32)
+
+    async def predict(client, index):
+        files = {'image': (f'leaf_{index}.jpg', uploads[index % len(uploads)], 'image/jpeg')}
+        return await client.post('/predict', files=files, data={'plant_part': 'leaves'})
+
+    async def predict_batch(client, index):
+        files = [
+            ('images', (f'leaf_{index}_{i}.jpg', uploads[(index + i) % len(uploads)], 'image/jpeg'))
+            for i in range(IMAGES_PER_BATCH_REQUEST)
+        ]
+        data = {'plant_parts': ['leaves'] * IMAGES_PER_BATCH_REQUEST}
+        return await client.post('/predict/batch', files=files, data=data)
+
+    results = {}
+    # The ASGI transport calls the app in-process, no sockets involved
+    transport = httpx.ASGITransport(app=model_deployment.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://benchmark', timeout=300) as client:
+        await drive(client, 1, 2, predict)
+
+        for endpoint, make_request in [('predict', predict), ('predict_batch', predict_batch)]:
+            for concurrency in CONCURRENCY_LEVELS:
+                num_requests = max(requests_per_level, concurrency)
+                stats = await drive(client, concurrency, num_requests, make_request)
+
+                prefix = f"serving.{endpoint}.c{concurrency}"
+                results[f"{prefix}.requests_per_sec"] = metric(stats['requests_per_sec'], 'req/s', better='higher')
+                results[f"{prefix}.p50_ms"] = metric(stats['p50_ms'], 'ms')
+                results[f"{prefix}.p95_ms"] = metric(stats['p95_ms'], 'ms')
+
+                logger.info(f"/{endpoint.replace('_', '/')} at concurrency {concurrency}: "
+                            f"{stats['requests_per_sec']:.1f} req/s, p95 {stats['p95_ms']:.1f} ms")
+
+    await server.close()
+    model_deployment.model_server = None
+
+    return results
+
+
+def run(work_dir: str, quick: bool = False) -> Dict[str, Dict]:
+    """End-to-end /predict and /predict/batch latency and throughput through an in-process ASGI client"""
+    # The cache is created from the environment when ModelServer gets none
+    os.environ['PREDICTION_CACHE'] = 'none'
+
+    model_path, metadata_path = create_synthetic_model(work_dir)
+    return asyncio.run(run_async(model_path, metadata_path, quick))
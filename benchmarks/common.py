@@ -0,0 +1,116 @@
+import io
+import os
+import sys
+import json
+import time
+import logging
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+# The benchmarks import the project modules the same way the scripts import each other
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+logger = logging.getLogger(__name__)
+
+CLASS_NAMES = ['bacterial_blight', 'brown_spot', 'healthy', 'leaf_blast']
+INPUT_SHAPE = (224, 224, 3)
+
+# Roughly a downsized phone photo; the serving path decodes straight to ~224 px
+UPLOAD_SIZE = (1080, 1440)
+
+
+def metric(value: float, unit: str, better: str = 'lower') -> Dict:
+    """One benchmark measurement; better is 'lower' or 'higher'"""
+    return {'value': round(float(value), 4), 'unit': unit, 'better': better}
+
+
+def synthetic_image(rng: np.random.Generator, size: Tuple[int, int]) -> np.ndarray:
+    """RGB uint8 image of gradients plus noise, which compresses and filters like a photo"""
+    y, x = np.mgrid[0:size[0], 0:size[1]]
+    offset = int(rng.integers(0, 256))
+    image = np.stack([(x + offset) % 256, (y + offset) % 256, (x + y) % 256], axis=-1).astype(np.uint8)
+    noise = rng.integers(0, 48, size=image.shape, dtype=np.uint8)
+    return np.clip(image.astype(np.int16) + noise - 24, 0, 255).astype(np.uint8)
+
+
+def encode_jpeg(image: np.ndarray, quality: int = 90) -> bytes:
+    """Encode an RGB uint8 image as JPEG bytes"""
+    buffer = io.BytesIO()
+    Image.fromarray(image).save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def synthetic_uploads(count: int, size: Tuple[int, int] = UPLOAD_SIZE, seed: int = 0) -> List[bytes]:
+    """Distinct JPEG uploads, so no request is served from the prediction cache"""
+    rng = np.random.default_rng(seed)
+    return [encode_jpeg(synthetic_image(rng, size)) for _ in range(count)]
+
+
+def create_synthetic_model(work_dir: str, input_shape: Tuple[int, int, int] = INPUT_SHAPE,
+                           class_names: List[str] = CLASS_NAMES) -> Tuple[str, str]:
+    """Save a tiny Keras classifier and its metadata; returns (model_path, metadata_path)"""
+    from tensorflow import keras
+
+    os.makedirs(work_dir, exist_ok=True)
+
+    inputs = keras.Input(shape=input_shape)
+    x = keras.layers.Conv2D(8, 3, strides=4, activation='relu')(inputs)
+    x = keras.layers.GlobalAveragePooling2D()(x)
+    outputs = keras.layers.Dense(len(class_names), activation='softmax')(x)
+    model = keras.Model(inputs, outputs)
+
+    model_path = os.path.join(work_dir, 'crop_disease_model.h5')
+    model.save(model_path)
+
+    metadata = {
+        'model_version': 'benchmark',
+        'num_classes': len(class_names),
+        'class_names': class_names,
+        'input_shape': list(input_shape)
+    }
+    metadata_path = os.path.join(work_dir, 'model_metadata.json')
+    with open(metadata_path, 'w') as f:
+        json.dump(metadata, f, indent=4)
+
+    return model_path, metadata_path
+
+
+def create_synthetic_dataset(root_dir: str, images_per_class: int, size: Tuple[int, int] = (480, 640),
+                             class_names: List[str] = CLASS_NAMES, seed: int = 0) -> int:
+    """Write a class-per-directory JPEG dataset; returns the number of images"""
+    rng = np.random.default_rng(seed)
+    for class_name in class_names:
+        class_dir = os.path.join(root_dir, class_name)
+        os.makedirs(class_dir, exist_ok=True)
+        for i in range(images_per_class):
+            with open(os.path.join(class_dir, f"{class_name}_{i:04d}.jpg"), 'wb') as f:
+                f.write(encode_jpeg(synthetic_image(rng, size)))
+    return images_per_class * len(class_names)
+
+
+def time_calls(fn: Callable[[], object], iterations: int, warmup: int = 3) -> Dict[str, float]:
+    """Per-call latency in milliseconds (mean, p50, p95) over repeated calls"""
+    for _ in range(warmup):
+        fn()
+
+    timings = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings[i] = time.perf_counter() - start
+
+    timings *= 1000
+    return {
+        'mean': float(timings.mean()),
+        'p50': float(np.percentile(timings, 50)),
+        'p95': float(np.percentile(timings, 95))
+    }
+
+
+def best_of(fn: Callable[[], float], repeats: int) -> float:
+    """Smallest of several wall-clock timings of fn, which returns its own elapsed seconds"""
+    return min(fn() for _ in range(max(1, repeats)))
@@ -0,0 +1,139 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import importlib
+from typing import Dict, List
+
+import common  # noqa: F401  (puts scripts/ on sys.path)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SUITES = {
+    'preprocessing': 'bench_preprocessing',
+    'inference': 'bench_inference',
+    'serving': 'bench_serving',
+    'dataset': 'bench_dataset'
+}
+
+
+def run_suites(suites: List[str], quick: bool) -> Dict:
+    """Run the selected suites, each in its own scratch directory"""
+    import tensorflow as tf
+
+    results = {}
+    work_root = tempfile.mkdtemp(prefix='crop_disease_bench_')
+    try:
+        for suite in suites:
+            logger.info(f"Running {suite} benchmarks")
+            module = importlib.import_module(SUITES[suite])
+
+            start = time.perf_counter()
+            results.update(module.run(os.path.join(work_root, suite), quick=quick))
+            logger.info(f"{suite} benchmarks finished in {time.perf_counter() - start:.1f}s")
+    finally:
+        shutil.rmtree(work_root, ignore_errors=True)
+
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'tensorflow': tf.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'quick': quick,
+            'suites': suites
+        },
+        'results': results
+    }
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[Dict]:
+    """Compare metrics present in both runs; a change worse than tolerance is a regression"""
+    rows = []
+    for name, result in sorted(current['results'].items()):
+        if name not in baseline['results']:
+            continue
+
+        value = result['value']
+        reference = baseline['results'][name]['value']
+        change = (value - reference) / reference if reference else 0.0
+
+        # Positive change is bad for latencies and good for throughputs
+        if result['better'] == 'higher':
+            regressed = value < reference * (1 - tolerance)
+        else:
+            regressed = value > reference * (1 + tolerance)
+
+        rows.append({
+            'metric': name,
+            'baseline': reference,
+            'current': value,
+            'unit': result['unit'],
+            'change': change,
+            'regressed': regressed
+        })
+
+    return rows
+
+
+def print_comparison(rows: List[Dict], tolerance: float):
+    """Print one line per metric, marking regressions"""
+    width = max((len(row['metric']) for row in rows), default=10)
+    print(f"{'metric':<{width}}  {'baseline':>12}  {'current':>12}  {'change':>8}")
+    for row in rows:
+        flag = '  REGRESSION' if row['regressed'] else ''
+        print(f"{row['metric']:<{width}}  {row['baseline']:>12.3f}  {row['current']:>12.3f}  "
+              f"{100 * row['change']:>+7.1f}%  {row['unit']}{flag}")
+
+    regressions = sum(row['regressed'] for row in rows)
+    print(f"\n{len(rows)} metrics compared, {regressions} regressed beyond {100 * tolerance:.0f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark preprocessing, inference, serving and dataset tools')
+    parser.add_argument('--suite', action='append', choices=sorted(SUITES),
+                        help='Suite to run; repeat for several (default: all)')
+    parser.add_argument('--quick', action='store_true', help='Fewer iterations, for a fast sanity check')
+    parser.add_argument('--output', default='benchmark_results.json', help='Where to write the results JSON')
+    parser.add_argument('--baseline', help='Results JSON to compare against')
+    parser.add_argument('--current', help='Compare this existing results JSON instead of running the suites')
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help='Relative change beyond which a metric counts as a regression')
+    args = parser.parse_args()
+
+    if args.current:
+        with open(args.current, 'r') as f:
+            current = json.load(f)
+    else:
+        current = run_suites(args.suite or list(SUITES), args.quick)
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=4)
+        logger.info(f"Benchmark results saved to {args.output}")
+
+    if not args.baseline:
+        for name, result in sorted(current['results'].items()):
+            print(f"{name}: {result['value']} {result['unit']}")
+        return
+
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+
+    if baseline['meta'].get('quick') != current['meta'].get('quick'):
+        logger.warning("Baseline and current runs differ in --quick; numbers may not be comparable")
+
+    rows = compare(current, baseline, args.tolerance)
+    print_comparison(rows, args.tolerance)
+
+    if any(row['regressed'] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
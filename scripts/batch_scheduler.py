@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatchScheduler:
+    def __init__(self, predict_fn: Callable[[np.ndarray], np.ndarray],
+                 max_batch_size: int = 16, max_wait_ms: float = 5.0, max_concurrent_batches: int = 1,
+                 metrics=None):
+        """Merge concurrent single-image requests into batched forward passes"""
+        self.predict_fn = predict_fn
+        self.metrics = metrics
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+        self.max_concurrent_batches = max(1, int(max_concurrent_batches))
+
+        # Forward passes run on dedicated threads so the event loop stays free
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrent_batches,
+                                           thread_name_prefix='inference')
+
+        self._pending: Deque[Tuple[np.ndarray, asyncio.Future, float]] = deque()
+        self._has_work: Optional[asyncio.Event] = None
+        self._batch_slots: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+        # Batch task -> the requests it serves, so stop() can fail them
+        self._running_batches: Dict[asyncio.Task, List[Tuple[np.ndarray, asyncio.Future, float]]] = {}
+
+        # Counters
+        self.requests_total = 0
+        self.batches_total = 0
+        self.max_queue_depth = 0
+        self.batch_size_counts: Dict[int, int] = {}
+
+    def start(self):
+        """Start the batching loop on the running event loop"""
+        if self._worker is not None and not self._worker.done():
+            return
+        self._has_work = asyncio.Event()
+        self._batch_slots = asyncio.Semaphore(self.max_concurrent_batches)
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"Micro-batching started (max_batch_size={self.max_batch_size}, "
+                    f"max_wait_ms={self.max_wait_ms}, max_concurrent_batches={self.max_concurrent_batches})")
+
+    async def stop(self):
+        """Stop the batching loop and fail every request still queued or in a running batch"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        # Callers await these futures, not the tasks, so cancelling alone would leave them hanging
+        stopped = [item for batch in self._running_batches.values() for item in batch] + list(self._pending)
+        self._pending.clear()
+        for _, future, _ in stopped:
+            if not future.done():
+                future.set_exception(RuntimeError("Scheduler stopped"))
+
+        for task in list(self._running_batches):
+            task.cancel()
+
+        self.executor.shutdown(wait=False)
+
+    async def submit(self, image: np.ndarray) -> np.ndarray:
+        """Queue one preprocessed image (without batch dimension) and await its output row"""
+        self.start()
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((image, future, time.perf_counter()))
+        self.requests_total += 1
+        self.max_queue_depth = max(self.max_queue_depth, len(self._pending))
+        self._has_work.set()
+
+        return await future
+
+    async def _run(self):
+        """Collect pending requests into batches and execute them"""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            if not self._pending:
+                self._has_work.clear()
+                await self._has_work.wait()
+
+            # While every batch slot is busy, requests keep accumulating
+            await self._batch_slots.acquire()
+
+            # Wait for the batch to fill up, but never longer than max_wait_ms
+            deadline = loop.time() + self.max_wait_ms / 1000.0
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                self._has_work.clear()
+                try:
+                    await asyncio.wait_for(self._has_work.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            batch_len = min(len(self._pending), self.max_batch_size)
+            batch = [self._pending.popleft() for _ in range(batch_len)]
+            task = loop.create_task(self._execute(batch))
+            self._running_batches[task] = batch
+            task.add_done_callback(self._batch_finished)
+
+    def _batch_finished(self, task: asyncio.Task):
+        self._running_batches.pop(task, None)
+        self._batch_slots.release()
+
+    async def _execute(self, batch: List[Tuple[np.ndarray, asyncio.Future, float]]):
+        """Run one forward pass for the batch and resolve each caller's future"""
+        # Drop requests whose callers went away while queued
+        batch = [item for item in batch if not item[1].done()]
+        if not batch:
+            return
+
+        self.batches_total += 1
+        self.batch_size_counts[len(batch)] = self.batch_size_counts.get(len(batch), 0) + 1
+
+        started = time.perf_counter()
+        if self.metrics is not None:
+            for _, _, enqueued in batch:
+                self.metrics.observe_stage('queue_wait', started - enqueued)
+            self.metrics.observe_batch(len(batch))
+
+        try:
+            inputs = np.stack([image for image, _, _ in batch])
+            outputs = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.predict_fn, inputs
+            )
+        except Exception as e:
+            logger.error(f"Error during batched prediction: {str(e)}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        if self.metrics is not None:
+            self.metrics.observe_stage('forward', time.perf_counter() - started)
+
+        for i, (_, future, _) in enumerate(batch):
+            if not future.done():
+                future.set_result(outputs[i])
+
+    def queue_depth(self) -> int:
+        """Images waiting for a forward pass"""
+        return len(self._pending)
+
+    def get_stats(self) -> Dict:
+        """Get queue-depth and batch-size counters"""
+        batched_requests = sum(size * count for size, count in self.batch_size_counts.items())
+        return {
+            'queue_depth': len(self._pending),
+            'max_queue_depth': self.max_queue_depth,
+            'requests_total': self.requests_total,
+            'batches_total': self.batches_total,
+            'avg_batch_size': round(batched_requests / self.batches_total, 2) if self.batches_total else 0.0,
+            'batch_size_counts': {str(size): count for size, count in sorted(self.batch_size_counts.items())},
+            'running_batches': len(self._running_batches),
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait_ms,
+            'max_concurrent_batches': self.max_concurrent_batches
+        }
@@ -4,20 +4,214 @@ import random
 import json
 import cv2
 import numpy as np
+import pandas as pd
 from PIL import Image, ImageEnhance, ImageFilter
 import albumentations as A
 from sklearn.model_selection import train_test_split
 import logging
-from typing import List, Tuple, Dict
+import time
+import hashlib
+import zlib
+import queue
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Tuple, Dict, Optional
 from pathlib import Path
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Columns of the persisted quality index, one row per readable source image
+QUALITY_INDEX_DTYPE = np.dtype([
+    ('blur', np.float32),
+    ('brightness', np.float32),
+    ('dark_fraction', np.float32),
+    ('bright_fraction', np.float32),
+    ('colorfulness', np.float32),
+    ('width', np.int32),
+    ('height', np.int32),
+    ('kept', np.bool_)
+])
+
+REJECTED_DIR = '.rejected'
+
+def score_image_quality(image: np.ndarray, max_side: int = 512) -> Dict:
+    """Blur, exposure, colour and size scores of a BGR image, computed on a downscaled copy"""
+    height, width = image.shape[:2]
+    
+    # Scores only need coarse structure, so work on at most max_side pixels per side
+    scale = max_side / max(height, width)
+    if scale < 1.0:
+        image = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+    
+    # Blur: Laplacian variance of the grayscale image
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    blur = cv2.Laplacian(gray, cv2.CV_32F).var(dtype=np.float32)
+    
+    # Exposure: mean level and clipped shadows/highlights from the histogram
+    histogram = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel() / gray.size
+    brightness = np.dot(histogram, np.arange(256, dtype=np.float32))
+    
+    # Colour: Hasler-Suesstrunk colourfulness
+    b, g, r = cv2.split(image.astype(np.float32))
+    rg = r - g
+    yb = 0.5 * (r + g) - b
+    colorfulness = np.hypot(rg.std(), yb.std()) + 0.3 * np.hypot(rg.mean(), yb.mean())
+    
+    return {
+        'blur': float(blur),
+        'brightness': float(brightness),
+        'dark_fraction': float(histogram[:6].sum()),
+        'bright_fraction': float(histogram[250:].sum()),
+        'colorfulness': float(colorfulness),
+        'width': int(width),
+        'height': int(height)
+    }
+
+def quality_mask(scores, config: Dict):
+    """Which images pass the configured thresholds; works on one score dict or a whole index"""
+    return ((scores['blur'] >= config['quality_threshold'])
+            & (scores['width'] >= config['min_image_size'])
+            & (scores['height'] >= config['min_image_size'])
+            & (scores['dark_fraction'] + scores['bright_fraction'] <= config['max_clipped_fraction']))
+
+def clean_image(input_path: str, output_dir: str, class_name: str, config: Dict,
+                known_hash: Optional[str] = None) -> Dict:
+    """Read, hash, score, resize and save one image with a single decode
+    
+    Images that fail the quality thresholds are still written, under
+    output_dir/.rejected/<class>, so a threshold change can move them back
+    without decoding the source again.
+    """
+    with open(input_path, 'rb') as f:
+        data = f.read()
+    
+    file_hash = hashlib.sha1(data).hexdigest()
+    if file_hash == known_hash:
+        return {'sha1': file_hash, 'unchanged': True}
+    
+    result = {'sha1': file_hash, 'output': None, 'kept': False, 'quality': None}
+    
+    # Decode once for both the quality scores and the resized output
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return result
+    
+    result['quality'] = score_image_quality(image, config['quality_max_side'])
+    result['kept'] = bool(quality_mask(result['quality'], config))
+    
+    # Resize and save, named by content so re-runs and parallel workers never collide
+    result['output'] = f"{class_name}_{file_hash[:16]}.{config['output_format']}"
+    image = cv2.resize(image, tuple(config['target_size']))
+    output_path = clean_output_path(output_dir, class_name, result['output'], result['kept'])
+    cv2.imwrite(output_path, image, [cv2.IMWRITE_JPEG_QUALITY, config['output_quality']])
+    
+    return result
+
+def clean_image_batch(tasks: List[Tuple[str, str, Optional[str]]], output_dir: str, config: Dict) -> List[Dict]:
+    """Clean a chunk of (input_path, class_name, known_hash) tasks in one worker call"""
+    results = []
+    for input_path, class_name, known_hash in tasks:
+        try:
+            results.append(clean_image(input_path, output_dir, class_name, config, known_hash))
+        except Exception as e:
+            results.append({'error': str(e)})
+    return results
+
+def clean_output_path(output_dir: str, class_name: str, filename: str, kept: bool) -> str:
+    """Where a cleaned image lives depending on whether it passed the quality filter"""
+    if kept:
+        return os.path.join(output_dir, class_name, filename)
+    return os.path.join(output_dir, REJECTED_DIR, class_name, filename)
+
+def manifest_output_path(output_dir: str, key: str, entry: Optional[Dict]) -> Optional[str]:
+    """Where a clean manifest entry's output lives, or None if it has none"""
+    if not entry or not entry.get('output'):
+        return None
+    return clean_output_path(output_dir, key.split('/', 1)[0], entry['output'], entry['kept'])
+
+class DecodedImageCache:
+    def __init__(self, max_bytes: int):
+        """LRU cache of decoded source images bounded by a byte budget"""
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._images: "OrderedDict[str, np.ndarray]" = OrderedDict()
+    
+    def get(self, key: str) -> Optional[np.ndarray]:
+        image = self._images.get(key)
+        if image is not None:
+            self._images.move_to_end(key)
+        return image
+    
+    def put(self, key: str, image: np.ndarray):
+        if image.nbytes > self.max_bytes:
+            return
+        
+        self._images[key] = image
+        self.current_bytes += image.nbytes
+        while self.current_bytes > self.max_bytes:
+            _, evicted = self._images.popitem(last=False)
+            self.current_bytes -= evicted.nbytes
+
+# Per-process state of augmentation workers, set up by init_augmentation_worker
+_augmentation_worker = {}
+
+def init_augmentation_worker(config: Dict, cache_bytes: int, write_queue_size: int):
+    """Build the pipeline, decode cache and writer thread once per worker process"""
+    write_queue = queue.Queue(maxsize=write_queue_size)
+    threading.Thread(target=write_augmented_images, args=(write_queue, config['output_quality']),
+                     daemon=True).start()
+    
+    _augmentation_worker['preprocessor'] = DatasetPreprocessor(config=config)
+    _augmentation_worker['cache'] = DecodedImageCache(cache_bytes)
+    _augmentation_worker['write_queue'] = write_queue
+
+def write_augmented_images(write_queue: queue.Queue, output_quality: int):
+    """Encode and save augmented images so disk I/O overlaps with augmentation"""
+    while True:
+        output_path, image = write_queue.get()
+        try:
+            image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+            cv2.imwrite(output_path, image, [cv2.IMWRITE_JPEG_QUALITY, output_quality])
+        except Exception as e:
+            logger.error(f"Error saving augmented image {output_path}: {str(e)}")
+        finally:
+            write_queue.task_done()
+
+def augment_chunk(tasks: List[Tuple[str, str, int]]) -> int:
+    """Augment a chunk of (input_path, output_path, seed) tasks inside a worker process"""
+    preprocessor = _augmentation_worker['preprocessor']
+    cache = _augmentation_worker['cache']
+    write_queue = _augmentation_worker['write_queue']
+    
+    generated = 0
+    for input_path, output_path, seed in tasks:
+        try:
+            # Decode each source once while it stays in the cache
+            image = cache.get(input_path)
+            if image is None:
+                image = cv2.imread(input_path)
+                if image is None:
+                    raise ValueError(f"Could not read {input_path}")
+                image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+                cache.put(input_path, image)
+            
+            # Blocks when the writer falls behind, bounding memory
+            write_queue.put((output_path, preprocessor.augment_image(image, seed)))
+            generated += 1
+            
+        except Exception as e:
+            logger.error(f"Error generating augmented image: {str(e)}")
+    
+    write_queue.join()
+    return generated
+
 class DatasetPreprocessor:
-    def __init__(self, config_path: str = 'preprocessing_config.json'):
+    def __init__(self, config_path: str = 'preprocessing_config.json', config: Optional[Dict] = None):
         """Initialize dataset preprocessor"""
-        self.config = self.load_config(config_path)
+        self.config = config if config is not None else self.load_config(config_path)
         self.augmentation_pipeline = self.create_augmentation_pipeline()
     
     def load_config(self, config_path: str) -> Dict:
@@ -28,11 +222,23 @@ class DatasetPreprocessor:
             "test_split": 0.1,
             "augmentation_factor": 3,
             "quality_threshold": 50,
+            "min_image_size": 100,
+            "max_clipped_fraction": 1.0,
+            "quality_max_side": 512,
             "min_samples_per_class": 100,
             "max_samples_per_class": 2000,
             "image_formats": [".jpg", ".jpeg", ".png", ".bmp", ".tiff"],
             "output_format": "jpg",
-            "output_quality": 95
+            "output_quality": 95,
+            "num_workers": None,
+            "balancing_mode": "disk",
+            "split_strategy": "copy",
+            "split_seed": 42,
+            "augmentation_seed": 42,
+            "augmentation_cache_bytes": 536870912,
+            "augmentation_write_queue": 64,
+            "export_shards": False,
+            "shard_records": 1024
         }
         
         if os.path.exists(config_path):
@@ -101,78 +307,226 @@ class DatasetPreprocessor:
             if image is None:
                 return False
             
-            # Check image size
-            height, width = image.shape[:2]
-            if height < 100 or width < 100:
-                return False
-            
-            # Check if image is too blurry (Laplacian variance)
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-            
-            if laplacian_var < self.config['quality_threshold']:
-                return False
-            
-            return True
+            scores = score_image_quality(image, self.config['quality_max_side'])
+            return bool(quality_mask(scores, self.config))
             
         except Exception as e:
             logger.warning(f"Error checking image quality for {image_path}: {str(e)}")
             return False
     
-    def clean_dataset(self, input_dir: str, output_dir: str):
+    def _list_class_dirs(self, dataset_dir: str) -> List[str]:
+        """Class subdirectories of a dataset, ignoring hidden ones such as .rejected"""
+        return sorted(d for d in os.listdir(dataset_dir)
+                      if not d.startswith('.') and os.path.isdir(os.path.join(dataset_dir, d)))
+    
+    def load_clean_manifest(self, output_dir: str) -> Dict:
+        """Load the record of source files already cleaned into output_dir"""
+        manifest_path = os.path.join(output_dir, 'clean_manifest.json')
+        # Quality thresholds are not part of this: changing them only re-filters
+        settings = {
+            'target_size': self.config['target_size'],
+            'output_format': self.config['output_format'],
+            'output_quality': self.config['output_quality'],
+            'quality_max_side': self.config['quality_max_side']
+        }
+        
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as f:
+                manifest = json.load(f)
+            # Outputs depend on these settings; if any changed, start over
+            if manifest.get('settings') == settings:
+                return manifest
+            logger.info("Cleaning settings changed, reprocessing all images")
+        
+        return {'settings': settings, 'files': {}}
+    
+    def save_clean_manifest(self, output_dir: str, manifest: Dict):
+        """Atomically write the clean manifest so a crash never leaves it half-written"""
+        manifest_path = os.path.join(output_dir, 'clean_manifest.json')
+        temp_path = manifest_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, manifest_path)
+    
+    def save_quality_index(self, output_dir: str, manifest: Dict):
+        """Write the quality scores of every readable image as a columnar index"""
+        keys = sorted(key for key, entry in manifest['files'].items() if entry['quality'] is not None)
+        
+        index = np.zeros(len(keys), dtype=QUALITY_INDEX_DTYPE)
+        for field in QUALITY_INDEX_DTYPE.names:
+            if field == 'kept':
+                index[field] = [manifest['files'][key]['kept'] for key in keys]
+            else:
+                index[field] = [manifest['files'][key]['quality'][field] for key in keys]
+        
+        # Save as a plain .npy so readers can np.load(..., mmap_mode='r') it
+        np.save(os.path.join(output_dir, 'quality_index.npy'), index)
+        with open(os.path.join(output_dir, 'quality_index_keys.json'), 'w') as f:
+            json.dump({'keys': keys, 'outputs': [manifest['files'][key]['output'] for key in keys]}, f)
+    
+    def refilter_dataset(self, output_dir: str, manifest: Optional[Dict] = None) -> Dict:
+        """Re-apply the current quality thresholds from the quality index without decoding"""
+        if manifest is None:
+            manifest = self.load_clean_manifest(output_dir)
+        
+        index = np.load(os.path.join(output_dir, 'quality_index.npy'))
+        with open(os.path.join(output_dir, 'quality_index_keys.json'), 'r') as f:
+            index_keys = json.load(f)
+        
+        # One vectorized pass over the scores decides every image
+        keep = quality_mask(index, self.config)
+        changed = np.flatnonzero(keep != index['kept'])
+        
+        for i in changed:
+            key = index_keys['keys'][i]
+            class_name = key.split('/', 1)[0]
+            filename = index_keys['outputs'][i]
+            src_path = clean_output_path(output_dir, class_name, filename, bool(index['kept'][i]))
+            dst_path = clean_output_path(output_dir, class_name, filename, bool(keep[i]))
+            
+            if os.path.exists(src_path):
+                os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+                os.replace(src_path, dst_path)
+            if key in manifest['files']:
+                manifest['files'][key]['kept'] = bool(keep[i])
+        
+        if len(changed):
+            logger.info(f"Quality filter moved {len(changed)} images "
+                        f"({int(keep[changed].sum())} restored, {int((~keep[changed]).sum())} rejected)")
+            index['kept'] = keep
+            np.save(os.path.join(output_dir, 'quality_index.npy'), index)
+            self.save_clean_manifest(output_dir, manifest)
+        
+        return self.save_clean_stats(output_dir, manifest)
+    
+    def save_clean_stats(self, output_dir: str, manifest: Dict) -> Dict:
+        """Summarize kept and rejected images per class into dataset_stats.json"""
+        dataset_stats = {}
+        for key, entry in sorted(manifest['files'].items()):
+            class_stats = dataset_stats.setdefault(
+                key.split('/', 1)[0], {'valid_images': 0, 'invalid_images': 0, 'total_images': 0}
+            )
+            class_stats['valid_images' if entry['kept'] else 'invalid_images'] += 1
+            class_stats['total_images'] += 1
+        
+        for class_name, class_stats in dataset_stats.items():
+            logger.info(f"Class {class_name}: {class_stats['valid_images']} valid, "
+                        f"{class_stats['invalid_images']} invalid images")
+        
+        # Save dataset statistics
+        with open(os.path.join(output_dir, 'dataset_stats.json'), 'w') as f:
+            json.dump(dataset_stats, f, indent=4)
+        
+        return dataset_stats
+    
+    def clean_dataset(self, input_dir: str, output_dir: str, num_workers: Optional[int] = None,
+                      chunk_size: int = 32):
         """Clean and organize dataset"""
         logger.info(f"Cleaning dataset from {input_dir} to {output_dir}")
         
         os.makedirs(output_dir, exist_ok=True)
+        num_workers = num_workers or self.config.get('num_workers') or os.cpu_count()
         
-        # Get all class directories
-        class_dirs = [d for d in os.listdir(input_dir) 
-                     if os.path.isdir(os.path.join(input_dir, d))]
+        manifest = self.load_clean_manifest(output_dir)
+        previous_files = manifest['files']
+        manifest['files'] = {}
         
-        dataset_stats = {}
+        # Get all class directories
+        class_dirs = self._list_class_dirs(input_dir)
         
+        # Find new or modified source files; unchanged ones are carried over
+        tasks = []
         for class_name in class_dirs:
             input_class_dir = os.path.join(input_dir, class_name)
-            output_class_dir = os.path.join(output_dir, class_name)
-            os.makedirs(output_class_dir, exist_ok=True)
+            os.makedirs(os.path.join(output_dir, class_name), exist_ok=True)
+            os.makedirs(os.path.join(output_dir, REJECTED_DIR, class_name), exist_ok=True)
             
-            # Get all image files
-            image_files = []
-            for ext in self.config['image_formats']:
-                image_files.extend([f for f in os.listdir(input_class_dir) 
-                                  if f.lower().endswith(ext.lower())])
-            
-            valid_images = 0
-            invalid_images = 0
+            image_files = sorted(f for f in os.listdir(input_class_dir)
+                                 if f.lower().endswith(tuple(ext.lower() for ext in self.config['image_formats'])))
             
             for image_file in image_files:
                 input_path = os.path.join(input_class_dir, image_file)
+                key = f"{class_name}/{image_file}"
+                stat = os.stat(input_path)
+                entry = previous_files.pop(key, None)
                 
-                # Check image quality
-                if self.check_image_quality(input_path):
-                    # Copy valid image
-                    output_filename = f"{class_name}_{valid_images:04d}.{self.config['output_format']}"
-                    output_path = os.path.join(output_class_dir, output_filename)
-                    
-                    # Load, resize and save image
-                    self.process_and_save_image(input_path, output_path)
-                    valid_images += 1
-                else:
-                    invalid_images += 1
-            
-            dataset_stats[class_name] = {
-                'valid_images': valid_images,
-                'invalid_images': invalid_images,
-                'total_images': valid_images + invalid_images
+                output_exists = entry is not None and (entry['output'] is None or os.path.exists(
+                    clean_output_path(output_dir, class_name, entry['output'], entry['kept'])
+                ))
+                if output_exists and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                    manifest['files'][key] = entry
+                    continue
+                
+                tasks.append((key, class_name, input_path, stat, entry if output_exists else None))
+        
+        # Outputs are named by content, so byte-identical sources share one file;
+        # count references and only delete a file when no entry points at it any more
+        output_refs = Counter(manifest_output_path(output_dir, key, entry)
+                              for key, entry in manifest['files'].items())
+        output_refs.update(manifest_output_path(output_dir, key, entry) for key, _, _, _, entry in tasks)
+        
+        def release_output(path: Optional[str]):
+            if path is None:
+                return
+            output_refs[path] -= 1
+            if output_refs[path] <= 0 and os.path.exists(path):
+                os.remove(path)
+        
+        # Remove outputs whose source files are gone
+        for key, entry in previous_files.items():
+            output_refs[manifest_output_path(output_dir, key, entry)] += 1
+            release_output(manifest_output_path(output_dir, key, entry))
+        
+        logger.info(f"{len(manifest['files'])} images unchanged, {len(tasks)} to process with {num_workers} workers")
+        
+        # Ship work in chunks to keep per-image pickling overhead low
+        chunks = [tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+        completed = 0
+        
+        with ProcessPoolExecutor(max_workers=num_workers) as pool:
+            futures = {
+                pool.submit(
+                    clean_image_batch,
+                    [(input_path, class_name, entry['sha1'] if entry else None)
+                     for _, class_name, input_path, _, entry in chunk],
+                    output_dir,
+                    self.config
+                ): chunk
+                for chunk in chunks
             }
             
-            logger.info(f"Class {class_name}: {valid_images} valid, {invalid_images} invalid images")
+            for future in as_completed(futures):
+                for (key, class_name, _, stat, entry), result in zip(futures[future], future.result()):
+                    if 'error' in result:
+                        logger.warning(f"Error cleaning image {key}: {result['error']}")
+                        # The entry is dropped, so its previous output must not linger in the class directory
+                        release_output(manifest_output_path(output_dir, key, entry))
+                        continue
+                    
+                    if result.get('unchanged'):
+                        # Touched but identical content: keep the existing output
+                        result = {k: v for k, v in entry.items() if k not in ('size', 'mtime_ns')}
+                    
+                    result.pop('unchanged', None)
+                    manifest['files'][key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, **result}
+                    
+                    # Take the new reference before dropping the old one, in case they are the same file
+                    new_path = manifest_output_path(output_dir, key, manifest['files'][key])
+                    if new_path is not None:
+                        output_refs[new_path] += 1
+                    release_output(manifest_output_path(output_dir, key, entry))
+                
+                # Checkpoint progress so an interrupted run resumes where it stopped
+                completed += len(futures[future])
+                if completed // 500 != (completed - len(futures[future])) // 500:
+                    self.save_clean_manifest(output_dir, manifest)
+                    logger.info(f"Processed {completed}/{len(tasks)} images")
         
-        # Save dataset statistics
-        with open(os.path.join(output_dir, 'dataset_stats.json'), 'w') as f:
-            json.dump(dataset_stats, f, indent=4)
+        self.save_clean_manifest(output_dir, manifest)
+        self.save_quality_index(output_dir, manifest)
         
-        return dataset_stats
+        # Carried-over images may have been filtered with older thresholds
+        return self.refilter_dataset(output_dir, manifest)
     
     def process_and_save_image(self, input_path: str, output_path: str):
         """Process and save individual image"""
@@ -193,16 +547,18 @@ class DatasetPreprocessor:
         except Exception as e:
             logger.error(f"Error processing image {input_path}: {str(e)}")
     
-    def balance_dataset(self, input_dir: str, output_dir: str):
+    def balance_dataset(self, input_dir: str, output_dir: str, num_workers: Optional[int] = None):
         """Balance dataset by augmenting underrepresented classes"""
+        if self.config['balancing_mode'] == 'virtual':
+            return self.write_balanced_manifest(input_dir, output_dir)
+        
         logger.info(f"Balancing dataset from {input_dir} to {output_dir}")
         
         os.makedirs(output_dir, exist_ok=True)
         
         # Get class statistics
         class_counts = {}
-        class_dirs = [d for d in os.listdir(input_dir) 
-                     if os.path.isdir(os.path.join(input_dir, d))]
+        class_dirs = self._list_class_dirs(input_dir)
         
         for class_name in class_dirs:
             class_dir = os.path.join(input_dir, class_name)
@@ -216,14 +572,15 @@ class DatasetPreprocessor:
         
         logger.info(f"Target samples per class: {target_count}")
         
+        augmentation_tasks = []
         for class_name in class_dirs:
             input_class_dir = os.path.join(input_dir, class_name)
             output_class_dir = os.path.join(output_dir, class_name)
             os.makedirs(output_class_dir, exist_ok=True)
             
             # Get all images for this class
-            image_files = [f for f in os.listdir(input_class_dir) 
-                          if any(f.lower().endswith(ext.lower()) for ext in self.config['image_formats'])]
+            image_files = sorted(f for f in os.listdir(input_class_dir) 
+                                 if any(f.lower().endswith(ext.lower()) for ext in self.config['image_formats']))
             
             current_count = len(image_files)
             
@@ -233,93 +590,217 @@ class DatasetPreprocessor:
                 output_path = os.path.join(output_class_dir, f"{class_name}_orig_{i:04d}.jpg")
                 shutil.copy2(input_path, output_path)
             
-            # Generate augmented images if needed
+            # Plan augmented images if needed
             if current_count < target_count:
                 augmentations_needed = target_count - current_count
                 logger.info(f"Generating {augmentations_needed} augmented images for class {class_name}")
                 
-                self.generate_augmented_images(
+                augmentation_tasks.extend(self.plan_augmentations(
                     input_class_dir, 
                     output_class_dir, 
                     class_name,
                     augmentations_needed
-                )
+                ))
+        
+        # One worker pool for every class keeps all cores busy across small classes
+        self.run_augmentations(augmentation_tasks, num_workers)
     
-    def generate_augmented_images(self, input_dir: str, output_dir: str, class_name: str, count: int):
-        """Generate augmented images for a class"""
-        # Get all images
-        image_files = [f for f in os.listdir(input_dir) 
-                      if any(f.lower().endswith(ext.lower()) for ext in self.config['image_formats'])]
-        
-        generated = 0
-        while generated < count:
-            # Randomly select an image
-            image_file = random.choice(image_files)
-            input_path = os.path.join(input_dir, image_file)
+    def write_balanced_manifest(self, input_dir: str, output_dir: str) -> str:
+        """Describe a balanced, split dataset as (source, augmentation seed, split) rows
+        
+        Nothing is copied or augmented on disk: training reads
+        balanced_manifest.csv and replays each row's augmentation seed on the
+        fly. Splits are assigned to source images first and only the train
+        split is balanced, so augmented copies never leak into val or test.
+        """
+        logger.info(f"Writing virtual balanced dataset for {input_dir} to {output_dir}")
+        
+        os.makedirs(output_dir, exist_ok=True)
+        
+        class_files = {}
+        for class_name in self._list_class_dirs(input_dir):
+            class_dir = os.path.join(input_dir, class_name)
+            class_files[class_name] = sorted(f for f in os.listdir(class_dir) 
+                                             if any(f.lower().endswith(ext.lower()) for ext in self.config['image_formats']))
+        
+        # Same target as the on-disk mode, scaled to the train share
+        target_count = min(max(len(files) for files in class_files.values()), self.config['max_samples_per_class'])
+        target_count = max(target_count, self.config['min_samples_per_class'])
+        train_fraction = 1 - self.config['validation_split'] - self.config['test_split']
+        train_target = max(1, round(target_count * train_fraction))
+        
+        logger.info(f"Target train samples per class: {train_target}")
+        
+        rows = []
+        for class_name, image_files in class_files.items():
+            # Paths are stored relative to the manifest so the dataset can be moved
+            paths = [os.path.relpath(os.path.join(input_dir, class_name, f), output_dir) for f in image_files]
+            train_files, val_files, test_files = self.split_files(paths)
+            
+            for files, split in [(train_files, 'train'), (val_files, 'val'), (test_files, 'test')]:
+                rows.extend((path, class_name, -1, split) for path in files)
             
+            if len(train_files) < train_target:
+                sources, seeds = self.augmentation_plan(class_name, len(train_files), train_target - len(train_files))
+                rows.extend((train_files[source], class_name, int(seed), 'train')
+                            for source, seed in zip(sources, seeds))
+        
+        manifest = pd.DataFrame(rows, columns=['path', 'label', 'aug_seed', 'split'])
+        manifest_path = os.path.join(output_dir, 'balanced_manifest.csv')
+        manifest.to_csv(manifest_path, index=False)
+        
+        logger.info(f"Balanced manifest with {len(manifest)} samples "
+                    f"({int((manifest['aug_seed'] >= 0).sum())} augmented on the fly) saved to {manifest_path}")
+        return manifest_path
+    
+    def augment_image(self, image: np.ndarray, seed: int) -> np.ndarray:
+        """Augment one RGB image reproducibly from its own seed"""
+        # Albumentations draws from the global random and numpy generators
+        random.seed(seed)
+        np.random.seed(seed)
+        return self.augmentation_pipeline(image=image)['image']
+    
+    def augmentation_plan(self, class_name: str, num_sources: int, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Source index and augmentation seed for each of count augmented samples of a class"""
+        # Derived from the master seed and class name only, so results do not
+        # depend on worker count or scheduling
+        seed_sequence = np.random.SeedSequence([self.config['augmentation_seed'], zlib.crc32(class_name.encode('utf-8'))])
+        rng = np.random.default_rng(seed_sequence)
+        sources = rng.integers(num_sources, size=count)
+        seeds = rng.integers(2 ** 32, size=count, dtype=np.uint64)
+        return sources, seeds
+    
+    def plan_augmentations(self, input_dir: str, output_dir: str, class_name: str,
+                           count: int) -> List[Tuple[str, str, int]]:
+        """Pick a source image and a seed for every augmented output of a class"""
+        image_files = sorted(f for f in os.listdir(input_dir) 
+                             if any(f.lower().endswith(ext.lower()) for ext in self.config['image_formats']))
+        if not image_files:
+            return []
+        
+        sources, seeds = self.augmentation_plan(class_name, len(image_files), count)
+        tasks = [
+            (os.path.join(input_dir, image_files[source]),
+             os.path.join(output_dir, f"{class_name}_aug_{i:04d}.jpg"),
+             int(seed))
+            for i, (source, seed) in enumerate(zip(sources, seeds))
+        ]
+        
+        # Group by source so each decoded image is reused while it is cached
+        tasks.sort(key=lambda task: task[0])
+        return tasks
+    
+    def run_augmentations(self, tasks: List[Tuple[str, str, int]], num_workers: Optional[int] = None,
+                          chunk_size: int = 64) -> int:
+        """Generate planned augmented images across a pool of worker processes"""
+        if not tasks:
+            return 0
+        
+        num_workers = num_workers or self.config.get('num_workers') or os.cpu_count()
+        chunks = [tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+        
+        start_time = time.time()
+        with ProcessPoolExecutor(
+            max_workers=num_workers,
+            initializer=init_augmentation_worker,
+            initargs=(self.config, self.config['augmentation_cache_bytes'] // num_workers,
+                      self.config['augmentation_write_queue'])
+        ) as pool:
+            generated = sum(pool.map(augment_chunk, chunks))
+        
+        elapsed = time.time() - start_time
+        logger.info(f"Generated {generated} augmented images in {elapsed:.1f}s "
+                    f"({generated / max(elapsed, 1e-9):.1f} images/s, {num_workers} workers)")
+        return generated
+    
+    def generate_augmented_images(self, input_dir: str, output_dir: str, class_name: str, count: int,
+                                  num_workers: Optional[int] = None):
+        """Generate augmented images for a class"""
+        tasks = self.plan_augmentations(input_dir, output_dir, class_name, count)
+        return self.run_augmentations(tasks, num_workers)
+    
+    def split_files(self, files: List[str]) -> Tuple[List[str], List[str], List[str]]:
+        """Split one class's files into train, validation and test lists"""
+        # Sort first so the split depends only on split_seed, not listing order
+        train_files, temp_files = train_test_split(
+            sorted(files), 
+            test_size=self.config['validation_split'] + self.config['test_split'],
+            random_state=self.config['split_seed']
+        )
+        
+        val_files, test_files = train_test_split(
+            temp_files,
+            test_size=self.config['test_split'] / (self.config['validation_split'] + self.config['test_split']),
+            random_state=self.config['split_seed']
+        )
+        
+        return train_files, val_files, test_files
+    
+    def place_split_file(self, src_path: str, dst_path: str, strategy: str) -> str:
+        """Put one file into a split directory by copying or linking; returns the strategy used"""
+        if os.path.lexists(dst_path):
+            os.remove(dst_path)
+        
+        if strategy == 'hardlink':
             try:
-                # Load image
-                image = cv2.imread(input_path)
-                image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                
-                # Apply augmentation
-                augmented = self.augmentation_pipeline(image=image)
-                augmented_image = augmented['image']
-                
-                # Save augmented image
-                output_path = os.path.join(output_dir, f"{class_name}_aug_{generated:04d}.jpg")
-                augmented_image = cv2.cvtColor(augmented_image, cv2.COLOR_RGB2BGR)
-                cv2.imwrite(output_path, augmented_image, [cv2.IMWRITE_JPEG_QUALITY, self.config['output_quality']])
-                
-                generated += 1
-                
-            except Exception as e:
-                logger.error(f"Error generating augmented image: {str(e)}")
-                continue
+                os.link(src_path, dst_path)
+                return strategy
+            except OSError:
+                # Hardlinks cannot cross filesystems
+                strategy = 'copy'
+        elif strategy == 'symlink':
+            os.symlink(os.path.abspath(src_path), dst_path)
+            return strategy
+        
+        shutil.copy2(src_path, dst_path)
+        return strategy
     
     def split_dataset(self, input_dir: str, output_dir: str):
         """Split dataset into train, validation, and test sets"""
-        logger.info(f"Splitting dataset from {input_dir} to {output_dir}")
+        strategy = self.config['split_strategy']
+        if strategy not in ('copy', 'hardlink', 'symlink', 'manifest'):
+            raise ValueError(f"Unknown split strategy '{strategy}'")
+        
+        logger.info(f"Splitting dataset from {input_dir} to {output_dir} ({strategy})")
         
         # Create output directories
-        for split in ['train', 'val', 'test']:
-            os.makedirs(os.path.join(output_dir, split), exist_ok=True)
+        os.makedirs(output_dir, exist_ok=True)
+        if strategy != 'manifest':
+            for split in ['train', 'val', 'test']:
+                os.makedirs(os.path.join(output_dir, split), exist_ok=True)
         
-        class_dirs = [d for d in os.listdir(input_dir) 
-                     if os.path.isdir(os.path.join(input_dir, d))]
+        class_dirs = self._list_class_dirs(input_dir)
         
         split_stats = {}
+        manifest_rows = {'train': [], 'val': [], 'test': []}
+        copy_fallbacks = 0
         
         for class_name in class_dirs:
             input_class_dir = os.path.join(input_dir, class_name)
             
             # Create class directories in each split
-            for split in ['train', 'val', 'test']:
-                os.makedirs(os.path.join(output_dir, split, class_name), exist_ok=True)
+            if strategy != 'manifest':
+                for split in ['train', 'val', 'test']:
+                    os.makedirs(os.path.join(output_dir, split, class_name), exist_ok=True)
             
             # Get all images
             image_files = [f for f in os.listdir(input_class_dir) 
                           if any(f.lower().endswith(ext.lower()) for ext in self.config['image_formats'])]
             
             # Split images
-            train_files, temp_files = train_test_split(
-                image_files, 
-                test_size=self.config['validation_split'] + self.config['test_split'],
-                random_state=42
-            )
-            
-            val_files, test_files = train_test_split(
-                temp_files,
-                test_size=self.config['test_split'] / (self.config['validation_split'] + self.config['test_split']),
-                random_state=42
-            )
+            train_files, val_files, test_files = self.split_files(image_files)
             
-            # Copy files to respective directories
+            # Link, copy or just record files for the respective splits
             for files, split in [(train_files, 'train'), (val_files, 'val'), (test_files, 'test')]:
                 for image_file in files:
                     src_path = os.path.join(input_class_dir, image_file)
+                    if strategy == 'manifest':
+                        manifest_rows[split].append((os.path.relpath(src_path, output_dir), class_name, -1, split))
+                        continue
+                    
                     dst_path = os.path.join(output_dir, split, class_name, image_file)
-                    shutil.copy2(src_path, dst_path)
+                    if self.place_split_file(src_path, dst_path, strategy) != strategy:
+                        copy_fallbacks += 1
             
             split_stats[class_name] = {
                 'train': len(train_files),
@@ -330,6 +811,16 @@ class DatasetPreprocessor:
             
             logger.info(f"Class {class_name}: Train={len(train_files)}, Val={len(val_files)}, Test={len(test_files)}")
         
+        if copy_fallbacks:
+            logger.warning(f"{copy_fallbacks} files were copied because they could not be hardlinked")
+        
+        # Manifest splits use the same columns as the virtual balanced manifest
+        if strategy == 'manifest':
+            for split, rows in manifest_rows.items():
+                pd.DataFrame(rows, columns=['path', 'label', 'aug_seed', 'split']).to_csv(
+                    os.path.join(output_dir, f"{split}.csv"), index=False
+                )
+        
         # Save split statistics
         with open(os.path.join(output_dir, 'split_stats.json'), 'w') as f:
             json.dump(split_stats, f, indent=4)
@@ -347,8 +838,7 @@ class DatasetPreprocessor:
             'file_format_distribution': {}
         }
         
-        class_dirs = [d for d in os.listdir(dataset_dir) 
-                     if os.path.isdir(os.path.join(dataset_dir, d))]
+        class_dirs = self._list_class_dirs(dataset_dir)
         
         for class_name in class_dirs:
             class_dir = os.path.join(dataset_dir, class_name)
@@ -386,7 +876,12 @@ def main():
     
     # Step 2: Balance dataset
     logger.info("Step 2: Balancing dataset...")
-    preprocessor.balance_dataset(cleaned_dataset_dir, balanced_dataset_dir)
+    balanced = preprocessor.balance_dataset(cleaned_dataset_dir, balanced_dataset_dir)
+    
+    # Virtual balancing already assigned splits; train directly from the manifest
+    if preprocessor.config['balancing_mode'] == 'virtual':
+        logger.info(f"Dataset preprocessing completed! Train with {balanced}")
+        return
     
     # Step 3: Split dataset
     logger.info("Step 3: Splitting dataset...")
@@ -396,6 +891,12 @@ def main():
     logger.info("Step 4: Creating dataset report...")
     preprocessor.create_dataset_report(final_dataset_dir)
     
+    # Step 5: Pack into TFRecord shards for training on network storage
+    if preprocessor.config['export_shards']:
+        logger.info("Step 5: Exporting TFRecord shards...")
+        from dataset_shards import export_shards
+        export_shards(final_dataset_dir, "dataset_shards", preprocessor.config['shard_records'])
+    
     logger.info("Dataset preprocessing completed!")
 
 if __name__ == "__main__":
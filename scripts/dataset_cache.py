@@ -0,0 +1,151 @@
+import os
+import glob
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+import tensorflow as tf
+
+logger = logging.getLogger(__name__)
+
+
+def dataset_fingerprint(paths: List[str], input_shape: Tuple[int, int, int], salt: str = '') -> str:
+    """Fingerprint of the source files (path, size, mtime), the decoded image size and an optional salt"""
+    digest = hashlib.sha1(repr((tuple(input_shape[:2]), salt)).encode('utf-8'))
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def _decode_into(path: str, out: np.ndarray) -> bool:
+    """Decode and resize one image straight into its cache row"""
+    image = cv2.imread(path, cv2.IMREAD_COLOR)
+    if image is None:
+        return False
+    height, width = out.shape[:2]
+    cv2.cvtColor(cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2RGB, dst=out)
+    return True
+
+
+def build_memmap_cache(paths: List[str], input_shape: Tuple[int, int, int], cache_dir: str,
+                       split: str, num_workers: Optional[int] = None) -> np.ndarray:
+    """Decode and resize every image once into a uint8 [N, H, W, 3] memmap, reusing a matching cache
+
+    The file name carries the dataset fingerprint, so any change to the
+    source files or input_shape builds a new cache and drops the old one.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    fingerprint = dataset_fingerprint(paths, input_shape)
+    cache_path = os.path.join(cache_dir, f"{split}-{fingerprint}.npy")
+
+    if os.path.exists(cache_path):
+        logger.info(f"Using {split} image cache {cache_path}")
+        return np.load(cache_path, mmap_mode='r')
+
+    for stale_path in glob.glob(os.path.join(cache_dir, f"{split}-*.npy")):
+        os.remove(stale_path)
+
+    logger.info(f"Building {split} image cache for {len(paths)} images at {cache_path}")
+    # Distributed workers may build the same cache at once; each writes its own file and the last rename wins
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    images = np.lib.format.open_memmap(
+        temp_path, mode='w+', dtype=np.uint8, shape=(len(paths), input_shape[0], input_shape[1], 3)
+    )
+
+    # OpenCV releases the GIL while decoding and resizing, so threads scale
+    with ThreadPoolExecutor(max_workers=num_workers or os.cpu_count()) as pool:
+        decoded = list(pool.map(_decode_into, paths, images))
+
+    failed = [path for path, ok in zip(paths, decoded) if not ok]
+    if failed:
+        logger.warning(f"{len(failed)} images could not be decoded and are cached as black, e.g. {failed[0]}")
+
+    images.flush()
+    del images
+    os.replace(temp_path, cache_path)
+
+    return np.load(cache_path, mmap_mode='r')
+
+
+def make_memmap_dataset(images: np.ndarray, rows: np.ndarray, labels: np.ndarray, batch_size: int,
+                        shuffle: bool = False, seed: Optional[int] = None,
+                        transform: Optional[Callable[[np.ndarray, np.ndarray], np.ndarray]] = None) -> tf.data.Dataset:
+    """Batches of (cached rows, labels) gathered from a memmap cache of images or features
+
+    rows maps each sample to its cache row, so samples that share a source
+    image share one cached copy. transform(batch, sample_indices) can rewrite
+    a gathered batch in NumPy before it enters the graph.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    labels = np.asarray(labels, dtype=np.int32)
+    dtype = tf.as_dtype(images.dtype)
+
+    def gather(sample_indices):
+        # Read in file order; the order inside a batch does not matter
+        sample_indices = np.sort(sample_indices)
+        batch = images[rows[sample_indices]]
+        if transform is not None:
+            batch = transform(batch, sample_indices)
+        return batch, labels[sample_indices]
+
+    def gather_batch(sample_indices):
+        batch, batch_labels = tf.numpy_function(gather, [sample_indices], (dtype, tf.int32))
+        batch.set_shape([None] + list(images.shape[1:]))
+        batch_labels.set_shape([None])
+        return batch, batch_labels
+
+    dataset = tf.data.Dataset.range(len(rows))
+    if shuffle:
+        dataset = dataset.shuffle(len(rows), seed=seed, reshuffle_each_iteration=True)
+
+    return dataset.batch(batch_size).map(gather_batch, num_parallel_calls=tf.data.AUTOTUNE)
+
+
+def build_feature_cache(extractor, dataset: tf.data.Dataset, num_samples: int, cache_dir: str,
+                        split: str, fingerprint: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Run a frozen feature extractor over (images, labels) batches once into a float16 memmap
+
+    Returns the [N, D] features and their labels, reusing a cache written
+    for the same fingerprint and dropping any other cache of the split.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = os.path.join(cache_dir, f"{split}-{fingerprint}.npy")
+    labels_path = os.path.join(cache_dir, f"{split}-{fingerprint}-labels.npy")
+
+    if os.path.exists(cache_path) and os.path.exists(labels_path):
+        logger.info(f"Using {split} feature cache {cache_path}")
+        return np.load(cache_path, mmap_mode='r'), np.load(labels_path)
+
+    for stale_path in glob.glob(os.path.join(cache_dir, f"{split}-*.npy")):
+        os.remove(stale_path)
+
+    logger.info(f"Extracting {split} features for {num_samples} samples into {cache_path}")
+    temp_path = cache_path + '.tmp'
+    features = np.lib.format.open_memmap(
+        temp_path, mode='w+', dtype=np.float16, shape=(num_samples, extractor.output_shape[-1])
+    )
+    labels = np.empty(num_samples, dtype=np.int32)
+
+    offset = 0
+    for images, batch_labels in dataset:
+        batch_features = np.asarray(extractor.predict_on_batch(images))
+        end = offset + len(batch_features)
+        features[offset:end] = batch_features
+        labels[offset:end] = batch_labels.numpy()
+        offset = end
+
+    if offset != num_samples:
+        del features
+        os.remove(temp_path)
+        raise ValueError(f"Expected {num_samples} {split} samples for the feature cache, got {offset}")
+
+    features.flush()
+    del features
+    np.save(labels_path, labels)
+    os.replace(temp_path, cache_path)
+
+    return np.load(cache_path, mmap_mode='r'), labels
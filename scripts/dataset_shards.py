@@ -0,0 +1,193 @@
+import os
+import json
+import logging
+import argparse
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SPLITS = ['train', 'val', 'test']
+INDEX_FILENAME = 'shards_index.json'
+IMAGE_FORMATS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
+
+FEATURE_SPEC = {
+    'image': tf.io.FixedLenFeature([], tf.string),
+    'label': tf.io.FixedLenFeature([], tf.int64),
+    'aug_seed': tf.io.FixedLenFeature([], tf.int64, default_value=-1)
+}
+
+
+def collect_split_samples(dataset_dir: str) -> Dict[str, List[Tuple[str, str, int]]]:
+    """Gather (path, class name, augmentation seed) samples per split from a prepared dataset
+
+    Accepts either the split manifests (train.csv, val.csv, test.csv) or
+    train/val/test directories with one subdirectory per class, as written
+    by DatasetPreprocessor.split_dataset.
+    """
+    samples = {}
+    for split in SPLITS:
+        manifest_path = os.path.join(dataset_dir, f"{split}.csv")
+        split_dir = os.path.join(dataset_dir, split)
+
+        if os.path.exists(manifest_path):
+            manifest = pd.read_csv(manifest_path)
+            base_dir = os.path.dirname(os.path.abspath(manifest_path))
+            samples[split] = [
+                (os.path.join(base_dir, path), label, int(aug_seed))
+                for path, label, aug_seed in zip(manifest['path'], manifest['label'], manifest['aug_seed'])
+            ]
+        elif os.path.isdir(split_dir):
+            samples[split] = [
+                (os.path.join(split_dir, class_name, f), class_name, -1)
+                for class_name in sorted(os.listdir(split_dir))
+                if os.path.isdir(os.path.join(split_dir, class_name))
+                for f in sorted(os.listdir(os.path.join(split_dir, class_name)))
+                if f.lower().endswith(IMAGE_FORMATS)
+            ]
+        else:
+            raise FileNotFoundError(f"No {split} split found in {dataset_dir}")
+
+    return samples
+
+
+def write_shards(samples: List[Tuple[str, int, int]], output_dir: str, split: str,
+                 records_per_shard: int = 1024) -> List[Dict]:
+    """Pack (path, label index, augmentation seed) samples into fixed-size TFRecord shards"""
+    num_shards = max(1, -(-len(samples) // records_per_shard))
+    shards = []
+
+    for shard_id in range(num_shards):
+        filename = f"{split}-{shard_id:05d}-of-{num_shards:05d}.tfrecord"
+        shard_samples = samples[shard_id * records_per_shard:(shard_id + 1) * records_per_shard]
+
+        with tf.io.TFRecordWriter(os.path.join(output_dir, filename)) as writer:
+            for image_path, label, aug_seed in shard_samples:
+                # Images are already cleaned and resized, so store the encoded bytes as-is
+                with open(image_path, 'rb') as f:
+                    image_bytes = f.read()
+
+                example = tf.train.Example(features=tf.train.Features(feature={
+                    'image': tf.train.Feature(bytes_list=tf.train.BytesList(value=[image_bytes])),
+                    'label': tf.train.Feature(int64_list=tf.train.Int64List(value=[label])),
+                    'aug_seed': tf.train.Feature(int64_list=tf.train.Int64List(value=[aug_seed]))
+                }))
+                writer.write(example.SerializeToString())
+
+        shards.append({'file': filename, 'records': len(shard_samples)})
+
+    return shards
+
+
+def export_shards(dataset_dir: str, output_dir: str, records_per_shard: int = 1024, seed: int = 42) -> str:
+    """Pack a split dataset into TFRecord shards plus a JSON index"""
+    logger.info(f"Exporting shards from {dataset_dir} to {output_dir}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    split_samples = collect_split_samples(dataset_dir)
+
+    class_names = sorted({label for samples in split_samples.values() for _, label, _ in samples})
+    class_to_idx = {cls_name: idx for idx, cls_name in enumerate(class_names)}
+
+    index = {'class_names': class_names, 'records_per_shard': records_per_shard, 'splits': {}}
+    rng = np.random.default_rng(seed)
+
+    for split, samples in split_samples.items():
+        # Mix classes within every shard; sources are class-sorted on disk
+        order = rng.permutation(len(samples))
+        samples = [samples[i] for i in order]
+
+        shards = write_shards(
+            [(path, class_to_idx[label], aug_seed) for path, label, aug_seed in samples],
+            output_dir, split, records_per_shard
+        )
+
+        # Labels and sources let training compute class weights and evaluate without reading shards
+        index['splits'][split] = {
+            'shards': shards,
+            'labels': [class_to_idx[label] for _, label, _ in samples],
+            'aug_seeds': [aug_seed for _, _, aug_seed in samples],
+            'sources': [path for path, _, _ in samples]
+        }
+
+        logger.info(f"Split {split}: {len(samples)} images in {len(shards)} shards")
+
+    index_path = os.path.join(output_dir, INDEX_FILENAME)
+    with open(index_path, 'w') as f:
+        json.dump(index, f)
+
+    return index_path
+
+
+def load_shard_index(shard_dir: str) -> Dict:
+    """Load the index written by export_shards"""
+    with open(os.path.join(shard_dir, INDEX_FILENAME), 'r') as f:
+        index = json.load(f)
+    index['shard_dir'] = shard_dir
+    return index
+
+
+def parse_example(serialized: tf.Tensor) -> Tuple[tf.Tensor, tf.Tensor, tf.Tensor]:
+    """Split one serialized record into encoded image bytes, label and augmentation seed"""
+    features = tf.io.parse_single_example(serialized, FEATURE_SPEC)
+    return features['image'], tf.cast(features['label'], tf.int32), features['aug_seed']
+
+
+def make_shard_dataset(index: Dict, split: str, shuffle: bool = False, seed: Optional[int] = None,
+                       cycle_length: int = 8, cache: Optional[str] = None,
+                       num_workers: int = 1, worker_index: int = 0) -> tf.data.Dataset:
+    """Stream (image bytes, label, augmentation seed) records from a split's shards
+
+    Shards are read in parallel with interleave. When shuffling, the shard
+    order is reshuffled every epoch. With cache set to 'memory' or a file
+    prefix, records are cached after the first epoch. The interleave order is
+    then fixed, so shuffling falls back to the record-level buffer only.
+
+    With num_workers > 1 each worker reads every num_workers-th shard, or
+    every num_workers-th record in a fixed order when there are fewer shards
+    than workers.
+    """
+    files = [os.path.join(index['shard_dir'], shard['file']) for shard in index['splits'][split]['shards']]
+    shard_files = num_workers > 1 and len(files) >= num_workers
+    shard_records = num_workers > 1 and not shard_files
+    if shard_files:
+        files = files[worker_index::num_workers]
+    dataset = tf.data.Dataset.from_tensor_slices(files)
+
+    if shuffle and cache is None and not shard_records:
+        dataset = dataset.shuffle(len(files), seed=seed, reshuffle_each_iteration=True)
+
+    dataset = dataset.interleave(
+        tf.data.TFRecordDataset,
+        cycle_length=min(cycle_length, len(files)),
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=not shuffle or shard_records
+    )
+    if shard_records:
+        dataset = dataset.shard(num_workers, worker_index)
+    dataset = dataset.map(parse_example, num_parallel_calls=tf.data.AUTOTUNE)
+
+    if cache is not None:
+        dataset = dataset.cache('' if cache == 'memory' else f"{cache}-{split}")
+
+    return dataset
+
+
+def main():
+    """Export a preprocessed dataset into TFRecord shards"""
+    parser = argparse.ArgumentParser(description="Pack a split dataset into TFRecord shards")
+    parser.add_argument('--data-dir', default='dataset', help="Split dataset (train/val/test dirs or CSV manifests)")
+    parser.add_argument('--output-dir', default='dataset_shards', help="Where to write shards and the index")
+    parser.add_argument('--records-per-shard', type=int, default=1024)
+    args = parser.parse_args()
+
+    index_path = export_shards(args.data_dir, args.output_dir, args.records_per_shard)
+    logger.info(f"Shard index saved to {index_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+import io
+import os
+import time
+import logging
+import argparse
+import threading
+import tracemalloc
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# ImageNet statistics used by every model in this project
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+# (x / 255 - mean) / std folded into a single multiply-add: x * SCALE + BIAS
+SCALE = (1.0 / (255.0 * IMAGENET_STD)).astype(np.float32)
+BIAS = (-IMAGENET_MEAN / IMAGENET_STD).astype(np.float32)
+
+# Per-thread uint8 resize buffers, reused across calls
+_scratch = threading.local()
+
+
+def _resize_buffer(height: int, width: int) -> np.ndarray:
+    """Get this thread's resize buffer for the given output size"""
+    buffers = getattr(_scratch, 'buffers', None)
+    if buffers is None:
+        buffers = _scratch.buffers = {}
+
+    buffer = buffers.get((height, width))
+    if buffer is None:
+        buffer = buffers[(height, width)] = np.empty((height, width, 3), dtype=np.uint8)
+    return buffer
+
+
+def decode_image_bytes(image_bytes: bytes, target_size: Optional[Tuple[int, int]] = None) -> np.ndarray:
+    """Decode image bytes to an RGB uint8 array, downscaling JPEGs during decode
+
+    For JPEGs the decoder is asked for the smallest 1/2, 1/4 or 1/8 DCT scale
+    that is still at least target_size (height, width), so a 12 MP photo never
+    gets fully decoded just to be resized to 224x224. Other formats fall back
+    to a full decode.
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+
+    if target_size is not None and image.format == 'JPEG':
+        image.draft('RGB', (target_size[1], target_size[0]))
+
+    # Convert to RGB if needed
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    return np.asarray(image)
+
+
+def preprocess_into(image: np.ndarray, out: np.ndarray, bgr: bool = False) -> np.ndarray:
+    """Resize and normalize a uint8 image in place into a float32 [H, W, 3] batch slot"""
+    height, width = out.shape[:2]
+
+    if image.ndim == 2:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+
+    # Resize into the reusable uint8 buffer
+    resized = cv2.resize(image, (width, height), dst=_resize_buffer(height, width))
+
+    # Channel swap is a strided view, not a copy
+    if bgr:
+        resized = resized[..., ::-1]
+
+    # Normalize straight into the output slot
+    np.multiply(resized, SCALE, out=out)
+    np.add(out, BIAS, out=out)
+
+    return out
+
+
+def preprocess_image(image: np.ndarray, input_shape: Tuple[int, int, int], bgr: bool = False) -> np.ndarray:
+    """Preprocess one image into a new [1, H, W, 3] float32 batch"""
+    batch = np.empty((1,) + tuple(input_shape), dtype=np.float32)
+    preprocess_into(image, batch[0], bgr=bgr)
+    return batch
+
+
+def _legacy_preprocess(image: np.ndarray, input_shape: Tuple[int, int, int]) -> np.ndarray:
+    """Previous per-call implementation, kept for benchmarking"""
+    image = cv2.resize(image, (input_shape[1], input_shape[0]))
+    image = image.astype(np.float32) / 255.0
+    mean = np.array([0.485, 0.456, 0.406])
+    std = np.array([0.229, 0.224, 0.225])
+    image = (image - mean) / std
+    return np.expand_dims(image, axis=0)
+
+
+def benchmark(iterations: int = 200, source_size: Tuple[int, int] = (1080, 1440),
+              input_shape: Tuple[int, int, int] = (224, 224, 3)) -> Dict:
+    """Compare time and peak allocations per image of the legacy and fused paths"""
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, size=source_size + (3,), dtype=np.uint8)
+    batch = np.empty((1,) + tuple(input_shape), dtype=np.float32)
+
+    def measure(fn) -> Dict:
+        fn()  # warm up buffers
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        elapsed = time.perf_counter() - start
+
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {'ms_per_image': elapsed / iterations * 1000, 'peak_alloc_bytes': peak}
+
+    legacy = measure(lambda: _legacy_preprocess(image, input_shape))
+    fused = measure(lambda: preprocess_into(image, batch[0]))
+
+    # Both paths must produce the same tensor
+    max_abs_diff = float(np.abs(_legacy_preprocess(image, input_shape)[0] - batch[0]).max())
+
+    return {
+        'legacy': legacy,
+        'fused': fused,
+        'speedup': legacy['ms_per_image'] / fused['ms_per_image'],
+        'max_abs_diff': max_abs_diff
+    }
+
+
+def benchmark_decode(iterations: int = 20, source_size: Tuple[int, int] = (3000, 4000),
+                     input_shape: Tuple[int, int, int] = (224, 224, 3)) -> Dict:
+    """Compare full and reduced-resolution decode of a large phone-sized JPEG"""
+    rng = np.random.default_rng(0)
+    # Smooth gradients plus noise compress like a real photo rather than pure noise
+    y, x = np.mgrid[0:source_size[0], 0:source_size[1]]
+    image = np.stack([x % 256, y % 256, (x + y) % 256], axis=-1).astype(np.uint8)
+    image = cv2.add(image, rng.integers(0, 32, size=image.shape, dtype=np.uint8))
+    buffer = io.BytesIO()
+    Image.fromarray(image).save(buffer, format='JPEG', quality=90)
+    image_bytes = buffer.getvalue()
+
+    def measure(target_size) -> Dict:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            decoded = decode_image_bytes(image_bytes, target_size)
+        elapsed = time.perf_counter() - start
+        return {
+            'ms_per_image': elapsed / iterations * 1000,
+            'decoded_shape': list(decoded.shape),
+            'decoded_bytes': int(decoded.nbytes)
+        }
+
+    full = measure(None)
+    reduced = measure(input_shape[:2])
+
+    return {
+        'full': full,
+        'reduced': reduced,
+        'speedup': full['ms_per_image'] / reduced['ms_per_image'],
+        'memory_ratio': full['decoded_bytes'] / reduced['decoded_bytes']
+    }
+
+
+def decode_parity_check(image_paths: List[str], input_shape: Tuple[int, int, int] = (224, 224, 3),
+                        predict_fn=None, batch_size: int = 32) -> Dict:
+    """Compare the reduced-resolution decode path against full decode
+
+    Reports the per-pixel difference of the preprocessed tensors and, when a
+    predict_fn is given, how often both paths agree on the top-1 class.
+    """
+    abs_diffs = []
+    agreements = 0
+    total = 0
+
+    for start in range(0, len(image_paths), batch_size):
+        chunk = image_paths[start:start + batch_size]
+        full_batch = np.empty((len(chunk),) + tuple(input_shape), dtype=np.float32)
+        reduced_batch = np.empty_like(full_batch)
+
+        for i, image_path in enumerate(chunk):
+            with open(image_path, 'rb') as f:
+                image_bytes = f.read()
+            preprocess_into(decode_image_bytes(image_bytes), full_batch[i])
+            preprocess_into(decode_image_bytes(image_bytes, input_shape[:2]), reduced_batch[i])
+
+        abs_diffs.append(np.abs(full_batch - reduced_batch).mean(axis=(1, 2, 3)))
+
+        if predict_fn is not None:
+            full_top1 = np.argmax(predict_fn(full_batch), axis=1)
+            reduced_top1 = np.argmax(predict_fn(reduced_batch), axis=1)
+            agreements += int(np.sum(full_top1 == reduced_top1))
+        total += len(chunk)
+
+    abs_diffs = np.concatenate(abs_diffs) if abs_diffs else np.zeros(0)
+    results = {
+        'images': total,
+        'mean_abs_diff': float(abs_diffs.mean()) if total else 0.0,
+        'max_mean_abs_diff': float(abs_diffs.max()) if total else 0.0
+    }
+    if predict_fn is not None:
+        results['top1_agreement'] = agreements / total if total else 0.0
+
+    return results
+
+
+def main():
+    """Run the preprocessing micro-benchmarks or a decode parity check"""
+    parser = argparse.ArgumentParser(description="Preprocessing benchmarks")
+    parser.add_argument('--parity-dir', help="Directory of images for the reduced-decode parity check")
+    parser.add_argument('--model-path', help="Model used to compare top-1 predictions in the parity check")
+    parser.add_argument('--backend', default=None, help="Inference backend for --model-path")
+    args = parser.parse_args()
+
+    if args.parity_dir:
+        image_paths = [
+            os.path.join(root, name)
+            for root, _, files in os.walk(args.parity_dir)
+            for name in files
+            if name.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff'))
+        ]
+
+        predict_fn = None
+        if args.model_path:
+            from inference_backends import create_backend
+            predict_fn = create_backend(args.model_path, args.backend).predict
+
+        results = decode_parity_check(sorted(image_paths), predict_fn=predict_fn)
+        print(f"parity over {results['images']} images: mean abs diff {results['mean_abs_diff']:.4f}, "
+              f"worst image {results['max_mean_abs_diff']:.4f}")
+        if 'top1_agreement' in results:
+            print(f"top-1 agreement: {results['top1_agreement']:.4f}")
+        return
+
+    results = benchmark()
+    for name in ['legacy', 'fused']:
+        print(f"{name:>6}: {results[name]['ms_per_image']:.3f} ms/image, "
+              f"peak alloc {results[name]['peak_alloc_bytes'] / 1024:.1f} KiB")
+    print(f"speedup: {results['speedup']:.2f}x, max abs diff: {results['max_abs_diff']:.2e}")
+
+    results = benchmark_decode()
+    for name in ['full', 'reduced']:
+        print(f"{name:>7} decode: {results[name]['ms_per_image']:.2f} ms/image, "
+              f"decoded {results[name]['decoded_shape']} ({results[name]['decoded_bytes'] / 1e6:.1f} MB)")
+    print(f"decode speedup: {results['speedup']:.2f}x, decoded memory {results['memory_ratio']:.1f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+import os
+import time
+import queue
+import logging
+import importlib
+import threading
+from typing import Dict, Optional, Sequence, Tuple, Type
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# TFLite artifacts written next to the Keras model by CropDiseaseModel.save_model
+TFLITE_FILENAMES = {
+    'tflite_float16': 'crop_disease_model_float16.tflite',
+    'tflite_int8': 'crop_disease_model_int8.tflite'
+}
+
+
+class InferenceBackend:
+    """Common interface for everything that can run a forward pass"""
+    name = 'base'
+
+    def __init__(self, model_path: str, num_threads: Optional[int] = None):
+        self.model_path = model_path
+        self.num_threads = num_threads
+        # Seconds spent in each phase of loading, for the startup breakdown
+        self.timings: Dict[str, float] = {}
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        """Run a forward pass over a preprocessed float32 batch and return probabilities"""
+        raise NotImplementedError
+
+    def get_stats(self) -> Dict:
+        """Get backend-specific serving statistics"""
+        return {'name': self.name}
+
+    def warm_up(self, input_shape: Tuple[int, ...], batch_sizes: Sequence[int]):
+        """Run a zero batch of every size so tracing and allocation happen before real traffic"""
+        for batch_size in batch_sizes:
+            self.predict(np.zeros((batch_size,) + tuple(input_shape), dtype=np.float32))
+
+    def memory_footprint(self) -> int:
+        """Approximate bytes of model weights held in memory"""
+        # TFLite maps the flatbuffer, so its size on disk is what stays resident
+        return os.path.getsize(self.model_path) if os.path.exists(self.model_path) else 0
+
+    def close(self):
+        """Release resources held by the backend"""
+        pass
+
+
+class KerasBackend(InferenceBackend):
+    name = 'keras'
+
+    def __init__(self, model_path: str, num_threads: Optional[int] = None,
+                 inter_op_threads: Optional[int] = None):
+        """Load a full Keras model"""
+        super().__init__(model_path, num_threads)
+
+        start = time.perf_counter()
+        import tensorflow as tf
+        self.timings['import_s'] = round(time.perf_counter() - start, 3)
+
+        set_tf_threads(tf, num_threads, inter_op_threads)
+
+        start = time.perf_counter()
+        self.model = tf.keras.models.load_model(model_path)
+        self.timings['load_s'] = round(time.perf_counter() - start, 3)
+        logger.info(f"Keras model loaded from {model_path}")
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return np.asarray(self.model.predict_on_batch(batch))
+
+    def memory_footprint(self) -> int:
+        import tensorflow as tf
+
+        # The .h5 file also holds optimizer state, so count the live weights instead
+        return sum(int(np.prod(weight.shape)) * tf.as_dtype(weight.dtype).size for weight in self.model.weights)
+
+
+class SavedModelBackend(InferenceBackend):
+    name = 'savedmodel'
+
+    def __init__(self, model_path: str, num_threads: Optional[int] = None,
+                 inter_op_threads: Optional[int] = None):
+        """Serve a Keras model from its cached SavedModel conversion
+
+        The serving function takes any batch size, so unlike Keras
+        predict_on_batch it never retraces when the scheduler's batch size changes.
+        """
+        super().__init__(model_path, num_threads)
+
+        from model_cache import ensure_saved_model, file_digest
+
+        # Import TensorFlow on a thread while the model file is hashed
+        importer = threading.Thread(target=importlib.import_module, args=('tensorflow',), daemon=True)
+        start = time.perf_counter()
+        importer.start()
+        digest = file_digest(model_path)
+        self.timings['digest_s'] = round(time.perf_counter() - start, 3)
+        importer.join()
+        import tensorflow as tf
+        self.timings['import_s'] = round(time.perf_counter() - start, 3)
+
+        set_tf_threads(tf, num_threads, inter_op_threads)
+
+        export_dir, cache_timings = ensure_saved_model(model_path, digest=digest)
+        self.timings.update(cache_timings)
+
+        start = time.perf_counter()
+        self.loaded = tf.saved_model.load(export_dir)
+        self.serve = self.loaded.serve
+        self.timings['load_s'] = round(time.perf_counter() - start, 3)
+        logger.info(f"SavedModel loaded from {export_dir} (cache of {model_path})")
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.serve(batch).numpy()
+
+    def memory_footprint(self) -> int:
+        return sum(int(np.prod(weight.shape)) * weight.dtype.size for weight in self.loaded.model_weights)
+
+
+class TFLiteBackend(InferenceBackend):
+    name = 'tflite'
+
+    def __init__(self, model_path: str, num_threads: Optional[int] = None, pool_size: int = 2):
+        """Load a pool of TFLite interpreters for the same model"""
+        super().__init__(model_path, num_threads)
+
+        # Prefer the standalone runtime on edge boxes without full TensorFlow
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        pool_size = max(1, int(pool_size))
+        if num_threads is None:
+            num_threads = max(1, (os.cpu_count() or 1) // pool_size)
+        self.num_threads = num_threads
+        self.pool_size = pool_size
+        self.interpreter_class = Interpreter
+
+        # Interpreters are not thread-safe, so each caller checks one entry out of the pool.
+        # An entry holds one interpreter per padded batch size: resizing and reallocating
+        # one interpreter whenever the micro-batch size changes would sit on the hot path
+        start = time.perf_counter()
+        self.pool = queue.Queue()
+        for _ in range(pool_size):
+            interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+            interpreter.allocate_tensors()
+            self.pool.put({int(interpreter.get_input_details()[0]['shape'][0]): interpreter})
+        self.timings['load_s'] = round(time.perf_counter() - start, 3)
+
+        logger.info(f"TFLite model loaded from {model_path} "
+                    f"({pool_size} interpreters x {num_threads} threads)")
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        interpreters = self.pool.get()
+        try:
+            return self._invoke(interpreters, batch)
+        finally:
+            self.pool.put(interpreters)
+
+    def warm_up(self, input_shape: Tuple[int, ...], batch_sizes: Sequence[int]):
+        """Allocate and run every pool entry's interpreter for each batch size"""
+        entries = [self.pool.get() for _ in range(self.pool_size)]
+        try:
+            for interpreters in entries:
+                for batch_size in batch_sizes:
+                    self._invoke(interpreters, np.zeros((batch_size,) + tuple(input_shape), dtype=np.float32))
+        finally:
+            for interpreters in entries:
+                self.pool.put(interpreters)
+
+    @staticmethod
+    def padded_size(batch_size: int) -> int:
+        """Round a batch size up to a power of two, bounding how many interpreters an entry holds"""
+        return 1 << (batch_size - 1).bit_length()
+
+    def _interpreter_for(self, interpreters: Dict, batch_size: int):
+        """An entry's interpreter allocated for batch_size, created on first use"""
+        interpreter = interpreters.get(batch_size)
+        if interpreter is None:
+            interpreter = self.interpreter_class(model_path=self.model_path, num_threads=self.num_threads)
+            input_details = interpreter.get_input_details()[0]
+            interpreter.resize_tensor_input(input_details['index'], [batch_size] + list(input_details['shape'][1:]))
+            interpreter.allocate_tensors()
+            interpreters[batch_size] = interpreter
+        return interpreter
+
+    def _invoke(self, interpreters: Dict, batch: np.ndarray) -> np.ndarray:
+        """Run a batch, zero-padded to its padded size, on the interpreter allocated for that size"""
+        batch_size = len(batch)
+        padded_size = self.padded_size(batch_size)
+        if padded_size != batch_size:
+            padding = np.zeros((padded_size - batch_size,) + batch.shape[1:], dtype=batch.dtype)
+            batch = np.concatenate([batch, padding])
+
+        interpreter = self._interpreter_for(interpreters, padded_size)
+        input_details = interpreter.get_input_details()[0]
+        interpreter.set_tensor(input_details['index'], self.quantize_input(batch, input_details))
+        interpreter.invoke()
+
+        output_details = interpreter.get_output_details()[0]
+        output = self.dequantize_output(interpreter.get_tensor(output_details['index']), output_details)
+        return output[:batch_size]
+
+    @staticmethod
+    def quantize_input(batch: np.ndarray, details: Dict) -> np.ndarray:
+        """Convert a float batch to the interpreter's input type"""
+        dtype = details['dtype']
+        if dtype == np.float32:
+            return batch.astype(np.float32, copy=False)
+
+        scale, zero_point = details['quantization']
+        info = np.iinfo(dtype)
+        quantized = np.round(batch / scale + zero_point)
+        return np.clip(quantized, info.min, info.max).astype(dtype)
+
+    @staticmethod
+    def dequantize_output(output: np.ndarray, details: Dict) -> np.ndarray:
+        """Convert interpreter output back to float probabilities"""
+        if output.dtype == np.float32:
+            return output
+
+        scale, zero_point = details['quantization']
+        return (output.astype(np.float32) - zero_point) * scale
+
+    def close(self):
+        while not self.pool.empty():
+            self.pool.get_nowait()
+
+
+class TFLiteFloat16Backend(TFLiteBackend):
+    name = 'tflite_float16'
+
+
+class TFLiteInt8Backend(TFLiteBackend):
+    name = 'tflite_int8'
+
+
+BACKENDS: Dict[str, Type[InferenceBackend]] = {
+    'keras': KerasBackend,
+    'savedmodel': SavedModelBackend,
+    'tflite_float16': TFLiteFloat16Backend,
+    'tflite_int8': TFLiteInt8Backend
+}
+
+
+def set_tf_threads(tf, num_threads: Optional[int], inter_op_threads: Optional[int] = None):
+    """Limit TensorFlow's intra-op and inter-op thread pools, if they are not running yet"""
+    if num_threads:
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+        except RuntimeError:
+            logger.warning("TensorFlow already initialized, ignoring num_threads")
+    if inter_op_threads:
+        try:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+        except RuntimeError:
+            logger.warning("TensorFlow already initialized, ignoring inter_op_threads")
+
+
+def resolve_model_path(backend_name: str, model_path: str) -> str:
+    """Map the Keras model path to the artifact the backend actually loads"""
+    if backend_name in TFLITE_FILENAMES and not model_path.endswith('.tflite'):
+        return os.path.join(os.path.dirname(model_path), TFLITE_FILENAMES[backend_name])
+    return model_path
+
+
+def create_backend(model_path: str, backend_name: Optional[str] = None,
+                   num_threads: Optional[int] = None, inter_op_threads: Optional[int] = None) -> InferenceBackend:
+    """Create the inference backend chosen by argument or INFERENCE_BACKEND
+
+    inter_op_threads only applies to the TensorFlow backends; TFLite runs one op at a time.
+    """
+    backend_name = (backend_name or os.getenv('INFERENCE_BACKEND', 'keras')).lower()
+    if backend_name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend_name}', "
+                         f"expected one of {sorted(BACKENDS)}")
+
+    if num_threads is None and os.getenv('INFERENCE_THREADS'):
+        num_threads = int(os.getenv('INFERENCE_THREADS'))
+
+    backend_class = BACKENDS[backend_name]
+    model_path = resolve_model_path(backend_name, model_path)
+
+    if issubclass(backend_class, TFLiteBackend):
+        pool_size = int(os.getenv('TFLITE_POOL_SIZE', '2'))
+        return backend_class(model_path, num_threads=num_threads, pool_size=pool_size)
+
+    return backend_class(model_path, num_threads=num_threads, inter_op_threads=inter_op_threads)
@@ -0,0 +1,391 @@
+import os
+import time
+import queue
+import logging
+import threading
+import itertools
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from inference_backends import InferenceBackend
+
+logger = logging.getLogger(__name__)
+
+# A worker that dies this many times in a row without becoming ready is given up on
+MAX_CONSECUTIVE_RESTARTS = 5
+RESTART_BACKOFF_SECONDS = 0.5
+MAX_RESTART_BACKOFF_SECONDS = 30.0
+
+# A batch still unanswered after this long means its worker is stuck
+JOB_TIMEOUT_SECONDS = 120.0
+
+
+class SharedTensorRing:
+    def __init__(self, num_slots: int, max_batch_size: int, input_shape: Tuple[int, ...],
+                 num_outputs: int, name: Optional[str] = None):
+        """Fixed set of input/output batch slots in shared memory
+
+        The front-end writes a preprocessed batch into a free slot, a worker
+        reads it and writes the probabilities back into the same slot, so only
+        slot numbers travel through the process queues.
+        """
+        self.num_slots = num_slots
+        self.max_batch_size = max_batch_size
+        self.input_shape = tuple(input_shape)
+        self.num_outputs = num_outputs
+
+        input_bytes = num_slots * max_batch_size * int(np.prod(self.input_shape)) * 4
+        output_bytes = num_slots * max_batch_size * num_outputs * 4
+
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=input_bytes + output_bytes)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+
+        self.inputs = np.ndarray((num_slots, max_batch_size) + self.input_shape,
+                                 dtype=np.float32, buffer=self.shm.buf)
+        self.outputs = np.ndarray((num_slots, max_batch_size, num_outputs),
+                                  dtype=np.float32, buffer=self.shm.buf, offset=input_bytes)
+
+    def spec(self) -> Dict:
+        """Arguments a worker process needs to attach to this ring"""
+        return {
+            'num_slots': self.num_slots,
+            'max_batch_size': self.max_batch_size,
+            'input_shape': self.input_shape,
+            'num_outputs': self.num_outputs,
+            'name': self.shm.name
+        }
+
+    def close(self):
+        # Drop the views before closing the mapping
+        self.inputs = None
+        self.outputs = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _worker_main(worker_id: int, generation: int, ring_spec: Dict, model_path: str,
+                 backend_name: Optional[str], intra_op_threads: Optional[int],
+                 inter_op_threads: Optional[int], warmup_batch_sizes: Tuple[int, ...],
+                 request_queue, response_queue):
+    """Inference worker process: load the model once, then serve batches from the ring"""
+    from inference_backends import create_backend
+
+    logging.basicConfig(level=logging.INFO)
+
+    try:
+        # Spawned workers share the front-end's resource tracker, so attaching
+        # here does not hand ownership of the segment to this process
+        ring = SharedTensorRing(**ring_spec)
+
+        backend = create_backend(model_path, backend_name, num_threads=intra_op_threads,
+                                 inter_op_threads=inter_op_threads)
+
+        # Each worker traces its own graph, so each warms up before taking batches
+        start = time.perf_counter()
+        backend.warm_up(ring.input_shape, warmup_batch_sizes)
+        backend.timings['warm_up_s'] = round(time.perf_counter() - start, 3)
+    except Exception as e:
+        logger.error(f"Worker {worker_id} failed to start: {str(e)}")
+        response_queue.put(('failed', worker_id, generation, str(e)))
+        return
+
+    response_queue.put(('ready', worker_id, generation,
+                        {'timings': backend.timings, 'memory_bytes': backend.memory_footprint()}))
+
+    while True:
+        item = request_queue.get()
+        if item is None:
+            break
+
+        job_id, slot, batch_size = item
+        try:
+            ring.outputs[slot, :batch_size] = backend.predict(ring.inputs[slot, :batch_size])
+            response_queue.put(('done', worker_id, generation, job_id))
+        except Exception as e:
+            response_queue.put(('error', worker_id, generation, (job_id, str(e))))
+
+    backend.close()
+    ring.close()
+
+
+class WorkerPoolBackend(InferenceBackend):
+    def __init__(self, model_path: str, input_shape: Tuple[int, ...], num_outputs: int,
+                 backend_name: Optional[str] = None, num_workers: Optional[int] = None,
+                 max_batch_size: int = 16, intra_op_threads: Optional[int] = None,
+                 inter_op_threads: Optional[int] = None, warmup_batch_sizes: Sequence[int] = ()):
+        """Run forward passes in N worker processes that each load the model once"""
+        super().__init__(model_path, intra_op_threads)
+
+        self.backend_name = (backend_name or os.getenv('INFERENCE_BACKEND', 'keras')).lower()
+        self.name = self.backend_name
+        if num_workers is None:
+            num_workers = max(1, (os.cpu_count() or 1) // (intra_op_threads or 1))
+        if intra_op_threads is None:
+            # TensorFlow's default pool uses every core in every worker; split the cores instead
+            intra_op_threads = max(1, (os.cpu_count() or 1) // num_workers)
+        self.intra_op_threads = intra_op_threads
+        self.num_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.num_workers = num_workers
+        self.max_batch_size = max_batch_size
+        self.warmup_batch_sizes = tuple(warmup_batch_sizes)
+
+        # Two slots per worker so the next batch can be written while one runs
+        self.ring = SharedTensorRing(num_workers * 2, max_batch_size, input_shape, num_outputs)
+        self.free_slots = queue.Queue()
+        for slot in range(self.ring.num_slots):
+            self.free_slots.put(slot)
+
+        self.context = mp.get_context('spawn')
+        self.response_queue = self.context.Queue()
+        self.idle_workers = queue.Queue()
+        self.workers: Dict[int, Dict] = {}
+        self.jobs: Dict[int, Tuple[Future, int]] = {}
+        self.job_ids = itertools.count()
+        self.restarts = 0
+        self.ready_workers = set()
+        self.startup_error: Optional[str] = None
+        self.failed_workers: Dict[int, str] = {}
+        self.lock = threading.Lock()
+        self.closing = False
+
+        start = time.perf_counter()
+        for worker_id in range(num_workers):
+            self._start_worker(worker_id)
+
+        self.collector = threading.Thread(target=self._collect, name='worker-collector', daemon=True)
+        self.collector.start()
+        self._wait_until_ready()
+        self.timings['workers_ready_s'] = round(time.perf_counter() - start, 3)
+        self.monitor = threading.Thread(target=self._monitor, name='worker-monitor', daemon=True)
+        self.monitor.start()
+
+        logger.info(f"Started {num_workers} inference workers ({self.backend_name} backend, "
+                    f"intra_op_threads={intra_op_threads}, inter_op_threads={inter_op_threads})")
+
+    def _start_worker(self, worker_id: int):
+        """Spawn (or respawn) the worker process for a worker id"""
+        generation = self.workers[worker_id]['generation'] + 1 if worker_id in self.workers else 0
+        request_queue = self.context.Queue()
+        process = self.context.Process(
+            target=_worker_main,
+            args=(worker_id, generation, self.ring.spec(), self.model_path, self.backend_name,
+                  self.intra_op_threads, self.inter_op_threads, self.warmup_batch_sizes,
+                  request_queue, self.response_queue),
+            name=f'inference-worker-{worker_id}',
+            daemon=True
+        )
+        process.start()
+        previous = self.workers.get(worker_id, {})
+        self.workers[worker_id] = {
+            'process': process,
+            'queue': request_queue,
+            'generation': generation,
+            # Deaths since the worker was last ready, and when a dead worker may be respawned
+            'failures': previous.get('failures', 0),
+            'restart_at': None,
+            'last_error': previous.get('last_error'),
+            # Reported by the worker once its model is loaded
+            'memory_bytes': 0
+        }
+
+    def _wait_until_ready(self, timeout: float = 600.0):
+        """Block until every worker has loaded the model, or fail if one could not"""
+        deadline = time.monotonic() + timeout
+        while len(self.ready_workers) < self.num_workers:
+            if self.startup_error is not None:
+                self.close()
+                raise RuntimeError(f"Inference worker failed to start: {self.startup_error}")
+            # The monitor is not running yet, so a worker killed while loading is caught here
+            for worker_id, worker in self.workers.items():
+                if worker_id not in self.ready_workers and not worker['process'].is_alive():
+                    exitcode = worker['process'].exitcode
+                    self.close()
+                    raise RuntimeError(f"Inference worker {worker_id} exited with code {exitcode} "
+                                       f"while loading the model")
+            if time.monotonic() > deadline:
+                self.close()
+                raise TimeoutError("Timed out waiting for inference workers to start")
+            time.sleep(0.05)
+
+    def _is_current(self, worker_id: int, generation: int) -> bool:
+        worker = self.workers.get(worker_id)
+        return worker is not None and worker['generation'] == generation
+
+    def _collect(self):
+        """Route worker responses back to waiting callers"""
+        while True:
+            try:
+                kind, worker_id, generation, payload = self.response_queue.get()
+            except (EOFError, OSError):
+                return
+            if kind == 'stop':
+                return
+
+            with self.lock:
+                if not self._is_current(worker_id, generation):
+                    continue
+
+                if kind == 'ready':
+                    self.ready_workers.add(worker_id)
+                    self.workers[worker_id]['failures'] = 0
+                    self.workers[worker_id]['memory_bytes'] = payload['memory_bytes']
+                    # Workers load in parallel, so the slowest one sets each phase's cost
+                    for phase, seconds in payload['timings'].items():
+                        self.timings[phase] = max(self.timings.get(phase, 0.0), seconds)
+                    logger.info(f"Inference worker {worker_id} ready")
+                elif kind == 'failed':
+                    self.startup_error = payload
+                    self.workers[worker_id]['last_error'] = payload
+                    logger.error(f"Inference worker {worker_id} could not load the model: {payload}")
+                    continue
+                elif kind == 'done':
+                    # The job is gone if the monitor already failed it, e.g. the worker
+                    # exited right after answering
+                    job = self.jobs.pop(payload, None)
+                    if job is not None:
+                        job[0].set_result(None)
+                elif kind == 'error':
+                    job_id, message = payload
+                    job = self.jobs.pop(job_id, None)
+                    if job is not None:
+                        job[0].set_exception(RuntimeError(message))
+
+            self.idle_workers.put((worker_id, generation))
+
+    def _monitor(self):
+        """Restart workers whose process died, with backoff, and fail the batch they were running"""
+        while not self.closing:
+            time.sleep(0.5)
+            with self.lock:
+                if self.closing:
+                    return
+                for worker_id, worker in list(self.workers.items()):
+                    if worker['process'].is_alive() or worker_id in self.failed_workers:
+                        continue
+
+                    if worker['restart_at'] is None:
+                        self._worker_died(worker_id, worker)
+                    elif time.monotonic() >= worker['restart_at']:
+                        self._start_worker(worker_id)
+                        self.restarts += 1
+
+    def _worker_died(self, worker_id: int, worker: Dict):
+        """Fail the dead worker's batches and schedule its restart, or give up on it"""
+        for job_id, (future, job_worker) in list(self.jobs.items()):
+            if job_worker == worker_id:
+                del self.jobs[job_id]
+                future.set_exception(RuntimeError(f"Inference worker {worker_id} crashed"))
+
+        self.ready_workers.discard(worker_id)
+        worker['failures'] += 1
+        exitcode = worker['process'].exitcode
+
+        # A worker that keeps dying before it is ready (e.g. the model can no longer be
+        # loaded) would otherwise be respawned forever
+        if worker['failures'] > MAX_CONSECUTIVE_RESTARTS:
+            reason = worker['last_error'] or f"exited with code {exitcode}"
+            self.failed_workers[worker_id] = reason
+            logger.error(f"Inference worker {worker_id} failed {worker['failures']} times in a row "
+                         f"({reason}), not restarting it")
+            return
+
+        delay = min(RESTART_BACKOFF_SECONDS * 2 ** (worker['failures'] - 1), MAX_RESTART_BACKOFF_SECONDS)
+        worker['restart_at'] = time.monotonic() + delay
+        logger.warning(f"Inference worker {worker_id} exited with code {exitcode}, "
+                       f"restarting in {delay:.1f}s")
+
+    def _is_usable(self, worker_id: int, generation: int) -> bool:
+        return self._is_current(worker_id, generation) and self.workers[worker_id]['process'].is_alive()
+
+    def _submit(self, slot: int, batch_size: int) -> Tuple[Future, int, int]:
+        """Hand a batch to an idle worker, skipping entries left by dead processes"""
+        while True:
+            if len(self.failed_workers) == self.num_workers:
+                raise RuntimeError("All inference workers have failed")
+            try:
+                worker_id, generation = self.idle_workers.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            # Checked and enqueued under one lock, so the monitor either fails this
+            # job with the worker or sees the worker alive until it is queued
+            with self.lock:
+                if not self._is_usable(worker_id, generation):
+                    continue
+                future = Future()
+                job_id = next(self.job_ids)
+                self.jobs[job_id] = (future, worker_id)
+                self.workers[worker_id]['queue'].put((job_id, slot, batch_size))
+                return future, job_id, worker_id
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        if len(batch) > self.max_batch_size:
+            return np.concatenate([
+                self.predict(batch[start:start + self.max_batch_size])
+                for start in range(0, len(batch), self.max_batch_size)
+            ])
+
+        slot = self.free_slots.get()
+        try:
+            batch_size = len(batch)
+            self.ring.inputs[slot, :batch_size] = batch
+
+            future, job_id, worker_id = self._submit(slot, batch_size)
+            try:
+                future.result(timeout=JOB_TIMEOUT_SECONDS)
+            except FutureTimeoutError:
+                # The worker is wedged; kill it so the monitor restarts it and
+                # nothing writes into the slot after it is reused
+                with self.lock:
+                    self.jobs.pop(job_id, None)
+                    process = self.workers[worker_id]['process']
+                process.kill()
+                process.join()
+                raise RuntimeError(f"Inference worker {worker_id} did not answer within {JOB_TIMEOUT_SECONDS}s")
+            return self.ring.outputs[slot, :batch_size].copy()
+        finally:
+            self.free_slots.put(slot)
+
+    def get_stats(self) -> Dict:
+        return {
+            'name': self.name,
+            'workers': self.num_workers,
+            'alive': sum(1 for worker in self.workers.values() if worker['process'].is_alive()),
+            'restarts': self.restarts,
+            'failed_workers': {str(worker_id): reason for worker_id, reason in self.failed_workers.items()},
+            'healthy': len(self.failed_workers) < self.num_workers,
+            'in_flight_batches': len(self.jobs)
+        }
+
+    def warm_up(self, input_shape: Tuple[int, ...], batch_sizes: Sequence[int]):
+        """Workers already warmed up before reporting ready"""
+        pass
+
+    def memory_footprint(self) -> int:
+        """Every live worker holds its own copy of the model, as measured by its backend"""
+        with self.lock:
+            return sum(worker['memory_bytes'] for worker in self.workers.values() if worker['process'].is_alive())
+
+    def close(self):
+        with self.lock:
+            self.closing = True
+            for worker in self.workers.values():
+                worker['queue'].put(None)
+
+        for worker in self.workers.values():
+            worker['process'].join(timeout=5)
+            if worker['process'].is_alive():
+                worker['process'].terminate()
+
+        self.response_queue.put(('stop', -1, -1, None))
+        self.collector.join(timeout=5)
+        self.ring.close()
@@ -0,0 +1,88 @@
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import argparse
+import subprocess
+from typing import List
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TRAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'train_model.py')
+
+
+def find_free_ports(count: int) -> List[int]:
+    """Reserve distinct free local ports for the worker servers"""
+    sockets = []
+    try:
+        for _ in range(count):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.bind(('localhost', 0))
+            sockets.append(sock)
+        return [sock.getsockname()[1] for sock in sockets]
+    finally:
+        for sock in sockets:
+            sock.close()
+
+
+def worker_env(workers: List[str], index: int, intra_op_threads: int) -> dict:
+    """Environment of one worker: its TF_CONFIG and a share of the CPU cores"""
+    env = dict(os.environ)
+    env['TF_CONFIG'] = json.dumps({
+        'cluster': {'worker': workers},
+        'task': {'type': 'worker', 'index': index}
+    })
+    # Keep workers on one machine from oversubscribing the cores
+    env['TF_NUM_INTRAOP_THREADS'] = str(intra_op_threads)
+    return env
+
+
+def launch(num_workers: int, train_args: List[str]) -> int:
+    """Run train_model.py --distributed in num_workers local processes and wait for all of them"""
+    workers = [f"localhost:{port}" for port in find_free_ports(num_workers)]
+    intra_op_threads = max(1, (os.cpu_count() or 1) // num_workers)
+    logger.info(f"Launching {num_workers} workers on {workers} ({intra_op_threads} threads each)")
+
+    processes = [
+        subprocess.Popen([sys.executable, TRAIN_SCRIPT, '--distributed'] + train_args,
+                         env=worker_env(workers, index, intra_op_threads))
+        for index in range(num_workers)
+    ]
+
+    # A failed worker would leave the others blocked in collectives, so stop them all
+    exit_code = 0
+    try:
+        while any(process.poll() is None for process in processes):
+            failed = [process for process in processes if process.poll() not in (None, 0)]
+            if failed:
+                exit_code = failed[0].returncode
+                logger.error(f"Worker {processes.index(failed[0])} exited with code {exit_code}, stopping the rest")
+                break
+            time.sleep(1)
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in processes:
+            process.wait()
+
+    return exit_code or next((process.returncode for process in processes if process.returncode), 0)
+
+
+def main():
+    """Local multi-process launcher for distributed training"""
+    parser = argparse.ArgumentParser(
+        description="Run distributed training with several local worker processes; "
+                    "other arguments are passed to train_model.py"
+    )
+    parser.add_argument('--num-workers', type=int, default=2)
+    args, train_args = parser.parse_known_args()
+
+    sys.exit(launch(args.num_workers, train_args))
+
+
+if __name__ == "__main__":
+    main()
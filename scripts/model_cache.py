@@ -0,0 +1,111 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import argparse
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIRNAME = '.model_cache'
+SOURCE_FILENAME = 'source.json'
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def default_cache_dir(model_path: str) -> str:
+    """MODEL_CACHE_DIR, or a hidden directory next to the model"""
+    return os.getenv('MODEL_CACHE_DIR') or os.path.join(os.path.dirname(os.path.abspath(model_path)), CACHE_DIRNAME)
+
+
+def export_saved_model(model_path: str, export_dir: str):
+    """Convert a Keras model into a SavedModel holding only its weights and a serving function"""
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(model_path, compile=False)
+    input_spec = tf.TensorSpec([None] + list(model.input_shape[1:]), tf.float32, name='images')
+
+    # Restoring a full Keras object graph is what makes Keras SavedModels slow to
+    # load, so only the variables and one batch-polymorphic function are tracked
+    module = tf.Module()
+    module.model_weights = list(model.weights)
+    module.serve = tf.function(lambda images: model(images, training=False), input_signature=[input_spec])
+
+    tf.saved_model.save(module, export_dir, signatures={'serving_default': module.serve.get_concrete_function()})
+
+
+def ensure_saved_model(model_path: str, cache_dir: Optional[str] = None,
+                       digest: Optional[str] = None) -> Tuple[str, Dict[str, float]]:
+    """Return the cached SavedModel for a Keras model file, converting it on a miss
+
+    The cache is keyed on the model file's hash, so a retrained model gets a
+    new entry and a stale one is never served. Concurrent processes (inference
+    workers, replicas sharing a volume) convert once: the first takes a lock
+    and the others wait for its result.
+    """
+    timings = {}
+    cache_dir = cache_dir or default_cache_dir(model_path)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    if digest is None:
+        start = time.perf_counter()
+        digest = file_digest(model_path)
+        timings['digest_s'] = round(time.perf_counter() - start, 3)
+
+    export_dir = os.path.join(cache_dir, digest[:16])
+    if os.path.exists(os.path.join(export_dir, SOURCE_FILENAME)):
+        return export_dir, timings
+
+    import fcntl
+
+    with open(os.path.join(cache_dir, f"{digest[:16]}.lock"), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        # Another process may have finished the conversion while we waited
+        if os.path.exists(os.path.join(export_dir, SOURCE_FILENAME)):
+            return export_dir, timings
+
+        logger.info(f"Converting {model_path} into the model cache at {export_dir}")
+        start = time.perf_counter()
+
+        tmp_dir = f"{export_dir}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        export_saved_model(model_path, tmp_dir)
+
+        # Written last, so its presence marks a complete entry
+        with open(os.path.join(tmp_dir, SOURCE_FILENAME), 'w') as f:
+            json.dump({'model_path': os.path.abspath(model_path), 'sha256': digest}, f, indent=4)
+
+        shutil.rmtree(export_dir, ignore_errors=True)
+        os.replace(tmp_dir, export_dir)
+
+        timings['convert_s'] = round(time.perf_counter() - start, 3)
+        logger.info(f"Model cached in {timings['convert_s']}s")
+
+    return export_dir, timings
+
+
+def main():
+    """Pre-build the model cache, e.g. while building the serving image"""
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Convert a Keras model into the fast-loading model cache')
+    parser.add_argument('--model-path', default=os.getenv('MODEL_PATH', 'models/crop_disease_model.h5'))
+    parser.add_argument('--cache-dir', default=None, help='Defaults to MODEL_CACHE_DIR or a directory next to the model')
+    args = parser.parse_args()
+
+    export_dir, timings = ensure_saved_model(args.model_path, args.cache_dir)
+    logger.info(f"Model cache ready at {export_dir} {timings}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,95 +1,252 @@
 import os
+import hmac
 import json
 import logging
-from typing import Dict, List, Optional
-import tensorflow as tf
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Startup timing covers imports too
+IMPORT_STARTED = time.perf_counter()
+
 import numpy as np
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Header, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import uvicorn
-from PIL import Image
-import io
-import cv2
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from datetime import datetime
 import asyncio
-import aiofiles
+from batch_scheduler import MicroBatchScheduler
+from inference_backends import InferenceBackend, create_backend
+from inference_workers import WorkerPoolBackend
+from model_registry import ModelRegistry, ModelVersion, ModelVersionNotFound
+from prediction_cache import PredictionCache, create_prediction_cache
+from image_preprocessing import decode_image_bytes, preprocess_image
+from server_metrics import MetricsMiddleware, ServerMetrics, StageTimer
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def parse_warmup_batch_sizes(value: str, max_batch_size: int) -> List[int]:
+    """Batch sizes to warm up: 'auto' for powers of two up to max_batch_size, 'none', or a comma list"""
+    value = value.strip().lower()
+    if value in ('none', 'off', '0', ''):
+        return []
+    if value == 'auto':
+        sizes = [1 << i for i in range(max_batch_size.bit_length()) if 1 << i <= max_batch_size]
+        sizes.append(max_batch_size)
+    else:
+        sizes = [int(size) for size in value.split(',') if size.strip()]
+    
+    # The scheduler never forms batches larger than max_batch_size
+    return sorted({size for size in sizes if 1 <= size <= max_batch_size})
+
 class ModelServer:
-    def __init__(self, model_path: str, metadata_path: str):
+    def __init__(self, model_path: str, metadata_path: str,
+                 max_batch_size: Optional[int] = None, max_wait_ms: Optional[float] = None,
+                 backend: Optional[str] = None, cache: Optional[PredictionCache] = None,
+                 serving_mode: Optional[str] = None, metrics: Optional[ServerMetrics] = None):
         """Initialize the model server"""
-        self.model = None
-        self.metadata = {}
-        self.class_names = []
-        self.input_shape = (224, 224, 3)
-        self.load_model(model_path, metadata_path)
+        self.metrics = metrics
+        self.reduced_decode = os.getenv("REDUCED_JPEG_DECODE", "1") != "0"
+        
+        # "single" runs inference in this process, "workers" in a pool of processes
+        self.serving_mode = (serving_mode or os.getenv("SERVING_MODE", "single")).lower()
+        
+        if max_batch_size is None:
+            max_batch_size = int(os.getenv("BATCH_MAX_SIZE", "16"))
+        if max_wait_ms is None:
+            max_wait_ms = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.backend_name = backend
+        
+        # Trace the batch shapes the scheduler will produce before the first request does
+        self.warmup_batch_sizes = parse_warmup_batch_sizes(os.getenv("WARMUP_BATCH_SIZES", "auto"), max_batch_size)
+        
+        # Every loaded model version, and the one serving unpinned requests
+        start = time.perf_counter()
+        self.registry = ModelRegistry(metrics)
+        version = self.create_version(model_path, metadata_path)
+        version.timings['metadata_s'] = round(time.perf_counter() - start, 3)
+        self.registry.add(version)
+        self.load_model(version)
+        self.registry.mark_ready(version)
+        self.registry.activate(version.id)
+        
+        self.startup_timings = {**version.timings, 'total_s': round(time.perf_counter() - start, 3)}
+        
+        # Serve repeated uploads of the same photo from the prediction cache
+        if cache is None:
+            cache = create_prediction_cache(self.model_version)
+        self.cache = cache
+        
+    @property
+    def active(self) -> ModelVersion:
+        """The version serving requests that do not pin one"""
+        return self.registry.get()
+    
+    @property
+    def backend(self) -> InferenceBackend:
+        return self.active.backend
+    
+    @property
+    def scheduler(self) -> MicroBatchScheduler:
+        return self.active.scheduler
+    
+    @property
+    def metadata(self) -> Dict:
+        return self.active.metadata
+    
+    @property
+    def class_names(self) -> List[str]:
+        return self.active.class_names
+    
+    @property
+    def input_shape(self) -> Tuple[int, ...]:
+        return self.active.input_shape
+    
+    @property
+    def model_version(self) -> str:
+        """Identify the model and backend that produce predictions"""
+        return self.active.cache_version
+    
+    def create_version(self, model_path: str, metadata_path: str) -> ModelVersion:
+        """Read a model's metadata into a version that is not loaded yet"""
+        with open(metadata_path, 'r') as f:
+            metadata = json.load(f)
         
-    def load_model(self, model_path: str, metadata_path: str):
-        """Load the trained model and metadata"""
+        version_id = self.registry.unique_id(str(metadata.get('model_version', 'unknown')))
+        logger.info(f"Model metadata loaded: {len(metadata['class_names'])} classes (version {version_id})")
+        return ModelVersion(version_id, model_path, metadata)
+    
+    def load_model(self, version: ModelVersion):
+        """Load a version's backend and scheduler, then warm it up"""
         try:
-            # Load model
-            self.model = tf.keras.models.load_model(model_path)
-            logger.info(f"Model loaded successfully from {model_path}")
+            start = time.perf_counter()
             
-            # Load metadata
-            with open(metadata_path, 'r') as f:
-                self.metadata = json.load(f)
+            # Load model with the selected inference backend
+            if self.serving_mode == 'workers':
+                version.backend = WorkerPoolBackend(
+                    version.model_path,
+                    version.input_shape,
+                    len(version.class_names),
+                    backend_name=self.backend_name,
+                    num_workers=int(os.environ["INFERENCE_WORKERS"]) if os.getenv("INFERENCE_WORKERS") else None,
+                    max_batch_size=self.max_batch_size,
+                    intra_op_threads=int(os.environ["INTRA_OP_THREADS"]) if os.getenv("INTRA_OP_THREADS") else None,
+                    inter_op_threads=int(os.environ["INTER_OP_THREADS"]) if os.getenv("INTER_OP_THREADS") else None,
+                    warmup_batch_sizes=self.warmup_batch_sizes
+                )
+            else:
+                version.backend = create_backend(version.model_path, self.backend_name)
+            version.timings.update(version.backend.timings)
+            version.timings['backend_s'] = round(time.perf_counter() - start, 3)
+            version.memory_bytes = version.backend.memory_footprint()
+            logger.info(f"Model loaded successfully from {version.model_path} ({version.backend.name} backend)")
             
-            self.class_names = self.metadata['class_names']
-            self.input_shape = tuple(self.metadata['input_shape'])
+            # Merge concurrent requests into batched forward passes, one batch in flight per worker
+            max_concurrent_batches = (version.backend.num_workers
+                                      if isinstance(version.backend, WorkerPoolBackend) else 1)
+            version.scheduler = MicroBatchScheduler(version.backend.predict, self.max_batch_size,
+                                                    self.max_wait_ms, max_concurrent_batches,
+                                                    metrics=self.metrics)
             
-            logger.info(f"Model metadata loaded: {len(self.class_names)} classes")
+            self.warm_up(version)
             
         except Exception as e:
             logger.error(f"Error loading model: {str(e)}")
             raise
     
-    def preprocess_image(self, image_bytes: bytes) -> np.ndarray:
+    def warm_up(self, version: ModelVersion):
+        """Run synthetic batches so graph tracing happens before the version takes traffic"""
+        start = time.perf_counter()
+        version.backend.warm_up(version.input_shape, self.warmup_batch_sizes)
+        # Worker pools warm up inside each worker while loading
+        version.timings.setdefault('warm_up_s', round(time.perf_counter() - start, 3))
+        logger.info(f"Model version {version.id} warmed up in {version.timings['warm_up_s']}s "
+                    f"(batch sizes {self.warmup_batch_sizes})")
+    
+    def reload(self, model_path: str, metadata_path: str, activate: bool = True) -> ModelVersion:
+        """Load a model version in the background; it is swapped in once warmed up"""
+        version = self.create_version(model_path, metadata_path)
+        self.registry.start_reload(version, self.load_model, activate)
+        return version
+    
+    async def close(self):
+        """Retire every loaded version"""
+        await self.registry.close()
+    
+    def preprocess_image(self, image_bytes: bytes, input_shape: Optional[Tuple[int, ...]] = None) -> np.ndarray:
         """Preprocess image for prediction"""
         try:
-            # Load image from bytes
-            image = Image.open(io.BytesIO(image_bytes))
+            input_shape = input_shape or self.input_shape
+            
+            # Decode JPEGs straight to the smallest scale covering the model input
+            target_size = input_shape[:2] if self.reduced_decode else None
+            with StageTimer(self.metrics, 'decode'):
+                image_array = decode_image_bytes(image_bytes, target_size)
+            
+            # Resize and normalize into a [1, H, W, 3] float32 batch
+            with StageTimer(self.metrics, 'preprocess'):
+                return preprocess_image(image_array, input_shape)
             
-            # Convert to RGB if needed
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
+        except Exception as e:
+            logger.error(f"Error preprocessing image: {str(e)}")
+            raise
+    
+    def predict_arrays(self, batch: np.ndarray) -> np.ndarray:
+        """Run a single forward pass over a preprocessed batch"""
+        return self.backend.predict(batch)
+    
+    async def predict(self, image_bytes: bytes, plant_part: str = "leaves",
+                      model_version: Optional[str] = None) -> Dict:
+        """Make prediction on image, on the active model version unless one is pinned"""
+        # The request stays on this version even if another is swapped in meanwhile
+        version = self.registry.acquire(model_version)
+        try:
+            loop = asyncio.get_running_loop()
             
-            # Convert to numpy array
-            image_array = np.array(image)
+            # Cache hits skip decode and inference entirely
+            cache_key = None
+            if self.cache:
+                cache_key = await loop.run_in_executor(None, self.cache.make_key, image_bytes,
+                                                       version.cache_version)
+                cached = await loop.run_in_executor(None, self.cache.get, cache_key)
+                if cached is not None:
+                    if self.metrics:
+                        self.metrics.cache_hits.inc()
+                    cached['plantPart'] = plant_part
+                    cached['timestamp'] = datetime.now().isoformat()
+                    return cached
+                if self.metrics:
+                    self.metrics.cache_misses.inc()
             
-            # Resize image
-            image_array = cv2.resize(image_array, (self.input_shape[1], self.input_shape[0]))
+            # Preprocess image off the event loop
+            processed_image = await loop.run_in_executor(None, self.preprocess_image, image_bytes,
+                                                         version.input_shape)
             
-            # Normalize
-            image_array = image_array.astype(np.float32) / 255.0
+            # Make prediction (batched with concurrent requests)
+            probabilities = await version.scheduler.submit(processed_image[0])
             
-            # Apply ImageNet normalization
-            mean = np.array([0.485, 0.456, 0.406])
-            std = np.array([0.229, 0.224, 0.225])
-            image_array = (image_array - mean) / std
+            with StageTimer(self.metrics, 'postprocess'):
+                result = self.format_prediction(probabilities, plant_part, version)
             
-            # Add batch dimension
-            image_array = np.expand_dims(image_array, axis=0)
+            if self.cache:
+                await loop.run_in_executor(None, self.cache.set, cache_key, result)
             
-            return image_array
+            return result
             
         except Exception as e:
-            logger.error(f"Error preprocessing image: {str(e)}")
+            logger.error(f"Error during prediction: {str(e)}")
             raise
+        finally:
+            self.registry.release(version)
     
-    async def predict(self, image_bytes: bytes, plant_part: str = "leaves") -> Dict:
-        """Make prediction on image"""
+    def format_prediction(self, probabilities: np.ndarray, plant_part: str,
+                          version: Optional[ModelVersion] = None) -> Dict:
+        """Build the response for one row of model output"""
         try:
-            # Preprocess image
-            processed_image = self.preprocess_image(image_bytes)
-            
-            # Make prediction
-            predictions = self.model.predict(processed_image, verbose=0)
-            probabilities = predictions[0]
+            version = version or self.active
             
             # Get top predictions
             top_indices = np.argsort(probabilities)[-5:][::-1]
@@ -98,7 +255,7 @@ class ModelServer:
             confidence = float(probabilities[top_indices[0]]) * 100
             
             # Get predicted class
-            predicted_class = self.class_names[top_indices[0]]
+            predicted_class = version.class_names[top_indices[0]]
             
             # Determine severity
             severity = self.calculate_severity(confidence, predicted_class)
@@ -116,9 +273,10 @@ class ModelServer:
                 'isHealthy': predicted_class.lower() == 'healthy',
                 'plantPart': plant_part,
                 'timestamp': datetime.now().isoformat(),
+                'modelVersion': version.id,
                 'top_predictions': [
                     {
-                        'class': self.class_names[idx],
+                        'class': version.class_names[idx],
                         'confidence': round(float(probabilities[idx]) * 100, 2)
                     }
                     for idx in top_indices
@@ -128,7 +286,7 @@ class ModelServer:
             return result
             
         except Exception as e:
-            logger.error(f"Error during prediction: {str(e)}")
+            logger.error(f"Error formatting prediction: {str(e)}")
             raise
     
     def calculate_severity(self, confidence: float, disease: str) -> str:
@@ -193,9 +351,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request counts, stage latencies and memory, exposed at /metrics
+metrics = ServerMetrics()
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+
 # Initialize model server
 model_server = None
 
+# Upper bound on uploads read and decoded concurrently by the batch endpoints
+MAX_INFLIGHT_IMAGES = int(os.getenv("MAX_INFLIGHT_IMAGES", "32"))
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize model on startup"""
@@ -204,12 +369,22 @@ async def startup_event():
         model_path = os.getenv("MODEL_PATH", "models/crop_disease_model.h5")
         metadata_path = os.getenv("METADATA_PATH", "models/model_metadata.json")
         
-        model_server = ModelServer(model_path, metadata_path)
-        logger.info("Model server initialized successfully")
+        model_server = ModelServer(model_path, metadata_path, metrics=metrics)
+        
+        model_server.startup_timings['since_import_s'] = round(time.perf_counter() - IMPORT_STARTED, 3)
+        metrics.set_startup(model_server.startup_timings)
+        breakdown = ", ".join(f"{phase} {seconds}s" for phase, seconds in model_server.startup_timings.items())
+        logger.info(f"Model server initialized successfully ({breakdown})")
     except Exception as e:
         logger.error(f"Failed to initialize model server: {str(e)}")
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop every loaded model version on shutdown"""
+    if model_server:
+        await model_server.close()
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -218,18 +393,63 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {
-        "status": "healthy",
+    # Worker pools report workers they gave up restarting
+    backend_stats = model_server.backend.get_stats() if model_server else {}
+    if not backend_stats.get('healthy', True):
+        status = "unhealthy"
+    elif backend_stats.get('failed_workers'):
+        status = "degraded"
+    else:
+        status = "healthy"
+    
+    content = {
+        "status": status,
         "model_loaded": model_server is not None,
+        "model_version": model_server.model_version if model_server else None,
+        "startup_s": model_server.startup_timings.get('since_import_s') if model_server else None,
+        "failed_workers": backend_stats.get('failed_workers'),
         "timestamp": datetime.now().isoformat()
     }
+    return JSONResponse(content=content, status_code=503 if status == "unhealthy" else 200)
+
+@app.get("/stats")
+async def get_stats():
+    """Get serving statistics"""
+    if not model_server:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    return {
+        "batching": model_server.scheduler.get_stats(),
+        "backend": model_server.backend.get_stats(),
+        "cache": model_server.cache.get_stats() if model_server.cache else None,
+        "models": model_server.registry.get_stats(),
+        "startup": model_server.startup_timings
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics"""
+    return Response(content=metrics.render(), media_type=metrics.content_type)
+
+def check_model_version(model_version: Optional[str]):
+    """Reject a pinned model version that is not loaded"""
+    try:
+        model_server.registry.get(model_version)
+    except ModelVersionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+async def read_upload(image: UploadFile) -> bytes:
+    """Read an uploaded file, timing it as the upload_read stage"""
+    with StageTimer(model_server.metrics, 'upload_read'):
+        return await image.read()
 
 @app.post("/predict")
 async def predict_disease(
     image: UploadFile = File(...),
-    plant_part: str = Form(default="leaves")
+    plant_part: str = Form(default="leaves"),
+    model_version: Optional[str] = Form(default=None)
 ):
-    """Predict crop disease from image"""
+    """Predict crop disease from image, optionally pinned to a loaded model version"""
     try:
         if not model_server:
             raise HTTPException(status_code=503, detail="Model not loaded")
@@ -239,15 +459,17 @@ async def predict_disease(
             raise HTTPException(status_code=400, detail="File must be an image")
         
         # Read image bytes
-        image_bytes = await image.read()
+        image_bytes = await read_upload(image)
         
         # Make prediction
-        result = await model_server.predict(image_bytes, plant_part)
+        result = await model_server.predict(image_bytes, plant_part, model_version)
         
         return JSONResponse(content=result)
         
     except HTTPException:
         raise
+    except ModelVersionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         logger.error(f"Prediction error: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -255,7 +477,8 @@ async def predict_disease(
 @app.post("/predict/batch")
 async def predict_batch(
     images: List[UploadFile] = File(...),
-    plant_parts: List[str] = Form(...)
+    plant_parts: List[str] = Form(...),
+    model_version: Optional[str] = Form(default=None)
 ):
     """Predict crop diseases for multiple images"""
     try:
@@ -268,18 +491,17 @@ async def predict_batch(
                 detail="Number of images must match number of plant parts"
             )
         
-        results = []
-        for image, plant_part in zip(images, plant_parts):
-            # Validate file type
-            if not image.content_type.startswith('image/'):
-                continue
-            
-            # Read image bytes
-            image_bytes = await image.read()
-            
-            # Make prediction
-            result = await model_server.predict(image_bytes, plant_part)
-            results.append(result)
+        check_model_version(model_version)
+        
+        # Skip non-image files, predict the rest concurrently so they share batches
+        valid = [
+            (image, plant_part) for image, plant_part in zip(images, plant_parts)
+            if image.content_type.startswith('image/')
+        ]
+        in_flight = asyncio.Semaphore(MAX_INFLIGHT_IMAGES)
+        results = await asyncio.gather(*[
+            predict_upload(image, plant_part, in_flight, model_version) for image, plant_part in valid
+        ])
         
         return JSONResponse(content={"predictions": results})
         
@@ -289,6 +511,131 @@ async def predict_batch(
         logger.error(f"Batch prediction error: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+async def predict_upload(image: UploadFile, plant_part: str, in_flight: asyncio.Semaphore,
+                         model_version: Optional[str] = None) -> Dict:
+    """Read and predict one upload while holding an in-flight slot"""
+    async with in_flight:
+        image_bytes = await read_upload(image)
+        return await model_server.predict(image_bytes, plant_part, model_version)
+
+async def stream_predictions(images: List[UploadFile], plant_parts: List[str],
+                             model_version: Optional[str] = None):
+    """Yield one NDJSON line per image as soon as its prediction is ready"""
+    # Bounds how many uploads are held in memory and decoded at once
+    in_flight = asyncio.Semaphore(MAX_INFLIGHT_IMAGES)
+    
+    async def run(index: int, image: UploadFile, plant_part: str) -> Dict:
+        line = {'index': index, 'filename': image.filename}
+        if not image.content_type.startswith('image/'):
+            line['error'] = "File must be an image"
+            return line
+        try:
+            line.update(await predict_upload(image, plant_part, in_flight, model_version))
+        except Exception as e:
+            logger.error(f"Streaming prediction error for {image.filename}: {str(e)}")
+            line['error'] = "Prediction failed"
+        return line
+    
+    tasks = [
+        asyncio.ensure_future(run(index, image, plant_part))
+        for index, (image, plant_part) in enumerate(zip(images, plant_parts))
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield json.dumps(await next_done) + "\n"
+    finally:
+        # Client went away: stop the remaining work
+        for task in tasks:
+            task.cancel()
+
+@app.post("/predict/batch/stream")
+async def predict_batch_stream(
+    images: List[UploadFile] = File(...),
+    plant_parts: List[str] = Form(...),
+    model_version: Optional[str] = Form(default=None)
+):
+    """Predict crop diseases for multiple images, streaming results as NDJSON"""
+    if not model_server:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    if len(images) != len(plant_parts):
+        raise HTTPException(
+            status_code=400,
+            detail="Number of images must match number of plant parts"
+        )
+    
+    check_model_version(model_version)
+    
+    return StreamingResponse(
+        stream_predictions(images, plant_parts, model_version),
+        media_type="application/x-ndjson"
+    )
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    """Admin endpoints are off unless ADMIN_TOKEN is set, and then require it"""
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN not set)")
+    if not hmac.compare_digest(x_admin_token or "", admin_token):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@app.get("/admin/models", dependencies=[Depends(require_admin)])
+async def list_models():
+    """List loaded model versions and which one is active"""
+    if not model_server:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    return model_server.registry.get_stats()
+
+@app.post("/admin/models/reload", status_code=202, dependencies=[Depends(require_admin)])
+async def reload_model(
+    model_path: Optional[str] = Form(default=None),
+    metadata_path: Optional[str] = Form(default=None),
+    activate: bool = Form(default=True)
+):
+    """Load a model version in the background and swap it in once warmed up"""
+    if not model_server:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    model_path = model_path or os.getenv("MODEL_PATH", "models/crop_disease_model.h5")
+    metadata_path = metadata_path or os.getenv("METADATA_PATH", "models/model_metadata.json")
+    
+    try:
+        version = model_server.reload(model_path, metadata_path, activate)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except (OSError, KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Cannot read model metadata: {str(e)}")
+    
+    return version.get_info()
+
+@app.post("/admin/models/{version_id}/activate", dependencies=[Depends(require_admin)])
+async def activate_model(version_id: str):
+    """Swap a loaded model version in as the default"""
+    if not model_server:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    try:
+        return model_server.registry.activate(version_id).get_info()
+    except ModelVersionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.delete("/admin/models/{version_id}", dependencies=[Depends(require_admin)])
+async def retire_model(version_id: str):
+    """Stop routing to a model version and unload it once its requests finish"""
+    if not model_server:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    try:
+        version = model_server.registry.get(version_id)
+        model_server.registry.drain(version)
+    except ModelVersionNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    return version.get_info()
+
 @app.get("/classes")
 async def get_classes():
     """Get available disease classes"""
@@ -309,10 +656,13 @@ async def get_model_info():
     return model_server.metadata
 
 if __name__ == "__main__":
+    import uvicorn
+    
     uvicorn.run(
         "model_deployment:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
+        # Auto-reload is for development; the worker pool is the production mode
+        reload=os.getenv("SERVING_MODE", "single") != "workers",
         log_level="info"
     )
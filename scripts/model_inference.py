@@ -1,30 +1,35 @@
-import tensorflow as tf
 import numpy as np
 import json
 import cv2
 from PIL import Image
 import logging
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterator, List, Tuple, Optional
 import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from inference_backends import InferenceBackend, create_backend
+from image_preprocessing import preprocess_into
 
 logger = logging.getLogger(__name__)
 
 class CropDiseasePredictor:
-    def __init__(self, model_path: str, metadata_path: str):
+    def __init__(self, model_path: str, metadata_path: str, backend: Optional[str] = None):
         """Initialize the crop disease predictor"""
-        self.model = None
+        self.backend: Optional[InferenceBackend] = None
         self.class_names = []
         self.input_shape = (224, 224, 3)
         self.metadata = {}
         
-        self.load_model(model_path, metadata_path)
+        self.load_model(model_path, metadata_path, backend)
     
-    def load_model(self, model_path: str, metadata_path: str):
+    def load_model(self, model_path: str, metadata_path: str, backend: Optional[str] = None):
         """Load the trained model and metadata"""
         try:
-            # Load model
-            self.model = tf.keras.models.load_model(model_path)
-            logger.info(f"Model loaded from {model_path}")
+            # Load model with the selected inference backend
+            self.backend = create_backend(model_path, backend)
+            logger.info(f"Model loaded from {model_path} ({self.backend.name} backend)")
             
             # Load metadata
             with open(metadata_path, 'r') as f:
@@ -39,27 +44,51 @@ class CropDiseasePredictor:
             logger.error(f"Error loading model: {str(e)}")
             raise
     
+    def preprocess_into(self, image: np.ndarray, out: np.ndarray):
+        """Preprocess a BGR image and write it into a preallocated batch slot"""
+        preprocess_into(image, out, bgr=True)
+    
     def preprocess_image(self, image: np.ndarray) -> np.ndarray:
         """Preprocess image for prediction"""
-        # Resize image
-        image = cv2.resize(image, (self.input_shape[1], self.input_shape[0]))
+        # Allocate a batch of one
+        batch = np.empty((1,) + tuple(self.input_shape), dtype=np.float32)
+        self.preprocess_into(image, batch[0])
         
-        # Convert to RGB if needed
-        if len(image.shape) == 3 and image.shape[2] == 3:
-            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        return batch
+    
+    def predict_arrays(self, batch: np.ndarray) -> np.ndarray:
+        """Run a single forward pass over a preprocessed batch"""
+        return self.backend.predict(batch)
+    
+    def top_k_indices(self, probabilities: np.ndarray, top_k: int) -> np.ndarray:
+        """Get the top-k class indices of every row, highest confidence first"""
+        top_k = min(top_k, probabilities.shape[1])
         
-        # Normalize
-        image = image.astype(np.float32) / 255.0
+        # Partition all rows at once, then sort only the k survivors
+        top_indices = np.argpartition(-probabilities, top_k - 1, axis=1)[:, :top_k]
+        top_probabilities = np.take_along_axis(probabilities, top_indices, axis=1)
+        order = np.argsort(-top_probabilities, axis=1, kind='stable')
         
-        # Apply ImageNet normalization
-        mean = np.array([0.485, 0.456, 0.406])
-        std = np.array([0.229, 0.224, 0.225])
-        image = (image - mean) / std
+        return np.take_along_axis(top_indices, order, axis=1)
+    
+    def format_prediction(self, probabilities: np.ndarray, top_indices: np.ndarray) -> Dict:
+        """Build the result dictionary for one image"""
+        results = {
+            'predictions': [],
+            'confidence': float(probabilities[top_indices[0]]),
+            'top_prediction': {
+                'class': self.class_names[top_indices[0]],
+                'confidence': float(probabilities[top_indices[0]])
+            }
+        }
         
-        # Add batch dimension
-        image = np.expand_dims(image, axis=0)
+        for idx in top_indices:
+            results['predictions'].append({
+                'class': self.class_names[idx],
+                'confidence': float(probabilities[idx])
+            })
         
-        return image
+        return results
     
     def predict(self, image: np.ndarray, top_k: int = 3) -> Dict:
         """Make prediction on image"""
@@ -68,95 +97,177 @@ class CropDiseasePredictor:
             processed_image = self.preprocess_image(image)
             
             # Make prediction
-            predictions = self.model.predict(processed_image, verbose=0)
-            probabilities = predictions[0]
+            probabilities = self.predict_arrays(processed_image)
             
             # Get top-k predictions
-            top_indices = np.argsort(probabilities)[-top_k:][::-1]
-            
-            results = {
-                'predictions': [],
-                'confidence': float(probabilities[top_indices[0]]),
-                'top_prediction': {
-                    'class': self.class_names[top_indices[0]],
-                    'confidence': float(probabilities[top_indices[0]])
-                }
-            }
-            
-            for idx in top_indices:
-                results['predictions'].append({
-                    'class': self.class_names[idx],
-                    'confidence': float(probabilities[idx])
-                })
+            top_indices = self.top_k_indices(probabilities, top_k)
             
-            return results
+            return self.format_prediction(probabilities[0], top_indices[0])
             
         except Exception as e:
             logger.error(f"Error during prediction: {str(e)}")
             raise
     
-    def predict_batch(self, images: List[np.ndarray]) -> List[Dict]:
+    def predict_batch(self, images: List[np.ndarray], top_k: int = 3, batch_size: int = 32) -> List[Dict]:
         """Make predictions on batch of images"""
-        results = []
-        for image in images:
-            result = self.predict(image)
-            results.append(result)
-        return results
+        if not images:
+            return []
+        
+        try:
+            batch_size = max(1, min(batch_size, len(images)))
+            
+            # One preallocated input tensor, reused for every chunk
+            batch = np.empty((batch_size,) + tuple(self.input_shape), dtype=np.float32)
+            probabilities = None
+            
+            for start in range(0, len(images), batch_size):
+                chunk = images[start:start + batch_size]
+                for i, image in enumerate(chunk):
+                    self.preprocess_into(image, batch[i])
+                
+                # Single forward pass per chunk
+                chunk_probabilities = self.predict_arrays(batch[:len(chunk)])
+                if probabilities is None:
+                    probabilities = np.empty((len(images), chunk_probabilities.shape[1]), dtype=np.float32)
+                probabilities[start:start + len(chunk)] = chunk_probabilities
+            
+            # Top-k for all rows at once
+            top_indices = self.top_k_indices(probabilities, top_k)
+            
+            return [
+                self.format_prediction(probabilities[i], top_indices[i])
+                for i in range(len(images))
+            ]
+            
+        except Exception as e:
+            logger.error(f"Error during batch prediction: {str(e)}")
+            raise
 
 class ModelEvaluator:
-    def __init__(self, model_path: str, metadata_path: str):
+    def __init__(self, model_path: str, metadata_path: str, backend: Optional[str] = None):
         """Initialize model evaluator"""
-        self.predictor = CropDiseasePredictor(model_path, metadata_path)
+        self.predictor = CropDiseasePredictor(model_path, metadata_path, backend)
     
-    def evaluate_on_dataset(self, test_dir: str) -> Dict:
-        """Evaluate model on test dataset"""
-        results = {
-            'total_samples': 0,
-            'correct_predictions': 0,
-            'accuracy': 0.0,
-            'per_class_accuracy': {},
-            'confusion_matrix': []
-        }
-        
-        class_counts = {class_name: 0 for class_name in self.predictor.class_names}
-        class_correct = {class_name: 0 for class_name in self.predictor.class_names}
-        
-        # Process each class directory
-        for class_name in self.predictor.class_names:
+    def list_samples(self, test_dir: str) -> Iterator[Tuple[str, int]]:
+        """Yield (image path, class index) for every test image"""
+        for class_idx, class_name in enumerate(self.predictor.class_names):
             class_dir = os.path.join(test_dir, class_name)
             if not os.path.exists(class_dir):
                 continue
             
-            image_files = [f for f in os.listdir(class_dir) 
-                          if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff'))]
-            
-            for image_file in image_files:
-                image_path = os.path.join(class_dir, image_file)
-                
-                # Load and predict
-                image = cv2.imread(image_path)
-                if image is None:
-                    continue
-                
-                prediction = self.predictor.predict(image)
-                predicted_class = prediction['top_prediction']['class']
+            for entry in os.scandir(class_dir):
+                if entry.name.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff')):
+                    yield entry.path, class_idx
+    
+    def evaluate_on_dataset(self, test_dir: str, batch_size: int = 32,
+                            num_workers: Optional[int] = None, prefetch_batches: int = 4) -> Dict:
+        """Evaluate model on test dataset"""
+        num_classes = len(self.predictor.class_names)
+        num_workers = num_workers or min(8, os.cpu_count() or 1)
+        input_shape = tuple(self.predictor.input_shape)
+        
+        confusion = np.zeros((num_classes, num_classes), dtype=np.int64)
+        skipped = 0
+        
+        # Fixed set of batch buffers recycled between the decoder and the model,
+        # so memory stays bounded regardless of the test-set size
+        free_buffers = queue.Queue()
+        for _ in range(prefetch_batches + 1):
+            free_buffers.put(np.empty((batch_size,) + input_shape, dtype=np.float32))
+        ready_batches = queue.Queue(maxsize=prefetch_batches)
+        done = object()
+        stop = threading.Event()
+        
+        def decode_into(args) -> bool:
+            image_path, out = args
+            image = cv2.imread(image_path)
+            if image is None:
+                return False
+            self.predictor.preprocess_into(image, out)
+            return True
+        
+        def produce():
+            try:
+                with ThreadPoolExecutor(max_workers=num_workers) as pool:
+                    samples = self.list_samples(test_dir)
+                    while not stop.is_set():
+                        chunk = [sample for _, sample in zip(range(batch_size), samples)]
+                        if not chunk:
+                            break
+                        
+                        buffer = free_buffers.get()
+                        decoded = list(pool.map(decode_into, [(path, buffer[i]) for i, (path, _) in enumerate(chunk)]))
+                        labels = np.array([label for _, label in chunk], dtype=np.int64)
+                        ready_batches.put((buffer, labels, np.array(decoded, dtype=bool)))
+                ready_batches.put(done)
+            except Exception as e:
+                ready_batches.put(e)
+        
+        producer = threading.Thread(target=produce, name='eval-decoder', daemon=True)
+        start_time = time.perf_counter()
+        producer.start()
+        
+        try:
+            while True:
+                item = ready_batches.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
                 
-                results['total_samples'] += 1
-                class_counts[class_name] += 1
+                buffer, labels, valid = item
+                probabilities = self.predictor.predict_arrays(buffer[:len(labels)])
+                free_buffers.put(buffer)
                 
-                if predicted_class == class_name:
-                    results['correct_predictions'] += 1
-                    class_correct[class_name] += 1
-        
-        # Calculate accuracies
-        if results['total_samples'] > 0:
-            results['accuracy'] = results['correct_predictions'] / results['total_samples']
-        
-        for class_name in self.predictor.class_names:
-            if class_counts[class_name] > 0:
-                results['per_class_accuracy'][class_name] = class_correct[class_name] / class_counts[class_name]
-            else:
-                results['per_class_accuracy'][class_name] = 0.0
+                # Accumulate the confusion matrix for decodable images only
+                predicted = np.argmax(probabilities, axis=1)[valid]
+                labels = labels[valid]
+                skipped += int((~valid).sum())
+                confusion += np.bincount(
+                    labels * num_classes + predicted, minlength=num_classes * num_classes
+                ).reshape(num_classes, num_classes)
+        finally:
+            stop.set()
+            # Unblock the producer if it is waiting on a full queue
+            while producer.is_alive():
+                try:
+                    item = ready_batches.get(timeout=0.1)
+                    if isinstance(item, tuple):
+                        free_buffers.put(item[0])
+                except queue.Empty:
+                    pass
+        
+        elapsed = time.perf_counter() - start_time
+        
+        # Derive metrics from the confusion matrix
+        total = int(confusion.sum())
+        correct = int(np.trace(confusion))
+        support = confusion.sum(axis=1)
+        predicted_counts = confusion.sum(axis=0)
+        true_positives = np.diag(confusion)
+        recall = np.divide(true_positives, support, out=np.zeros(num_classes), where=support > 0)
+        precision = np.divide(true_positives, predicted_counts, out=np.zeros(num_classes), where=predicted_counts > 0)
+        
+        results = {
+            'total_samples': total,
+            'correct_predictions': correct,
+            'accuracy': correct / total if total > 0 else 0.0,
+            'per_class_accuracy': {},
+            'per_class_precision': {},
+            'per_class_recall': {},
+            'confusion_matrix': confusion.tolist(),
+            'skipped_images': skipped,
+            'elapsed_seconds': round(elapsed, 3),
+            'images_per_second': round(total / elapsed, 2) if elapsed > 0 else 0.0
+        }
+        
+        for i, class_name in enumerate(self.predictor.class_names):
+            results['per_class_accuracy'][class_name] = float(recall[i])
+            results['per_class_precision'][class_name] = float(precision[i])
+            results['per_class_recall'][class_name] = float(recall[i])
+        
+        logger.info(f"Evaluated {total} images in {elapsed:.1f}s "
+                    f"({results['images_per_second']} images/s), accuracy {results['accuracy']:.4f}")
         
         return results
 
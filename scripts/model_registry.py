@@ -0,0 +1,203 @@
+import time
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Versions in these states accept new requests
+SERVABLE_STATES = ('active', 'ready')
+
+
+class ModelVersionNotFound(LookupError):
+    """Raised when a requested model version is not loaded or no longer accepts requests"""
+
+
+class ModelVersion:
+    def __init__(self, version_id: str, model_path: str, metadata: Dict):
+        """One loaded model with its own backend and micro-batch scheduler"""
+        self.id = version_id
+        self.model_path = model_path
+        self.metadata = metadata
+        self.class_names: List[str] = metadata['class_names']
+        self.input_shape: Tuple[int, ...] = tuple(metadata['input_shape'])
+
+        # Filled in by the server's loader
+        self.backend = None
+        self.scheduler = None
+        self.memory_bytes = 0
+
+        # loading -> ready -> active -> draining -> retired, or loading -> failed
+        self.state = 'loading'
+        self.error: Optional[str] = None
+        self.in_flight = 0
+        self.created_at = time.time()
+        self.timings: Dict[str, float] = {}
+
+    @property
+    def cache_version(self) -> str:
+        """Identify the model and backend that produce predictions"""
+        return f"{self.id}:{self.backend.name if self.backend else 'unloaded'}"
+
+    def get_info(self) -> Dict:
+        """Describe the version for the admin endpoints"""
+        return {
+            'version': self.id,
+            'state': self.state,
+            'model_path': self.model_path,
+            'backend': self.backend.name if self.backend else None,
+            'in_flight': self.in_flight,
+            'memory_bytes': self.memory_bytes,
+            'created_at': self.created_at,
+            'timings': self.timings,
+            'error': self.error
+        }
+
+
+class ModelRegistry:
+    def __init__(self, metrics=None):
+        """Loaded model versions, the active one, and the swap between them
+
+        Requests acquire a version and release it when done. A swap only moves
+        the active pointer, so requests already holding the old version finish
+        on it; the old version is retired once its last request releases it.
+        """
+        self.versions: Dict[str, ModelVersion] = {}
+        self.active: Optional[ModelVersion] = None
+        self.reload_task: Optional[asyncio.Task] = None
+        self.metrics = metrics
+        self.swaps = 0
+
+        if self.metrics is not None:
+            self.metrics.track_queue(self.queue_depth)
+
+    def unique_id(self, version_id: str) -> str:
+        """Suffix a version id that is already taken by a live version"""
+        candidate, suffix = version_id, 1
+        while candidate in self.versions and self.versions[candidate].state != 'failed':
+            suffix += 1
+            candidate = f"{version_id}-{suffix}"
+        return candidate
+
+    def add(self, version: ModelVersion):
+        """Track a version; it serves once loaded"""
+        self.versions[version.id] = version
+
+    def get(self, version_id: Optional[str] = None) -> ModelVersion:
+        """Look up a servable version; None means the active one"""
+        version = self.active if version_id is None else self.versions.get(version_id)
+        if version is None or version.state not in SERVABLE_STATES:
+            if version_id is None:
+                raise ModelVersionNotFound("No model version is active")
+            raise ModelVersionNotFound(f"Model version '{version_id}' is not loaded")
+        return version
+
+    def acquire(self, version_id: Optional[str] = None) -> ModelVersion:
+        """Pin a version for the duration of one request"""
+        # No await between lookup and increment, so a swap cannot slip in between
+        version = self.get(version_id)
+        version.in_flight += 1
+        return version
+
+    def release(self, version: ModelVersion):
+        """End a request on a version, retiring it if it was the last one on a drained version"""
+        version.in_flight -= 1
+        if version.state == 'draining' and version.in_flight == 0:
+            asyncio.get_running_loop().create_task(self.retire(version))
+
+    def mark_ready(self, version: ModelVersion):
+        """Loader finished: the version can take pinned requests"""
+        version.state = 'ready'
+        if self.metrics is not None:
+            self.metrics.set_model_memory(version.id, version.memory_bytes)
+
+    def activate(self, version_id: str) -> ModelVersion:
+        """Make a loaded version the default and start draining the previous one"""
+        version = self.get(version_id)
+        previous = self.active
+
+        # The swap itself is one assignment on the event loop
+        self.active = version
+        version.state = 'active'
+        if previous is not None and previous is not version:
+            self.swaps += 1
+            self.drain(previous)
+
+        if self.metrics is not None:
+            self.metrics.set_active_model(version.id)
+        logger.info(f"Model version {version.id} is active"
+                    + (f", draining {previous.id}" if previous is not None and previous is not version else ""))
+        return version
+
+    def drain(self, version: ModelVersion):
+        """Stop new requests on a version and retire it once in-flight ones finish"""
+        if version is self.active:
+            raise ValueError("Cannot retire the active model version")
+        version.state = 'draining'
+        if version.in_flight == 0:
+            asyncio.get_running_loop().create_task(self.retire(version))
+
+    async def retire(self, version: ModelVersion):
+        """Release a drained version's scheduler, backend and memory"""
+        if version.state == 'retired':
+            return
+        version.state = 'retired'
+
+        if version.scheduler is not None:
+            await version.scheduler.stop()
+        if version.backend is not None:
+            # Worker pools join their processes, which blocks
+            await asyncio.get_running_loop().run_in_executor(None, version.backend.close)
+
+        self.versions.pop(version.id, None)
+        if self.metrics is not None:
+            self.metrics.remove_model(version.id)
+        logger.info(f"Model version {version.id} retired")
+
+    def start_reload(self, version: ModelVersion, load_fn: Callable[[ModelVersion], None],
+                     activate: bool = True) -> asyncio.Task:
+        """Load a version in the background and swap it in when ready"""
+        if self.reload_task is not None and not self.reload_task.done():
+            raise RuntimeError("A model reload is already in progress")
+
+        self.add(version)
+        self.reload_task = asyncio.get_running_loop().create_task(self._reload(version, load_fn, activate))
+        return self.reload_task
+
+    async def _reload(self, version: ModelVersion, load_fn: Callable[[ModelVersion], None], activate: bool):
+        # Loading and warm-up run on a thread, so serving continues on the current version
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, load_fn, version)
+        except Exception as e:
+            logger.error(f"Failed to load model version {version.id}: {str(e)}")
+            version.state = 'failed'
+            version.error = str(e)
+            if version.scheduler is not None:
+                await version.scheduler.stop()
+            if version.backend is not None:
+                await asyncio.get_running_loop().run_in_executor(None, version.backend.close)
+            return
+
+        self.mark_ready(version)
+        if activate:
+            self.activate(version.id)
+
+    def queue_depth(self) -> int:
+        """Images waiting across every loaded version's scheduler"""
+        return sum(version.scheduler.queue_depth() for version in list(self.versions.values())
+                   if version.scheduler is not None)
+
+    async def close(self):
+        """Retire every version, active included"""
+        self.active = None
+        for version in list(self.versions.values()):
+            await self.retire(version)
+
+    def get_stats(self) -> Dict:
+        """Loaded versions and which one is active"""
+        return {
+            'active': self.active.id if self.active else None,
+            'swaps': self.swaps,
+            'reloading': self.reload_task is not None and not self.reload_task.done(),
+            'versions': [version.get_info() for version in self.versions.values()]
+        }
@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+import tensorflow as tf
+
+logger = logging.getLogger(__name__)
+
+REPORT_FILENAME = 'input_pipeline_report'
+
+# Share of wall time spent waiting on the iterator above which training counts as input-bound
+INPUT_BOUND_THRESHOLD = 0.2
+
+
+class InputPipelineProfiler:
+    def __init__(self, batch_size: int, stage_steps: int = 20):
+        """Per-epoch iterator wait, step time and prefetch occupancy of a training run
+
+        The model's generator methods register each pipeline prefix with
+        add_stage and wrap the last one in count_produced, so the profiler
+        can cost every stage and see how full the prefetch buffer is.
+        """
+        self.batch_size = batch_size
+        self.stage_steps = stage_steps
+        self.stages: List[Dict] = []
+        self.epochs: List[Dict] = []
+        self.produced = tf.Variable(0, dtype=tf.int64, trainable=False)
+        self.consumed = 0
+
+    def add_stage(self, name: str, dataset: tf.data.Dataset) -> tf.data.Dataset:
+        """Record the pipeline up to and including a named stage"""
+        self.stages.append({'name': name, 'dataset': dataset})
+        return dataset
+
+    def count_produced(self, dataset: tf.data.Dataset) -> tf.data.Dataset:
+        """Count batches handed to the prefetch buffer"""
+        def count(*batch):
+            self.produced.assign_add(1)
+            return batch
+
+        return dataset.map(count)
+
+    def occupancy(self) -> int:
+        """Batches produced but not yet taken by the training loop"""
+        return int(self.produced.numpy()) - self.consumed
+
+    def profile_epoch(self, model, dataset: tf.data.Dataset, epoch: int,
+                      class_weight: Optional[Dict] = None, max_steps: Optional[int] = None) -> Dict:
+        """Train one epoch with train_on_batch, timing iterator waits and steps separately"""
+        wait_times, step_times, occupancy, images = [], [], [], 0
+        first_step = None
+        logs = {}
+
+        iterator = iter(dataset)
+        epoch_start = time.perf_counter()
+
+        while max_steps is None or len(wait_times) < max_steps:
+            occupancy.append(self.occupancy())
+
+            start = time.perf_counter()
+            try:
+                x, y = next(iterator)
+            except StopIteration:
+                occupancy.pop()
+                break
+            waited = time.perf_counter() - start
+            self.consumed += 1
+
+            start = time.perf_counter()
+            logs = model.train_on_batch(x, y, class_weight=class_weight, return_dict=True)
+            step = time.perf_counter() - start
+
+            # The first step of a run also traces and compiles the train function
+            if first_step is None:
+                first_step = step
+            else:
+                step_times.append(step)
+            wait_times.append(waited)
+            images += int(x.shape[0])
+
+        # Rates leave out the first step's tracing so short runs are not dominated by it
+        elapsed = time.perf_counter() - epoch_start - (first_step or 0.0)
+        wait_total = float(np.sum(wait_times))
+        step_total = float(np.sum(step_times))
+
+        stats = {
+            'epoch': epoch,
+            'steps': len(wait_times),
+            'images': images,
+            'elapsed_s': round(elapsed, 4),
+            'iterator_wait_s': round(wait_total, 4),
+            'train_step_s': round(step_total, 4),
+            'first_step_s': round(first_step or 0.0, 4),
+            'wait_fraction': round(wait_total / elapsed, 4) if elapsed else 0.0,
+            'mean_wait_ms': round(1000 * float(np.mean(wait_times)), 3) if wait_times else 0.0,
+            'mean_step_ms': round(1000 * float(np.mean(step_times)), 3) if step_times else 0.0,
+            'images_per_sec': round(images / elapsed, 2) if elapsed else 0.0,
+            'prefetch_occupancy_mean': round(float(np.mean(occupancy)), 2) if occupancy else 0.0,
+            'prefetch_occupancy_max': int(np.max(occupancy)) if occupancy else 0,
+            'prefetch_empty_fraction': round(float(np.mean(np.array(occupancy) <= 0)), 4) if occupancy else 0.0,
+            'metrics': {key: float(value) for key, value in logs.items()}
+        }
+        self.epochs.append(stats)
+
+        logger.info(f"Epoch {epoch}: {images / elapsed:.1f} images/s, "
+                    f"{100 * stats['wait_fraction']:.1f}% waiting on input, "
+                    f"mean prefetch occupancy {stats['prefetch_occupancy_mean']}")
+        return stats
+
+    def time_prefix(self, dataset: tf.data.Dataset) -> float:
+        """Seconds per image for iterating a pipeline prefix on its own"""
+        images = dataset.element_spec[0]
+        batched = images.shape.rank == 4
+        elements = self.stage_steps if batched else self.stage_steps * self.batch_size
+
+        iterator = iter(dataset.take(elements))
+        # Pull one element first so start-up (shuffle buffer fill, file opens) is not charged
+        first = next(iterator, None)
+        if first is None:
+            return 0.0
+
+        count = 0
+        start = time.perf_counter()
+        for element in iterator:
+            count += int(element[0].shape[0]) if batched else 1
+        elapsed = time.perf_counter() - start
+
+        return elapsed / count if count else 0.0
+
+    def profile_stages(self) -> List[Dict]:
+        """Cost of each registered stage as the time its prefix adds over the previous one"""
+        results = []
+        previous = 0.0
+
+        for stage in self.stages:
+            per_image = self.time_prefix(stage['dataset'])
+            # Parallel stages overlap, so the increment can dip slightly below zero
+            cost = max(0.0, per_image - previous)
+            results.append({
+                'stage': stage['name'],
+                'prefix_ms_per_image': round(1000 * per_image, 4),
+                'stage_ms_per_image': round(1000 * cost, 4)
+            })
+            previous = max(previous, per_image)
+
+        total = sum(result['stage_ms_per_image'] for result in results)
+        for result in results:
+            result['share'] = round(result['stage_ms_per_image'] / total, 4) if total else 0.0
+
+        return results
+
+    def build_report(self) -> Dict:
+        """Summarize epochs and stages and name the bottleneck"""
+        stages = self.profile_stages()
+        wait_total = sum(epoch['iterator_wait_s'] for epoch in self.epochs)
+        elapsed_total = sum(epoch['elapsed_s'] for epoch in self.epochs)
+        wait_fraction = wait_total / elapsed_total if elapsed_total else 0.0
+
+        slowest = max(stages, key=lambda stage: stage['stage_ms_per_image']) if stages else None
+
+        if wait_fraction >= INPUT_BOUND_THRESHOLD:
+            bound = 'input'
+            bottleneck = slowest['stage'] if slowest else 'input pipeline'
+        else:
+            bound = 'compute'
+            bottleneck = 'train_step'
+
+        return {
+            'bound': bound,
+            'bottleneck': bottleneck,
+            'slowest_input_stage': slowest['stage'] if slowest else None,
+            'wait_fraction': round(wait_fraction, 4),
+            'images_per_sec': round(sum(epoch['images'] for epoch in self.epochs) / elapsed_total, 2)
+                              if elapsed_total else 0.0,
+            'batch_size': self.batch_size,
+            'epochs': self.epochs,
+            'stages': stages
+        }
+
+    def summary_text(self, report: Dict) -> str:
+        """Short human-readable version of the report"""
+        lines = [
+            f"Training is {report['bound']}-bound: {100 * report['wait_fraction']:.1f}% of wall time "
+            f"waiting on the input pipeline, {report['images_per_sec']} images/s overall.",
+            f"Bottleneck: {report['bottleneck']} (slowest input stage: {report['slowest_input_stage']})",
+            "",
+            "Epoch  images/s  wait%  step ms  prefetch occupancy (mean/max)"
+        ]
+        for epoch in report['epochs']:
+            lines.append(f"{epoch['epoch']:>5}  {epoch['images_per_sec']:>8}  "
+                         f"{100 * epoch['wait_fraction']:>5.1f}  {epoch['mean_step_ms']:>7.1f}  "
+                         f"{epoch['prefetch_occupancy_mean']}/{epoch['prefetch_occupancy_max']}")
+
+        lines += ["", "Stage costs (ms per image):"]
+        for stage in report['stages']:
+            lines.append(f"  {stage['stage']:<24} {stage['stage_ms_per_image']:>8.3f}  "
+                         f"({100 * stage['share']:.1f}%)")
+
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, save_dir: str) -> str:
+        """Write the JSON report and text summary, returning the JSON path"""
+        os.makedirs(save_dir, exist_ok=True)
+        report = self.build_report()
+
+        json_path = os.path.join(save_dir, f"{REPORT_FILENAME}.json")
+        with open(json_path, 'w') as f:
+            json.dump(report, f, indent=4)
+
+        summary = self.summary_text(report)
+        with open(os.path.join(save_dir, f"{REPORT_FILENAME}.txt"), 'w') as f:
+            f.write(summary)
+
+        logger.info(f"Input pipeline report saved to {json_path}\n{summary}")
+        return json_path
@@ -0,0 +1,191 @@
+import os
+import json
+import math
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class CacheStore:
+    """Byte-oriented key/value storage behind the prediction cache"""
+    name = 'base'
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl_seconds: Optional[float] = None):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def get_stats(self) -> Dict:
+        return {}
+
+
+class InMemoryCacheStore(CacheStore):
+    name = 'memory'
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        """In-process LRU store bounded by a byte budget"""
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[bytes, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl_seconds: Optional[float] = None):
+        size = len(key) + len(value)
+        if size > self.max_bytes:
+            return
+
+        expires_at = time.monotonic() + ttl_seconds if ttl_seconds else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (value, expires_at)
+            self.current_bytes += size
+
+            # Evict least recently used entries until we are back under budget
+            while self.current_bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        value, _ = self._entries.pop(key)
+        self.current_bytes -= len(key) + len(value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def get_stats(self) -> Dict:
+        return {
+            'entries': len(self._entries),
+            'bytes': self.current_bytes,
+            'max_bytes': self.max_bytes,
+            'evictions': self.evictions
+        }
+
+
+class RedisCacheStore(CacheStore):
+    name = 'redis'
+
+    def __init__(self, url: str = 'redis://localhost:6379/0', client=None,
+                 prefix: str = 'crop-disease:prediction:'):
+        """Shared store backed by Redis; eviction follows the server's maxmemory policy"""
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+
+        # Any client with redis-py's get/set/delete/scan_iter signatures works,
+        # e.g. a local stand-in for tests
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl_seconds: Optional[float] = None):
+        # Millisecond expiry, rounded up so a sub-second TTL never becomes 0, which Redis rejects
+        expire_ms = max(1, math.ceil(ttl_seconds * 1000)) if ttl_seconds else None
+        self.client.set(self.prefix + key, value, px=expire_ms)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + '*'):
+            self.client.delete(key)
+
+
+class PredictionCache:
+    # Per-request fields that must not be served from the cache
+    REQUEST_FIELDS = ('plantPart', 'timestamp')
+
+    def __init__(self, store: CacheStore, model_version: str, ttl_seconds: Optional[float] = None):
+        """Content-addressed cache of prediction results"""
+        self.store = store
+        self.model_version = model_version
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def make_key(self, image_bytes: bytes, model_version: Optional[str] = None) -> str:
+        """Key a prediction by image content and the model that produced it"""
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        return f"{model_version or self.model_version}:{digest}"
+
+    def get(self, key: str) -> Optional[Dict]:
+        try:
+            value = self.store.get(key)
+        except Exception as e:
+            logger.warning(f"Prediction cache lookup failed: {str(e)}")
+            self.errors += 1
+            value = None
+
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return json.loads(value)
+
+    def set(self, key: str, result: Dict):
+        value = {k: v for k, v in result.items() if k not in self.REQUEST_FIELDS}
+        try:
+            self.store.set(key, json.dumps(value).encode('utf-8'), self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Prediction cache store failed: {str(e)}")
+            self.errors += 1
+
+    def get_stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'store': self.store.name,
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'miss_ratio': round(self.misses / lookups, 4) if lookups else 0.0,
+            'ttl_seconds': self.ttl_seconds,
+            **self.store.get_stats()
+        }
+
+
+def create_prediction_cache(model_version: str) -> Optional[PredictionCache]:
+    """Create the prediction cache configured by PREDICTION_CACHE (memory, redis or none)"""
+    store_name = os.getenv('PREDICTION_CACHE', 'memory').lower()
+    ttl_seconds = float(os.getenv('PREDICTION_CACHE_TTL', '3600')) or None
+
+    if store_name in ('none', 'off', ''):
+        return None
+    if store_name == 'memory':
+        store = InMemoryCacheStore(int(os.getenv('PREDICTION_CACHE_MAX_BYTES', str(64 * 1024 * 1024))))
+    elif store_name == 'redis':
+        store = RedisCacheStore(os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+    else:
+        raise ValueError(f"Unknown prediction cache store '{store_name}'")
+
+    logger.info(f"Prediction cache enabled ({store.name} store, ttl={ttl_seconds}s)")
+    return PredictionCache(store, model_version, ttl_seconds)
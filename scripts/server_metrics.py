@@ -0,0 +1,160 @@
+import time
+import logging
+from typing import Callable, Dict, Optional
+
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+                               ProcessCollector, generate_latest)
+from starlette.routing import Match
+
+logger = logging.getLogger(__name__)
+
+# Stages of one prediction, in the order a request passes through them
+STAGES = ['upload_read', 'decode', 'preprocess', 'queue_wait', 'forward', 'postprocess']
+
+# Seconds; fine at the low end where decode and preprocessing live
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+class ServerMetrics:
+    content_type = CONTENT_TYPE_LATEST
+
+    def __init__(self):
+        """Prometheus counters and histograms for the serving path
+
+        Everything lives in a registry of its own, so several servers in one
+        process (tests, benchmarks) never collide in the global registry.
+        Observations are a lock and a bucket search, cheap enough to leave on.
+        """
+        self.registry = CollectorRegistry()
+
+        # Process RSS, CPU time and open files (read from /proc on Linux)
+        ProcessCollector(registry=self.registry)
+
+        self.requests = Counter('http_requests_total', 'HTTP requests by route and status code',
+                                ['route', 'method', 'status'], registry=self.registry)
+        self.request_latency = Histogram('http_request_duration_seconds', 'End-to-end request latency',
+                                         ['route'], buckets=LATENCY_BUCKETS, registry=self.registry)
+        self.in_flight = Gauge('http_requests_in_flight', 'Requests currently being served',
+                               ['route'], registry=self.registry)
+
+        self.stage_latency = Histogram('prediction_stage_duration_seconds',
+                                       'Time per image in each prediction stage; forward is per batch',
+                                       ['stage'], buckets=LATENCY_BUCKETS, registry=self.registry)
+        self.batch_size = Histogram('inference_batch_size', 'Images per forward pass',
+                                    buckets=BATCH_SIZE_BUCKETS, registry=self.registry)
+        self.queue_depth = Gauge('inference_queue_depth', 'Images waiting for a forward pass',
+                                 registry=self.registry)
+        self.model_memory = Gauge('model_memory_bytes', 'Approximate memory held by each loaded model version',
+                                  ['model_version'], registry=self.registry)
+        self.model_active = Gauge('model_active', '1 for the model version serving unpinned requests',
+                                  ['model_version'], registry=self.registry)
+        self.cache_hits = Counter('prediction_cache_hits_total', 'Predictions served from the cache',
+                                  registry=self.registry)
+        self.cache_misses = Counter('prediction_cache_misses_total', 'Cache lookups that fell through to inference',
+                                    registry=self.registry)
+        self.startup = Gauge('server_startup_seconds', 'Cold start time by phase', ['phase'],
+                             registry=self.registry)
+
+        # Resolve label children once so the hot path skips the label lookup
+        self.stages = {stage: self.stage_latency.labels(stage=stage) for stage in STAGES}
+
+    def observe_stage(self, stage: str, seconds: float):
+        """Record the time one image spent in a stage"""
+        self.stages[stage].observe(seconds)
+
+    def observe_batch(self, size: int):
+        """Record the size of one forward pass"""
+        self.batch_size.observe(size)
+
+    def track_queue(self, depth_fn: Callable[[], int]):
+        """Read the queue depth from the scheduler at scrape time"""
+        self.queue_depth.set_function(depth_fn)
+
+    def set_model_memory(self, model_version: str, memory_bytes: int):
+        """Report the footprint of a loaded model version"""
+        self.model_memory.labels(model_version=model_version).set(memory_bytes)
+
+    def set_active_model(self, model_version: str):
+        """Mark which version serves unpinned requests"""
+        self.model_active.clear()
+        self.model_active.labels(model_version=model_version).set(1)
+
+    def remove_model(self, model_version: str):
+        """Drop a retired version's series"""
+        for gauge in (self.model_memory, self.model_active):
+            try:
+                gauge.remove(model_version)
+            except KeyError:
+                pass
+
+    def set_startup(self, timings: Dict[str, float]):
+        """Record the startup breakdown"""
+        for phase, seconds in timings.items():
+            self.startup.labels(phase=phase).set(seconds)
+
+    def render(self) -> bytes:
+        """Exposition in the Prometheus text format"""
+        return generate_latest(self.registry)
+
+
+class StageTimer:
+    def __init__(self, metrics: Optional[ServerMetrics], stage: str):
+        """Context manager that records the wrapped block as one stage observation"""
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.metrics is not None:
+            self.metrics.observe_stage(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class MetricsMiddleware:
+    def __init__(self, app, metrics: ServerMetrics):
+        """ASGI middleware counting requests, in-flight requests and end-to-end latency
+
+        A plain ASGI wrapper rather than BaseHTTPMiddleware, so streaming
+        responses are timed until their last chunk and no extra task is spawned.
+        """
+        self.app = app
+        self.metrics = metrics
+
+    def route_label(self, scope) -> str:
+        """Label by the matched route's path template; unmatched paths share one label to bound cardinality"""
+        partial = None
+        for route in scope['app'].routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, 'path', 'other')
+            # Path matched but not the method: the app answers 405 for this route
+            if match == Match.PARTIAL and partial is None:
+                partial = getattr(route, 'path', 'other')
+        return partial or 'other'
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        route = self.route_label(scope)
+        status: Dict[str, int] = {'code': 500}
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            await send(message)
+
+        in_flight = self.metrics.in_flight.labels(route=route)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            self.metrics.request_latency.labels(route=route).observe(time.perf_counter() - start)
+            self.metrics.requests.labels(route=route, method=scope['method'], status=str(status['code'])).inc()
@@ -17,6 +17,11 @@ import logging
 import albumentations as A
 from albumentations.pytorch import ToTensorV2
 import cv2
+import time
+import threading
+import argparse
+import hashlib
+import contextlib
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -24,15 +29,152 @@ warnings.filterwarnings('ignore')
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+# Row-vector RGB -> YIQ transform, used to rotate hue with a 3x3 matrix
+RGB_TO_YIQ = np.array([[0.299, 0.596, 0.211],
+                       [0.587, -0.274, -0.523],
+                       [0.114, -0.322, 0.312]], dtype=np.float32)
+YIQ_TO_RGB = np.linalg.inv(RGB_TO_YIQ).astype(np.float32)
+
+@keras.utils.register_keras_serializable(package='crop_disease')
+class RandomFlipRotation(layers.Layer):
+    """Random flips and rotation of a batch as one projective resample per image"""
+    
+    def __init__(self, max_degrees=30.0, fill_mode='reflect', **kwargs):
+        super().__init__(**kwargs)
+        self.max_degrees = max_degrees
+        self.fill_mode = fill_mode
+    
+    def call(self, images, training=None):
+        if not training:
+            return images
+        
+        shape = tf.shape(images)
+        batch_size = shape[0]
+        max_angle = self.max_degrees * np.pi / 180
+        
+        angle = tf.random.uniform([batch_size], -max_angle, max_angle)
+        flip_x = tf.where(tf.random.uniform([batch_size]) < 0.5, -1.0, 1.0)
+        flip_y = tf.where(tf.random.uniform([batch_size]) < 0.5, -1.0, 1.0)
+        
+        # Map each output pixel to its input location: flip(rotate(p - center)) + center
+        cos = tf.cos(angle)
+        sin = tf.sin(angle)
+        center_x = (tf.cast(shape[2], tf.float32) - 1) / 2
+        center_y = (tf.cast(shape[1], tf.float32) - 1) / 2
+        m00, m01 = flip_x * cos, -flip_x * sin
+        m10, m11 = flip_y * sin, flip_y * cos
+        zeros = tf.zeros([batch_size])
+        transforms = tf.stack([
+            m00, m01, center_x - m00 * center_x - m01 * center_y,
+            m10, m11, center_y - m10 * center_x - m11 * center_y,
+            zeros, zeros
+        ], axis=1)
+        
+        return tf.raw_ops.ImageProjectiveTransformV3(
+            images=images,
+            transforms=transforms,
+            output_shape=shape[1:3],
+            fill_value=0.0,
+            interpolation='BILINEAR',
+            fill_mode=self.fill_mode.upper()
+        )
+    
+    def get_config(self):
+        config = super().get_config()
+        config.update({'max_degrees': self.max_degrees, 'fill_mode': self.fill_mode})
+        return config
+
+@keras.utils.register_keras_serializable(package='crop_disease')
+class RandomColorJitter(layers.Layer):
+    """Per-image random brightness, contrast, saturation and hue over a batch of normalized images
+    
+    All four adjustments are linear in RGB, so they are folded, together with
+    undoing and reapplying the ImageNet normalization, into one 3x3 matrix and
+    offset per image and applied in a single pass over the batch.
+    """
+    
+    def __init__(self, brightness=0.2, contrast=0.2, saturation=0.2, hue=0.1, **kwargs):
+        super().__init__(**kwargs)
+        self.brightness = brightness
+        self.contrast = contrast
+        self.saturation = saturation
+        self.hue = hue
+    
+    def call(self, images, training=None):
+        if not training:
+            return images
+        
+        mean = tf.constant(IMAGENET_MEAN)
+        std = tf.constant(IMAGENET_STD)
+        batch_size = tf.shape(images)[0]
+        
+        brightness = tf.random.uniform([batch_size, 1], -self.brightness, self.brightness)
+        contrast = tf.random.uniform([batch_size, 1, 1], 1 - self.contrast, 1 + self.contrast)
+        saturation = tf.random.uniform([batch_size, 1, 1], 1 - self.saturation, 1 + self.saturation)
+        hue = tf.random.uniform([batch_size], -self.hue, self.hue) * 2 * np.pi
+        
+        # Saturation: blend with luma, x @ (s * I + (1 - s) * luma)
+        luma = tf.constant(np.repeat(RGB_TO_YIQ[:, :1], 3, axis=1))
+        saturate = saturation * tf.eye(3) + (1 - saturation) * luma
+        
+        # Hue: rotate the chroma (I, Q) plane in YIQ space
+        cos, sin = tf.cos(hue), tf.sin(hue)
+        ones, zeros = tf.ones_like(hue), tf.zeros_like(hue)
+        rotation = tf.reshape(tf.stack([ones, zeros, zeros,
+                                        zeros, cos, sin,
+                                        zeros, -sin, cos], axis=1), [-1, 3, 3])
+        rotate_hue = tf.constant(RGB_TO_YIQ) @ rotation @ tf.constant(YIQ_TO_RGB)
+        
+        color = saturate @ rotate_hue
+        
+        # Brightness, then contrast around the image's mean level: contrast * rgb + shift
+        image_mean = tf.reduce_mean(tf.reduce_mean(images, axis=[1, 2]) * std + mean, axis=-1, keepdims=True)
+        shift = brightness + (1 - contrast[:, :, 0]) * image_mean
+        
+        # rgb' = (contrast * rgb + shift) @ color, with rgb = x * std + mean
+        matrix = contrast * color
+        offset = tf.linalg.matvec(matrix, mean, transpose_a=True) + shift * tf.reduce_sum(color, axis=1)
+        matrix = std[:, None] * matrix
+        
+        # Clip in [0, 1] where the bounds are scalars, then renormalize with a shared matrix
+        images = tf.einsum('bhwc,bcd->bhwd', images, matrix) + offset[:, None, None, :]
+        images = tf.clip_by_value(images, 0.0, 1.0)
+        return tf.nn.bias_add(tf.tensordot(images, tf.linalg.diag(1 / std), axes=1), -mean / std)
+    
+    def get_config(self):
+        config = super().get_config()
+        config.update({
+            'brightness': self.brightness,
+            'contrast': self.contrast,
+            'saturation': self.saturation,
+            'hue': self.hue
+        })
+        return config
+
 class CropDiseaseModel:
     def __init__(self, config_path='model_config.json'):
         """Initialize the crop disease detection model"""
         self.config = self.load_config(config_path)
         self.model = None
+        self.training_model = None
+        self.base_model = None
+        self.feature_extractor = None
+        self.head_model = None
+        self.augmentation_layers = None
         self.history = None
         self.class_names = []
         self.input_shape = self.config.get('input_shape', (224, 224, 3))
         self.num_classes = 0
+        self.train_aug_seeds = None
+        self.shard_index = None
+        self.sample_augmenter = None
+        self.augment_lock = threading.Lock()
+        self.pipeline_profiler = None
+        self.strategy = None
+        self.input_context = None
         
     def load_config(self, config_path):
         """Load model configuration"""
@@ -52,7 +194,22 @@ class CropDiseaseModel:
             "dropout_rate": 0.3,
             "l2_regularization": 0.01,
             "class_weights": True,
-            "mixed_precision": True
+            "mixed_precision": True,
+            "quantization": True,
+            "quantization_calibration_samples": 200,
+            "quantization_accuracy_tolerance": 0.01,
+            "preprocessing_config": "preprocessing_config.json",
+            "data_format": "files",
+            "shard_cycle_length": 8,
+            "shard_cache": None,
+            "memmap_cache": False,
+            "memmap_cache_dir": "dataset_cache",
+            "augmentation_placement": "dataset",
+            "embedding_cache": False,
+            "embedding_cache_views": 0,
+            "embedding_cache_dir": "embedding_cache",
+            "distributed": False,
+            "scale_learning_rate": True
         }
         
         if os.path.exists(config_path):
@@ -77,6 +234,75 @@ class CropDiseaseModel:
             keras.mixed_precision.set_global_policy(policy)
             logger.info("Mixed precision training enabled")
     
+    def setup_distribution(self):
+        """Create a MultiWorkerMirroredStrategy from TF_CONFIG when distributed training is enabled"""
+        if not self.config.get('distributed', False) or self.strategy is not None:
+            return
+        
+        # Must run before any other TensorFlow op so the collectives can be configured
+        self.strategy = tf.distribute.MultiWorkerMirroredStrategy()
+        resolver = self.strategy.cluster_resolver
+        logger.info(f"Distributed training on {self.strategy.num_replicas_in_sync} replicas "
+                    f"(task {resolver.task_type}:{resolver.task_id}, "
+                    f"global batch size {self.config['batch_size'] * self.strategy.num_replicas_in_sync})")
+    
+    def is_chief(self):
+        """Whether this process writes checkpoints, logs and the saved model"""
+        if self.strategy is None:
+            return True
+        resolver = self.strategy.cluster_resolver
+        if resolver.task_type in (None, 'chief'):
+            return True
+        # Without a dedicated chief, worker 0 takes the role
+        return (resolver.task_type == 'worker' and resolver.task_id == 0
+                and 'chief' not in resolver.cluster_spec().as_dict())
+    
+    def distribution_scope(self):
+        """Strategy scope for creating and compiling models, or a no-op on a single process"""
+        if self.strategy is None:
+            return contextlib.nullcontext()
+        return self.strategy.scope()
+    
+    def scaled_learning_rate(self):
+        """Learning rate scaled linearly with the number of replicas, batch_size being per replica"""
+        learning_rate = self.config['learning_rate']
+        if self.strategy is not None and self.config.get('scale_learning_rate', True):
+            learning_rate *= self.strategy.num_replicas_in_sync
+        return learning_rate
+    
+    def create_distributed_datasets(self, train_data, val_data, class_weights=None):
+        """Per-worker train and validation pipelines, each sharded before decoding"""
+        def dataset_fn(input_context, split):
+            self.input_context = input_context
+            try:
+                return self.create_data_generators(train_data, val_data)[split]
+            finally:
+                self.input_context = None
+        
+        def train_fn(input_context):
+            dataset = dataset_fn(input_context, 0)
+            if class_weights is None:
+                return dataset
+            weights = tf.constant([class_weights.get(i, 1.0) for i in range(self.num_classes)], dtype=tf.float32)
+            return dataset.map(lambda x, y: (x, y, tf.gather(weights, y)))
+        
+        train_dataset = self.strategy.distribute_datasets_from_function(train_fn)
+        val_dataset = self.strategy.distribute_datasets_from_function(lambda ctx: dataset_fn(ctx, 1))
+        return train_dataset, val_dataset
+    
+    def release_distributed_model(self):
+        """Copy the trained weights into a local model so saving and evaluation run on the chief alone"""
+        local_model = keras.models.clone_model(self.model)
+        local_model.set_weights(self.model.get_weights())
+        
+        self.model = local_model
+        self.training_model = local_model
+        self.base_model = None
+        self.feature_extractor = None
+        self.head_model = None
+        self.strategy = None
+        self.compile_models(self.config['learning_rate'])
+    
     def create_advanced_augmentation(self):
         """Create advanced data augmentation pipeline using Albumentations"""
         transform = A.Compose([
@@ -102,6 +328,19 @@ class CropDiseaseModel:
         """Load and preprocess the dataset"""
         logger.info(f"Loading data from {data_dir}")
         
+        # Packed TFRecord shards exported by dataset_shards.py
+        if self.config.get('data_format', 'files') == 'shards':
+            return self.load_shard_splits(data_dir)
+        
+        # Virtual balanced datasets and manifest splits are CSVs rather than a class-per-directory tree
+        if data_dir.endswith('.csv'):
+            return self.load_sample_manifest([data_dir])
+        split_manifests = [os.path.join(data_dir, f"{split}.csv") for split in ['train', 'val', 'test']]
+        if all(os.path.exists(path) for path in split_manifests):
+            return self.load_sample_manifest(split_manifests)
+        if os.path.exists(os.path.join(data_dir, 'balanced_manifest.csv')):
+            return self.load_sample_manifest([os.path.join(data_dir, 'balanced_manifest.csv')])
+        
         # Get class names from directory structure
         self.class_names = sorted([d for d in os.listdir(data_dir) 
                                  if os.path.isdir(os.path.join(data_dir, d))])
@@ -148,61 +387,296 @@ class CropDiseaseModel:
         
         return (X_train, y_train), (X_val, y_val), (X_test, y_test)
     
+    def load_sample_manifest(self, manifest_paths):
+        """Load sample manifests (path, label, aug_seed, split) written by data_preprocessing"""
+        from data_preprocessing import DatasetPreprocessor
+        
+        # Paths in each manifest are relative to the manifest's own directory
+        frames = []
+        for manifest_path in manifest_paths:
+            frame = pd.read_csv(manifest_path)
+            base_dir = os.path.dirname(os.path.abspath(manifest_path))
+            frame['path'] = [os.path.join(base_dir, path) for path in frame['path']]
+            frames.append(frame)
+        manifest = pd.concat(frames, ignore_index=True)
+        
+        self.class_names = sorted(manifest['label'].unique())
+        self.num_classes = len(self.class_names)
+        
+        logger.info(f"Found {self.num_classes} classes: {self.class_names}")
+        
+        class_to_idx = {cls_name: idx for idx, cls_name in enumerate(self.class_names)}
+        paths = manifest['path'].to_numpy()
+        labels = manifest['label'].map(class_to_idx).to_numpy()
+        
+        splits = {}
+        for split in ['train', 'val', 'test']:
+            mask = (manifest['split'] == split).to_numpy()
+            splits[split] = (paths[mask].tolist(), labels[mask].tolist())
+        
+        # Rows with a seed are expanded by replaying the preprocessing augmentation
+        train_mask = (manifest['split'] == 'train').to_numpy()
+        self.train_aug_seeds = manifest['aug_seed'].to_numpy(dtype=np.int64)[train_mask]
+        if (self.train_aug_seeds >= 0).any():
+            self.sample_augmenter = DatasetPreprocessor(self.config.get('preprocessing_config', 'preprocessing_config.json'))
+        
+        logger.info(f"Train samples: {len(splits['train'][0])} "
+                    f"({int((self.train_aug_seeds >= 0).sum())} augmented on the fly)")
+        logger.info(f"Validation samples: {len(splits['val'][0])}")
+        logger.info(f"Test samples: {len(splits['test'][0])}")
+        
+        return splits['train'], splits['val'], splits['test']
+    
+    def load_shard_splits(self, shard_dir):
+        """Load class names, labels and source paths of each split from a shard index
+        
+        Every pipeline reads images from the shards; the source paths are only
+        kept for logging and cache fingerprints, the files need not exist.
+        """
+        from data_preprocessing import DatasetPreprocessor
+        from dataset_shards import load_shard_index
+        
+        self.shard_index = load_shard_index(shard_dir)
+        self.class_names = self.shard_index['class_names']
+        self.num_classes = len(self.class_names)
+        
+        logger.info(f"Found {self.num_classes} classes: {self.class_names}")
+        
+        splits = {
+            split: (self.shard_index['splits'][split]['sources'], self.shard_index['splits'][split]['labels'])
+            for split in ['train', 'val', 'test']
+        }
+        
+        self.train_aug_seeds = np.array(self.shard_index['splits']['train']['aug_seeds'], dtype=np.int64)
+        if (self.train_aug_seeds >= 0).any():
+            self.sample_augmenter = DatasetPreprocessor(self.config.get('preprocessing_config', 'preprocessing_config.json'))
+        
+        for split, name in [('train', 'Train'), ('val', 'Validation'), ('test', 'Test')]:
+            logger.info(f"{name} samples: {len(splits[split][0])} "
+                        f"in {len(self.shard_index['splits'][split]['shards'])} shards")
+        
+        return splits['train'], splits['val'], splits['test']
+    
+    def augment_from_seed(self, image, seed):
+        """Replay a virtual sample's augmentation on a decoded uint8 image"""
+        if seed < 0:
+            return image
+        # augment_image reseeds the global generators, so replays must not interleave
+        with self.augment_lock:
+            return self.sample_augmenter.augment_image(image, int(seed))
+    
+    def preprocess_image(self, image_path, label, is_training=True, aug_seed=None):
+        """Preprocess individual image"""
+        # Load image
+        image = tf.io.read_file(image_path)
+        return self.preprocess_image_bytes(image, label, is_training, aug_seed)
+    
+    def preprocess_image_bytes(self, image_bytes, label, is_training=True, aug_seed=None):
+        """Decode and preprocess one encoded image"""
+        image = tf.image.decode_image(image_bytes, channels=3, expand_animations=False)
+        
+        # Expand virtually balanced samples
+        if aug_seed is not None:
+            image = tf.numpy_function(self.augment_from_seed, [image, aug_seed], tf.uint8)
+            image.set_shape([None, None, 3])
+        
+        image = tf.cast(image, tf.float32)
+        
+        # Resize image
+        image = tf.image.resize(image, [self.input_shape[0], self.input_shape[1]])
+        
+        # Training augmentation runs on whole batches, see augment_batch
+        return self.normalize_image(image), label
+    
+    def normalize_image(self, image):
+        """Apply ImageNet normalization to a resized image or batch in the 0-255 range"""
+        # Normalize
+        image = tf.cast(image, tf.float32) / 255.0
+        
+        # Apply ImageNet normalization
+        mean = tf.constant(IMAGENET_MEAN)
+        std = tf.constant(IMAGENET_STD)
+        image = (image - mean) / std
+        
+        return image
+    
+    def get_augmentation_layers(self):
+        """Batched training augmentation: flips, rotation and colour jitter"""
+        if self.augmentation_layers is None:
+            # Kept in float32 under mixed precision; colour space conversions need it
+            self.augmentation_layers = keras.Sequential([
+                RandomFlipRotation(max_degrees=30.0, fill_mode='reflect', dtype='float32'),
+                RandomColorJitter(brightness=0.2, contrast=0.2, saturation=0.2, hue=0.1, dtype='float32')
+            ], name='augmentation')
+        return self.augmentation_layers
+    
+    def augment_in_dataset(self):
+        """Whether training augmentation runs in tf.data rather than inside the model"""
+        return (self.config.get('augmentation', True)
+                and self.config.get('augmentation_placement', 'dataset') == 'dataset')
+    
+    def augment_batch(self, dataset):
+        """Apply training augmentation to an already batched dataset"""
+        if not self.augment_in_dataset():
+            return dataset
+        
+        augmentation = self.get_augmentation_layers()
+        dataset = dataset.map(
+            lambda images, y: (augmentation(images, training=True), y),
+            num_parallel_calls=tf.data.AUTOTUNE
+        )
+        return self.track_stage(dataset, 'augment')
+    
+    def track_stage(self, dataset, name):
+        """Register a training pipeline prefix with the input-pipeline profiler, if profiling"""
+        if self.pipeline_profiler is not None:
+            self.pipeline_profiler.add_stage(name, dataset)
+        return dataset
+    
+    def prefetch_training(self, dataset):
+        """Prefetch training batches, counting them into the buffer when profiling"""
+        if self.pipeline_profiler is not None:
+            dataset = self.pipeline_profiler.count_produced(dataset)
+        return dataset.prefetch(tf.data.AUTOTUNE)
+    
+    def worker_shard(self):
+        """(number of input pipelines, this pipeline's index) while building a distributed dataset"""
+        if self.input_context is None:
+            return 1, 0
+        return self.input_context.num_input_pipelines, self.input_context.input_pipeline_id
+    
+    def shard_for_worker(self, dataset):
+        """Keep this worker's share of a source dataset, before any decoding"""
+        num_workers, worker_index = self.worker_shard()
+        if num_workers > 1:
+            dataset = dataset.shard(num_workers, worker_index)
+        return dataset
+    
+    def worker_slice(self, array):
+        """Keep this worker's share of a per-sample array"""
+        num_workers, worker_index = self.worker_shard()
+        return array[worker_index::num_workers]
+    
     def create_data_generators(self, train_data, val_data):
         """Create data generators with advanced augmentation"""
+        if self.shard_index is not None:
+            return self.create_shard_generators()
+        if self.config.get('memmap_cache', False):
+            return self.create_memmap_generators(train_data, val_data)
+        
         X_train, y_train = train_data
         X_val, y_val = val_data
         
-        def preprocess_image(image_path, label, is_training=True):
-            """Preprocess individual image"""
-            # Load image
-            image = tf.io.read_file(image_path)
-            image = tf.image.decode_image(image, channels=3)
-            image = tf.cast(image, tf.float32)
-            
-            # Resize image
-            image = tf.image.resize(image, [self.input_shape[0], self.input_shape[1]])
-            
-            if is_training and self.config.get('augmentation', True):
-                # Apply augmentations
-                image = tf.image.random_flip_left_right(image)
-                image = tf.image.random_flip_up_down(image)
-                image = tf.image.random_brightness(image, 0.2)
-                image = tf.image.random_contrast(image, 0.8, 1.2)
-                image = tf.image.random_saturation(image, 0.8, 1.2)
-                image = tf.image.random_hue(image, 0.1)
-                
-                # Random rotation
-                angle = tf.random.uniform([], -30, 30) * (3.14159 / 180)
-                image = tf.contrib.image.rotate(image, angle)
-            
-            # Normalize
-            image = tf.cast(image, tf.float32) / 255.0
-            
-            # Apply ImageNet normalization
-            mean = tf.constant([0.485, 0.456, 0.406])
-            std = tf.constant([0.229, 0.224, 0.225])
-            image = (image - mean) / std
-            
-            return image, label
-        
         # Create datasets
-        train_dataset = tf.data.Dataset.from_tensor_slices((X_train, y_train))
-        train_dataset = train_dataset.map(
-            lambda x, y: preprocess_image(x, y, True),
+        if self.train_aug_seeds is not None:
+            train_dataset = tf.data.Dataset.from_tensor_slices((X_train, y_train, self.train_aug_seeds))
+            train_dataset = self.shard_for_worker(train_dataset).map(
+                lambda x, y, seed: self.preprocess_image(x, y, True, seed),
+                num_parallel_calls=tf.data.AUTOTUNE
+            )
+        else:
+            train_dataset = tf.data.Dataset.from_tensor_slices((X_train, y_train))
+            train_dataset = self.shard_for_worker(train_dataset).map(
+                lambda x, y: self.preprocess_image(x, y, True),
+                num_parallel_calls=tf.data.AUTOTUNE
+            )
+        train_dataset = self.track_stage(train_dataset, 'read_decode_resize')
+        train_dataset = train_dataset.shuffle(1000).batch(self.config['batch_size'])
+        train_dataset = self.track_stage(train_dataset, 'shuffle_batch')
+        train_dataset = self.prefetch_training(self.augment_batch(train_dataset))
+        
+        val_dataset = tf.data.Dataset.from_tensor_slices((X_val, y_val))
+        val_dataset = self.shard_for_worker(val_dataset).map(
+            lambda x, y: self.preprocess_image(x, y, False),
             num_parallel_calls=tf.data.AUTOTUNE
         )
-        train_dataset = train_dataset.shuffle(1000).batch(self.config['batch_size']).prefetch(tf.data.AUTOTUNE)
+        val_dataset = val_dataset.batch(self.config['batch_size']).prefetch(tf.data.AUTOTUNE)
         
-        val_dataset = tf.data.Dataset.from_tensor_slices((X_val, y_val))
+        return train_dataset, val_dataset
+    
+    def create_shard_generators(self):
+        """Create train and validation datasets that stream from TFRecord shards"""
+        from dataset_shards import make_shard_dataset
+        
+        cycle_length = self.config.get('shard_cycle_length', 8)
+        cache = self.config.get('shard_cache')
+        replay_seeds = self.sample_augmenter is not None
+        num_workers, worker_index = self.worker_shard()
+        
+        # Shard order is reshuffled every epoch, records through the shuffle buffer
+        train_dataset = make_shard_dataset(self.shard_index, 'train', shuffle=True,
+                                           cycle_length=cycle_length, cache=cache,
+                                           num_workers=num_workers, worker_index=worker_index)
+        train_dataset = self.track_stage(train_dataset, 'read_shards')
+        train_dataset = train_dataset.shuffle(1000).map(
+            lambda image, y, seed: self.preprocess_image_bytes(image, y, True, seed if replay_seeds else None),
+            num_parallel_calls=tf.data.AUTOTUNE
+        )
+        train_dataset = self.track_stage(train_dataset, 'shuffle_decode_resize')
+        train_dataset = train_dataset.batch(self.config['batch_size'])
+        train_dataset = self.prefetch_training(self.augment_batch(train_dataset))
+        
+        val_dataset = make_shard_dataset(self.shard_index, 'val', cycle_length=cycle_length, cache=cache,
+                                         num_workers=num_workers, worker_index=worker_index)
         val_dataset = val_dataset.map(
-            lambda x, y: preprocess_image(x, y, False),
+            lambda image, y, seed: self.preprocess_image_bytes(image, y, False),
             num_parallel_calls=tf.data.AUTOTUNE
         )
         val_dataset = val_dataset.batch(self.config['batch_size']).prefetch(tf.data.AUTOTUNE)
         
         return train_dataset, val_dataset
     
+    def replay_seeds_on_batch(self, batch, seeds):
+        """Replay virtual-balancing augmentation on cached uint8 images of a batch"""
+        for i, seed in enumerate(seeds):
+            if seed >= 0:
+                augmented = self.augment_from_seed(batch[i], seed)
+                if augmented.shape != batch[i].shape:
+                    augmented = cv2.resize(augmented, (batch.shape[2], batch.shape[1]))
+                batch[i] = augmented
+        return batch
+    
+    def create_memmap_generators(self, train_data, val_data):
+        """Create train and validation datasets that read decoded images from a uint8 memmap cache"""
+        from dataset_cache import build_memmap_cache, make_memmap_dataset
+        
+        cache_dir = self.config.get('memmap_cache_dir', 'dataset_cache')
+        X_train, y_train = train_data
+        X_val, y_val = val_data
+        
+        # Samples that replay augmentation on the same source share one cached copy
+        train_sources, train_rows = np.unique(np.asarray(X_train), return_inverse=True)
+        train_images = build_memmap_cache(train_sources.tolist(), self.input_shape, cache_dir, 'train')
+        
+        # Every worker maps the whole cache but only draws its own samples
+        train_rows, y_train = self.worker_slice(train_rows), self.worker_slice(np.asarray(y_train))
+        
+        transform = None
+        if self.sample_augmenter is not None:
+            seeds = self.worker_slice(self.train_aug_seeds)
+            transform = lambda batch, indices: self.replay_seeds_on_batch(batch, seeds[indices])
+        
+        train_dataset = make_memmap_dataset(train_images, train_rows, y_train, self.config['batch_size'],
+                                            shuffle=True, transform=transform)
+        train_dataset = self.track_stage(train_dataset, 'memmap_gather')
+        train_dataset = train_dataset.map(
+            lambda images, y: (self.normalize_image(images), y),
+            num_parallel_calls=tf.data.AUTOTUNE
+        )
+        train_dataset = self.track_stage(train_dataset, 'normalize')
+        train_dataset = self.prefetch_training(self.augment_batch(train_dataset))
+        
+        val_sources, val_rows = np.unique(np.asarray(X_val), return_inverse=True)
+        val_images = build_memmap_cache(val_sources.tolist(), self.input_shape, cache_dir, 'val')
+        val_dataset = make_memmap_dataset(val_images, self.worker_slice(val_rows),
+                                          self.worker_slice(np.asarray(y_val)), self.config['batch_size'])
+        val_dataset = val_dataset.map(
+            lambda images, y: (self.normalize_image(images), y),
+            num_parallel_calls=tf.data.AUTOTUNE
+        ).prefetch(tf.data.AUTOTUNE)
+        
+        return train_dataset, val_dataset
+    
     def calculate_class_weights(self, y_train):
         """Calculate class weights for imbalanced dataset"""
         from sklearn.utils.class_weight import compute_class_weight
@@ -256,6 +730,7 @@ class CropDiseaseModel:
             
             # Freeze base model initially
             base_model.trainable = False
+            self.base_model = base_model
             x = base_model.output
         else:
             # Custom CNN architecture
@@ -277,39 +752,75 @@ class CropDiseaseModel:
             x = layers.MaxPooling2D()(x)
         
         # Global pooling
-        x = layers.GlobalAveragePooling2D()(x)
-        
-        # Dense layers with regularization
-        x = layers.Dense(512, activation='relu')(x)
-        x = layers.BatchNormalization()(x)
-        x = layers.Dropout(self.config.get('dropout_rate', 0.3))(x)
+        features = layers.GlobalAveragePooling2D()(x)
         
-        x = layers.Dense(256, activation='relu')(x)
-        x = layers.BatchNormalization()(x)
-        x = layers.Dropout(self.config.get('dropout_rate', 0.3))(x)
-        
-        # Output layer
-        if self.config.get('mixed_precision', True):
-            x = layers.Dense(self.num_classes, dtype='float32')(x)
-            outputs = layers.Activation('softmax', dtype='float32')(x)
-        else:
-            outputs = layers.Dense(self.num_classes, activation='softmax')(x)
+        # Dense head, kept as a layer list so it can also run on cached features
+        head_layers = self.create_head_layers()
+        outputs = self.apply_layers(head_layers, features)
         
         # Create model
         self.model = keras.Model(inputs, outputs)
         
-        # Compile model
-        optimizer = optimizers.Adam(learning_rate=self.config['learning_rate'])
+        # The frozen backbone and the head on its pooled features, for embedding-cache training
+        if self.base_model is not None:
+            self.feature_extractor = keras.Model(inputs, features)
+            feature_inputs = keras.Input(shape=(features.shape[-1],))
+            self.head_model = keras.Model(feature_inputs, self.apply_layers(head_layers, feature_inputs))
         
-        self.model.compile(
-            optimizer=optimizer,
-            loss='sparse_categorical_crossentropy',
-            metrics=['accuracy', 'top_3_accuracy']
-        )
+        # Augmentation inside the graph wraps the model; only self.model is saved
+        if self.config.get('augmentation', True) and self.config.get('augmentation_placement', 'dataset') == 'model':
+            train_inputs = keras.Input(shape=self.input_shape)
+            self.training_model = keras.Model(train_inputs, self.model(self.get_augmentation_layers()(train_inputs)))
+        else:
+            self.training_model = self.model
+        
+        # Compile model
+        self.compile_models(self.scaled_learning_rate())
         
         logger.info(f"Model created with {self.model.count_params():,} parameters")
         return self.model
     
+    def create_head_layers(self):
+        """Dense classification head with regularization"""
+        head_layers = [
+            layers.Dense(512, activation='relu'),
+            layers.BatchNormalization(),
+            layers.Dropout(self.config.get('dropout_rate', 0.3)),
+            
+            layers.Dense(256, activation='relu'),
+            layers.BatchNormalization(),
+            layers.Dropout(self.config.get('dropout_rate', 0.3))
+        ]
+        
+        # Output layer
+        if self.config.get('mixed_precision', True):
+            head_layers += [
+                layers.Dense(self.num_classes, dtype='float32'),
+                layers.Activation('softmax', dtype='float32')
+            ]
+        else:
+            head_layers.append(layers.Dense(self.num_classes, activation='softmax'))
+        
+        return head_layers
+    
+    @staticmethod
+    def apply_layers(layer_list, x):
+        """Call a list of layers in sequence"""
+        for layer in layer_list:
+            x = layer(x)
+        return x
+    
+    def compile_models(self, learning_rate):
+        """Compile the model, the augmenting training wrapper and the cached-feature head if present"""
+        models = [m for m in [self.training_model, self.model, self.head_model] if m is not None]
+        with self.distribution_scope():
+            for model in {id(m): m for m in models}.values():
+                model.compile(
+                    optimizer=optimizers.Adam(learning_rate=learning_rate),
+                    loss='sparse_categorical_crossentropy',
+                    metrics=['accuracy', keras.metrics.SparseTopKCategoricalAccuracy(k=3, name='top_3_accuracy')]
+                )
+    
     def create_callbacks(self):
         """Create training callbacks"""
         callbacks_list = []
@@ -333,6 +844,10 @@ class CropDiseaseModel:
         )
         callbacks_list.append(reduce_lr)
         
+        # Checkpoints and logs are written by the chief only
+        if not self.is_chief():
+            return callbacks_list
+        
         # Model checkpoint
         checkpoint = callbacks.ModelCheckpoint(
             'best_model.h5',
@@ -358,50 +873,79 @@ class CropDiseaseModel:
         
         return callbacks_list
     
-    def train(self, data_dir, save_dir='models'):
-        """Train the model"""
+    def train(self, data_dir, save_dir='models', profile=False, profile_steps=None):
+        """Train the model, or profile the input pipeline when profile or profile_steps is set"""
         logger.info("Starting training process...")
         
+        # Setup distributed training
+        self.setup_distribution()
+        if self.strategy is not None and (profile or profile_steps):
+            raise ValueError("Input pipeline profiling runs on a single process, disable distributed training")
+        
         # Setup mixed precision
         self.setup_mixed_precision()
         
         # Load and preprocess data
         train_data, val_data, test_data = self.load_and_preprocess_data(data_dir)
         
-        # Create data generators
-        train_dataset, val_dataset = self.create_data_generators(train_data, val_data)
+        # Instrument the training pipeline before it is built
+        if profile or profile_steps:
+            from pipeline_profiler import InputPipelineProfiler
+            self.pipeline_profiler = InputPipelineProfiler(self.config['batch_size'])
         
         # Calculate class weights
         class_weights = None
         if self.config.get('class_weights', True):
             class_weights = self.calculate_class_weights(train_data[1])
         
+        # Create data generators
+        if self.strategy is not None:
+            # Distributed datasets carry class weights as per-sample weights
+            train_dataset, val_dataset = self.create_distributed_datasets(train_data, val_data, class_weights)
+            fit_class_weights = None
+        else:
+            train_dataset, val_dataset = self.create_data_generators(train_data, val_data)
+            fit_class_weights = class_weights
+        
         # Create model
-        self.create_model()
+        with self.distribution_scope():
+            self.create_model()
         
         # Print model summary
         self.model.summary()
         
+        if self.pipeline_profiler is not None:
+            self.profile_training(train_dataset, class_weights, save_dir, profile_steps)
+            return
+        
         # Create callbacks
         callbacks_list = self.create_callbacks()
         
         # Train model
         logger.info("Starting initial training...")
-        self.history = self.model.fit(
-            train_dataset,
-            epochs=self.config['epochs'],
-            validation_data=val_dataset,
-            callbacks=callbacks_list,
-            class_weight=class_weights,
-            verbose=1
-        )
+        use_embedding_cache = self.config.get('embedding_cache', False) and self.head_model is not None
+        if use_embedding_cache and self.strategy is not None:
+            logger.warning("The embedding cache is single-process only, training the full model instead")
+            use_embedding_cache = False
+        
+        if use_embedding_cache:
+            self.history = self.train_head_on_embeddings(train_data, val_data, class_weights, callbacks_list)
+        else:
+            self.history = self.training_model.fit(
+                train_dataset,
+                epochs=self.config['epochs'],
+                validation_data=val_dataset,
+                callbacks=callbacks_list,
+                class_weight=fit_class_weights,
+                verbose=1
+            )
         
         # Fine-tuning (if using transfer learning)
-        if self.config.get('transfer_learning', True):
+        if self.config.get('transfer_learning', True) and self.base_model is not None:
             logger.info("Starting fine-tuning...")
             
             # Unfreeze some layers
-            base_model = self.model.layers[1]  # Assuming base model is the second layer
+            base_model = self.base_model
             base_model.trainable = True
             
             # Freeze early layers
@@ -410,23 +954,19 @@ class CropDiseaseModel:
                 layer.trainable = False
             
             # Recompile with lower learning rate
-            self.model.compile(
-                optimizer=optimizers.Adam(learning_rate=self.config['learning_rate']/10),
-                loss='sparse_categorical_crossentropy',
-                metrics=['accuracy', 'top_3_accuracy']
-            )
+            self.compile_models(self.scaled_learning_rate() / 10)
             
             # Continue training
             fine_tune_epochs = self.config['epochs'] // 2
             total_epochs = self.config['epochs'] + fine_tune_epochs
             
-            history_fine = self.model.fit(
+            history_fine = self.training_model.fit(
                 train_dataset,
                 epochs=total_epochs,
                 initial_epoch=self.history.epoch[-1],
                 validation_data=val_dataset,
                 callbacks=callbacks_list,
-                class_weight=class_weights,
+                class_weight=fit_class_weights,
                 verbose=1
             )
             
@@ -434,26 +974,181 @@ class CropDiseaseModel:
             for key in self.history.history.keys():
                 self.history.history[key].extend(history_fine.history[key])
         
+        if not self.is_chief():
+            logger.info("Worker finished training; the chief saves and evaluates the model")
+            return
+        if self.strategy is not None:
+            self.release_distributed_model()
+        
         # Save model and metadata
         self.save_model(save_dir)
         
+        # Export quantized TFLite variants and compare them on the test split
+        if self.config.get('quantization', True):
+            self.export_quantized_models(save_dir, train_data, test_data)
+        
         # Evaluate on test set
         self.evaluate_model(test_data)
         
         logger.info("Training completed successfully!")
     
+    def create_feature_datasets(self, train_data, val_data):
+        """Unshuffled, unaugmented train and validation batches for feature extraction"""
+        batch_size = self.config['batch_size']
+        replay_seeds = self.sample_augmenter is not None
+        
+        if self.shard_index is not None:
+            from dataset_shards import make_shard_dataset
+            
+            train_dataset = make_shard_dataset(self.shard_index, 'train').map(
+                lambda image, y, seed: self.preprocess_image_bytes(image, y, False, seed if replay_seeds else None),
+                num_parallel_calls=tf.data.AUTOTUNE
+            )
+            val_dataset = make_shard_dataset(self.shard_index, 'val').map(
+                lambda image, y, seed: self.preprocess_image_bytes(image, y, False),
+                num_parallel_calls=tf.data.AUTOTUNE
+            )
+        else:
+            if replay_seeds:
+                train_dataset = tf.data.Dataset.from_tensor_slices((train_data[0], train_data[1], self.train_aug_seeds))
+                train_dataset = train_dataset.map(
+                    lambda x, y, seed: self.preprocess_image(x, y, False, seed),
+                    num_parallel_calls=tf.data.AUTOTUNE
+                )
+            else:
+                train_dataset = tf.data.Dataset.from_tensor_slices(tuple(train_data)).map(
+                    lambda x, y: self.preprocess_image(x, y, False),
+                    num_parallel_calls=tf.data.AUTOTUNE
+                )
+            val_dataset = tf.data.Dataset.from_tensor_slices(tuple(val_data)).map(
+                lambda x, y: self.preprocess_image(x, y, False),
+                num_parallel_calls=tf.data.AUTOTUNE
+            )
+        
+        return (train_dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE),
+                val_dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE))
+    
+    def embedding_fingerprints(self, train_data, val_data, views):
+        """Cache keys covering the source data, backbone and augmented views of each split"""
+        from dataset_cache import dataset_fingerprint
+        
+        salt = f"{self.config['base_model']}|{views}"
+        if self.train_aug_seeds is not None:
+            salt += f"|{hashlib.sha1(self.train_aug_seeds.tobytes()).hexdigest()}"
+        
+        if self.shard_index is not None:
+            shard_dir = self.shard_index['shard_dir']
+            return {
+                split: dataset_fingerprint(
+                    [os.path.join(shard_dir, shard['file']) for shard in self.shard_index['splits'][split]['shards']],
+                    self.input_shape, salt
+                )
+                for split in ['train', 'val']
+            }
+        
+        return {
+            'train': dataset_fingerprint(list(train_data[0]), self.input_shape, salt),
+            'val': dataset_fingerprint(list(val_data[0]), self.input_shape, salt)
+        }
+    
+    def train_head_on_embeddings(self, train_data, val_data, class_weights, callbacks_list):
+        """Train the dense head on pooled backbone features computed once and cached on disk"""
+        from dataset_cache import build_feature_cache, make_memmap_dataset
+        
+        cache_dir = self.config.get('embedding_cache_dir', 'embedding_cache')
+        views = self.config.get('embedding_cache_views', 0) if self.config.get('augmentation', True) else 0
+        fingerprints = self.embedding_fingerprints(train_data, val_data, views)
+        
+        train_source, val_source = self.create_feature_datasets(train_data, val_data)
+        
+        # Each augmented view is one more fixed pass over the train split
+        train_views = train_source
+        if views:
+            augmentation = self.get_augmentation_layers()
+            for _ in range(views):
+                train_views = train_views.concatenate(
+                    train_source.map(lambda images, y: (augmentation(images, training=True), y))
+                )
+        
+        train_features, train_labels = build_feature_cache(
+            self.feature_extractor, train_views, len(train_data[1]) * (1 + views),
+            cache_dir, 'train', fingerprints['train']
+        )
+        val_features, val_labels = build_feature_cache(
+            self.feature_extractor, val_source, len(val_data[1]), cache_dir, 'val', fingerprints['val']
+        )
+        
+        batch_size = self.config['batch_size']
+        train_dataset = make_memmap_dataset(train_features, np.arange(len(train_labels)), train_labels,
+                                            batch_size, shuffle=True).prefetch(tf.data.AUTOTUNE)
+        val_dataset = make_memmap_dataset(val_features, np.arange(len(val_labels)), val_labels,
+                                          batch_size).prefetch(tf.data.AUTOTUNE)
+        
+        # The head model has no backbone, so checkpoints of it would not load as the full model
+        head_callbacks = [cb for cb in callbacks_list if not isinstance(cb, callbacks.ModelCheckpoint)]
+        
+        logger.info(f"Training the head on {len(train_labels)} cached train embeddings "
+                    f"({views} augmented views)")
+        return self.head_model.fit(
+            train_dataset,
+            epochs=self.config['epochs'],
+            validation_data=val_dataset,
+            callbacks=head_callbacks,
+            class_weight=class_weights,
+            verbose=1
+        )
+    
+    def profile_training(self, train_dataset, class_weights, save_dir, max_steps=None):
+        """Run the initial training phase in an instrumented loop and write the input pipeline report"""
+        if max_steps:
+            logger.info(f"Profiling the input pipeline for {max_steps} steps...")
+        else:
+            logger.info("Profiling the input pipeline over a full training run...")
+        
+        remaining = max_steps
+        for epoch in range(1, self.config['epochs'] + 1):
+            stats = self.pipeline_profiler.profile_epoch(
+                self.training_model, train_dataset, epoch, class_weights, remaining
+            )
+            if remaining is not None:
+                remaining -= stats['steps']
+                if remaining <= 0:
+                    break
+        
+        # Written next to training_history.json
+        return self.pipeline_profiler.write_report(save_dir)
+    
+    def create_eval_dataset(self, split, data, rows=None):
+        """Unshuffled, unaugmented (image, label) pairs of a split, in the order of its labels
+        
+        rows optionally selects sorted sample indices; they are picked before decoding.
+        """
+        if self.shard_index is not None:
+            from dataset_shards import make_shard_dataset
+            
+            # Reading one shard at a time keeps records in index order, matching the split's labels
+            dataset = make_shard_dataset(self.shard_index, split, cycle_length=1)
+            preprocess = lambda image, y, seed: self.preprocess_image_bytes(image, y, False)
+        else:
+            dataset = tf.data.Dataset.from_tensor_slices(tuple(data))
+            preprocess = lambda x, y: self.preprocess_image(x, y, False)
+        
+        if rows is not None:
+            rows = tf.constant(rows, dtype=tf.int64)
+            dataset = dataset.enumerate().filter(
+                lambda row, record: tf.reduce_any(tf.equal(row, rows))
+            ).map(lambda row, record: record)
+        
+        return dataset.map(preprocess, num_parallel_calls=tf.data.AUTOTUNE)
+    
     def evaluate_model(self, test_data):
         """Evaluate model on test set"""
-        X_test, y_test = test_data
+        _, y_test = test_data
         
         logger.info("Evaluating model on test set...")
         
         # Create test dataset
-        test_dataset = tf.data.Dataset.from_tensor_slices((X_test, y_test))
-        test_dataset = test_dataset.map(
-            lambda x, y: self.preprocess_image(x, y, False),
-            num_parallel_calls=tf.data.AUTOTUNE
-        )
+        test_dataset = self.create_eval_dataset('test', test_data)
         test_dataset = test_dataset.batch(self.config['batch_size'])
         
         # Evaluate
@@ -546,6 +1241,106 @@ class CropDiseaseModel:
         # Plot training history
         self.plot_training_history(save_dir)
     
+    def representative_dataset(self, train_data):
+        """Build a calibration generator from a sample of the training split"""
+        X_train, _ = train_data
+        num_samples = min(self.config.get('quantization_calibration_samples', 200), len(X_train))
+        rng = np.random.default_rng(42)
+        sample_rows = np.sort(rng.choice(len(X_train), size=num_samples, replace=False))
+        calibration_dataset = self.create_eval_dataset('train', train_data, rows=sample_rows)
+        
+        def generator():
+            for image, _ in calibration_dataset:
+                yield [tf.expand_dims(image, 0)]
+        
+        return generator
+    
+    def convert_to_tflite(self, variant, train_data=None):
+        """Convert the trained model to a float32, float16 or full-integer int8 TFLite model"""
+        converter = tf.lite.TFLiteConverter.from_keras_model(self.model)
+        
+        if variant == 'float16':
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.target_spec.supported_types = [tf.float16]
+        elif variant == 'int8':
+            # Full-integer quantization calibrated on real training images
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.representative_dataset = self.representative_dataset(train_data)
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+            converter.inference_input_type = tf.int8
+            converter.inference_output_type = tf.int8
+        
+        return converter.convert()
+    
+    def benchmark_tflite_model(self, tflite_path, test_data, latency_samples=50):
+        """Measure accuracy and per-image latency of a TFLite model on the test split"""
+        from inference_backends import TFLiteBackend
+        
+        X_test, _ = test_data
+        backend = TFLiteBackend(tflite_path, pool_size=1)
+        
+        test_dataset = self.create_eval_dataset('test', test_data)
+        
+        # Accuracy over the whole split
+        correct = 0
+        for images, labels in test_dataset.batch(self.config['batch_size']).prefetch(tf.data.AUTOTUNE):
+            predictions = backend.predict(images.numpy())
+            correct += int(np.sum(np.argmax(predictions, axis=1) == labels.numpy()))
+        
+        # Single-image latency, which is what the serving path pays per request
+        latencies = []
+        for image, _ in test_dataset.take(latency_samples):
+            batch = np.expand_dims(image.numpy(), 0)
+            start = time.perf_counter()
+            backend.predict(batch)
+            latencies.append((time.perf_counter() - start) * 1000)
+        backend.close()
+        
+        return {
+            'path': tflite_path,
+            'size_bytes': os.path.getsize(tflite_path),
+            'accuracy': correct / len(X_test) if len(X_test) else 0.0,
+            'latency_ms_mean': float(np.mean(latencies)) if latencies else 0.0,
+            'latency_ms_p50': float(np.percentile(latencies, 50)) if latencies else 0.0,
+            'latency_ms_p95': float(np.percentile(latencies, 95)) if latencies else 0.0
+        }
+    
+    def export_quantized_models(self, save_dir, train_data, test_data):
+        """Export float32/float16/int8 TFLite models and write an accuracy-vs-latency report"""
+        logger.info("Exporting quantized TFLite models...")
+        
+        report = {'created_at': datetime.now().isoformat(), 'variants': {}}
+        
+        for variant in ['float32', 'float16', 'int8']:
+            tflite_path = os.path.join(save_dir, f'crop_disease_model_{variant}.tflite')
+            with open(tflite_path, 'wb') as f:
+                f.write(self.convert_to_tflite(variant, train_data))
+            logger.info(f"TensorFlow Lite {variant} model saved to {tflite_path}")
+            
+            report['variants'][variant] = self.benchmark_tflite_model(tflite_path, test_data)
+        
+        # Recommend the smallest artifact within tolerance of float32 accuracy
+        tolerance = self.config.get('quantization_accuracy_tolerance', 0.01)
+        reference_accuracy = report['variants']['float32']['accuracy']
+        for variant, stats in report['variants'].items():
+            stats['accuracy_drop'] = reference_accuracy - stats['accuracy']
+            stats['within_tolerance'] = stats['accuracy_drop'] <= tolerance
+        
+        candidates = [v for v, stats in report['variants'].items() if stats['within_tolerance']]
+        recommended = min(candidates, key=lambda v: report['variants'][v]['size_bytes'])
+        report['accuracy_tolerance'] = tolerance
+        report['recommended_variant'] = recommended
+        
+        for variant, stats in report['variants'].items():
+            logger.info(f"{variant}: accuracy={stats['accuracy']:.4f}, "
+                        f"p50 latency={stats['latency_ms_p50']:.2f}ms, size={stats['size_bytes'] / 1e6:.1f}MB")
+        logger.info(f"Recommended TFLite variant: {recommended}")
+        
+        with open(os.path.join(save_dir, 'quantization_report.json'), 'w') as f:
+            json.dump(report, f, indent=4)
+        
+        return report
+    
     def plot_training_history(self, save_dir):
         """Plot and save training history"""
         if not self.history:
@@ -597,15 +1392,25 @@ class CropDiseaseModel:
 
 def main():
     """Main training function"""
-    # Configuration
-    data_directory = "dataset"  # Path to your dataset directory
-    model_save_directory = "models"
+    parser = argparse.ArgumentParser(description="Train the crop disease detection model")
+    parser.add_argument('--data-dir', default='dataset', help="Path to your dataset directory")
+    parser.add_argument('--save-dir', default='models', help="Where to save the model and reports")
+    parser.add_argument('--config', default='model_config.json')
+    parser.add_argument('--profile', action='store_true',
+                        help="Train in an instrumented loop and write an input pipeline report")
+    parser.add_argument('--profile-steps', type=int, default=None,
+                        help="Profile only this many training steps as a quick benchmark")
+    parser.add_argument('--distributed', action='store_true',
+                        help="Train with MultiWorkerMirroredStrategy using the cluster in TF_CONFIG")
+    args = parser.parse_args()
     
     # Create model instance
-    model = CropDiseaseModel()
+    model = CropDiseaseModel(args.config)
+    if args.distributed:
+        model.config['distributed'] = True
     
     # Train model
-    model.train(data_directory, model_save_directory)
+    model.train(args.data_dir, args.save_dir, profile=args.profile, profile_steps=args.profile_steps)
 
 if __name__ == "__main__":
     main()